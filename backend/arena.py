@@ -0,0 +1,361 @@
+import itertools
+import math
+import multiprocessing as mp
+import os
+import signal
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from execution_engine import execute_strategy, signal_matrix
+from result_cache import result_cache, frame_fingerprint
+from sandbox import ResourceLimit, SANDBOX_CPU_S, SANDBOX_RSS_MB, _Limits, _on_xcpu
+from strategies.indicator_cache import bind
+from telemetry import span, collect_trace, merge_spans, STRATEGY_SECONDS
+
+# Parallel Battle Arena.
+# Each ticker's OHLCV is published ONCE into a shared memory block. Workers
+# attach by name and wrap the block in a read-only DataFrame (no pickling,
+# no copy), then run one strategy each. A strategy that crashes or runs past
+# its time limit only loses its own cell in the grid.
+# The handle carries a fingerprint of the data, which workers bind to their
+# frame, so indicators cached in a worker are reused by every later cell on
+# the same data (the next strategy, the next optimizer generation).
+# The pool is forked by start_pool() at startup, before the API starts its
+# threads; a pool replaced later (after a stuck worker) is spawned. Every cell runs under the sandbox's per-run CPU and address
+# space limits (SANDBOX_CPU_S, SANDBOX_RSS_MB), so a memory hog in a battle
+# fails its own cell instead of the host.
+
+DEFAULT_TIMEOUT = float(os.getenv("ARENA_TIMEOUT", "30"))
+MAX_WORKERS = int(os.getenv("ARENA_WORKERS", str(os.cpu_count() or 2)))
+
+
+class SharedOHLCV:
+    """
+    Owns one shared memory block laid out as:
+        [ index (int64 ns) | col_0 | col_1 | ... ]   each n_rows * 8 bytes
+    Only the numeric columns are published. handle() is the small picklable
+    description workers need to attach. fingerprint identifies the data for
+    the workers' indicator cache; without one, each attached frame keeps its
+    indicators to itself.
+    """
+    def __init__(self, df: pd.DataFrame, fingerprint: str = None):
+        numeric = df.select_dtypes(include="number")
+        self.columns = [str(c) for c in numeric.columns]
+        self.n_rows = len(numeric)
+
+        index = pd.DatetimeIndex(numeric.index)
+        self.tz = str(index.tz) if index.tz is not None else None
+        if self.tz:
+            index = index.tz_convert("UTC").tz_localize(None)
+        self.index_name = numeric.index.name
+        self.fingerprint = fingerprint
+
+        n_slots = len(self.columns) + 1
+        self.shm = shared_memory.SharedMemory(create=True, size=max(8, 8 * n_slots * self.n_rows))
+        block = np.ndarray((n_slots, self.n_rows), dtype=np.float64, buffer=self.shm.buf)
+        block[0].view(np.int64)[:] = index.values.astype("datetime64[ns]").view(np.int64)
+        block[1:] = numeric.to_numpy(dtype=np.float64).T
+        del block  # Drop our export of the buffer so close() works later
+
+    def handle(self) -> dict:
+        return {
+            "name": self.shm.name,
+            "columns": self.columns,
+            "n_rows": self.n_rows,
+            "tz": self.tz,
+            "index_name": self.index_name,
+            "fingerprint": self.fingerprint,
+        }
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def attach_frame(handle: dict):
+    """
+    Returns (shm, df). df is a zero-copy, read-only view of the shared block;
+    adding columns (as run_backtest does) is fine, writing to OHLCV is not.
+    Close shm only after every reference to df is gone.
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=handle["name"], track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=handle["name"])
+
+    n_slots = len(handle["columns"]) + 1
+    block = np.ndarray((n_slots, handle["n_rows"]), dtype=np.float64, buffer=shm.buf)
+    block.flags.writeable = False
+
+    index = pd.DatetimeIndex(block[0].view("datetime64[ns]"), name=handle["index_name"])
+    if handle["tz"]:
+        index = index.tz_localize("UTC").tz_convert(handle["tz"])
+    df = pd.DataFrame(block[1:].T, index=index, columns=handle["columns"], copy=False)
+    bind(df, handle.get("fingerprint"), cache=handle.get("fingerprint") is not None)
+    return shm, df
+
+
+# --- Worker side ---
+
+class StrategyTimeout(BaseException):
+    # BaseException so the blanket "except Exception" in execute_strategy and
+    # the per-bar signal loop can't swallow it
+    pass
+
+def _on_alarm(signum, frame):
+    raise StrategyTimeout()
+
+def _init_worker():
+    # SIGXCPU from the per-run CPU limit ends the run, not the worker
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_xcpu)
+
+def _run_cell(handle: dict, strategy_code: str, params: dict, timeout: float, with_trades: bool = False,
+              costs: dict = None) -> dict:
+    """
+    Runs in a pool worker. Enforces the per-strategy wall-clock limit with
+    SIGALRM where available, so a slow strategy doesn't hold the worker forever.
+    """
+    started = time.perf_counter()
+    use_alarm = hasattr(signal, "setitimer") and timeout
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    shm, df = attach_frame(handle)  # Mapped before the address-space limit is set
+    spans = []
+    try:
+        with collect_trace() as spans, _Limits(SANDBOX_CPU_S, SANDBOX_RSS_MB):
+            result = execute_strategy(strategy_code, df, params, with_trades=with_trades, costs=costs)
+    except StrategyTimeout:
+        result = {"error": f"Timed out after {timeout}s"}
+    except ResourceLimit:
+        result = {"error": f"CPU limit exceeded ({SANDBOX_CPU_S}s)"}
+    except MemoryError:
+        result = {"error": f"Memory limit exceeded ({SANDBOX_RSS_MB} MB)"}
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        del df
+        try:
+            shm.close()
+        except BufferError:
+            pass  # A stray view is still alive; the OS reclaims it when the worker exits
+
+    result["elapsed_s"] = round(time.perf_counter() - started, 4)
+    result["_spans"] = spans  # Worker-side stage timings, absorbed by the parent
+    return result
+
+def _signals_cell(handle: dict, strategy_code: str, param_grid: list, timeout: float) -> dict:
+    """
+    Runs in a pool worker: signal_matrix rows for a slice of a parameter grid,
+    as int8 (signals are -1/0/1) to keep the trip back small.
+    """
+    use_alarm = hasattr(signal, "setitimer") and timeout
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    shm, df = attach_frame(handle)
+    spans = []
+    try:
+        with collect_trace() as spans, _Limits(SANDBOX_CPU_S * max(1, len(param_grid)), SANDBOX_RSS_MB):
+            result = {"signals": signal_matrix(strategy_code, df, param_grid).astype(np.int8)}
+    except StrategyTimeout:
+        result = {"error": f"Timed out after {timeout}s"}
+    except ResourceLimit:
+        result = {"error": f"CPU limit exceeded ({SANDBOX_CPU_S}s per parameter set)"}
+    except MemoryError:
+        result = {"error": f"Memory limit exceeded ({SANDBOX_RSS_MB} MB)"}
+    except Exception as e:
+        result = {"error": str(e)}
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        del df
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+    result["_spans"] = spans
+    return result
+
+def _absorb(result: dict, strategy_name: str = None) -> dict:
+    # Parent side: fold the worker's spans into this process's metrics
+    merge_spans(result.pop("_spans", None))
+    if strategy_name and "elapsed_s" in result:
+        STRATEGY_SECONDS.observe(result["elapsed_s"], strategy=strategy_name)
+    return result
+
+
+# --- Parent side ---
+
+_pool = None
+_pool_lock = threading.Lock()
+_started = False    # Only the first pool forks: by the time one is replaced, the API runs threads
+_pending = {}       # submit_cell callbacks not called yet, by ticket
+_tickets = itertools.count()
+
+def start_pool():
+    """
+    Forks the worker pool. Called at startup, before the job manager and the
+    DB pool start threads; scripts and benchmarks get it on first use.
+    """
+    _get_pool()
+
+def _get_pool():
+    global _pool, _started
+    with _pool_lock:
+        if _pool is None:
+            # Workers attach shared blocks, which registers them with a resource
+            # tracker: start ours first so forked workers report to it, rather
+            # than each starting one that unlinks the blocks when they're killed
+            resource_tracker.ensure_running()
+            method = "fork" if not _started and "fork" in mp.get_all_start_methods() else "spawn"
+            _pool = mp.get_context(method).Pool(processes=MAX_WORKERS, initializer=_init_worker)
+            _started = True
+        return _pool
+
+def _reset_pool():
+    # Only used when a worker is stuck in C code and ignored SIGALRM
+    _stop_pool("Worker pool was reset (a strategy ignored its time limit)")
+    _get_pool()  # Replace it right away (spawned), as the sandbox replaces a killed worker
+
+def shutdown_pool():
+    _stop_pool("Worker pool shut down")
+
+def _stop_pool(reason: str):
+    # terminate() drops queued and running tasks without their callbacks, so
+    # every submit_cell caller still waiting is told here
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.terminate()
+            _pool = None
+        callbacks = list(_pending.values())
+        _pending.clear()
+    for callback in callbacks:
+        callback({"error": reason})
+
+def _finish(ticket: int, result: dict):
+    # Calls a submit_cell callback once: from the pool's result thread, or from _stop_pool
+    with _pool_lock:
+        callback = _pending.pop(ticket, None)
+    if callback is not None:
+        callback(result)
+
+def submit_cell(handle: dict, strategy_code: str, params: dict, timeout: float, callback, costs: dict = None):
+    """
+    Queues one backtest (under costs, see strategies/backtest_kernel.py) on
+    the shared pool; callback(result) is called once,
+    from a pool thread when it finishes (errors arrive as {"error": ...}),
+    or with an error if the pool is reset first.
+    """
+    pool = _get_pool()
+    ticket = next(_tickets)
+    with _pool_lock:
+        _pending[ticket] = callback
+    pool.apply_async(
+        _run_cell, (handle, strategy_code, params, timeout, False, costs),
+        callback=lambda result: _finish(ticket, _absorb(result)),
+        error_callback=lambda e: _finish(ticket, {"error": str(e)}),
+    )
+
+def run_signal_matrix(df: pd.DataFrame, strategy_code: str, param_grid: list,
+                      timeout: float = DEFAULT_TIMEOUT, fingerprint: str = None) -> np.ndarray:
+    """
+    signal_matrix spread over the worker pool, one slice of param_grid per
+    worker, for strategies without a batched grid kernel. Returns int8
+    (len(param_grid), len(df)); raises if any slice fails. Pass the same
+    fingerprint on every call of a job so workers keep their indicators.
+    """
+    slices = [param_grid[k::MAX_WORKERS] for k in range(min(MAX_WORKERS, len(param_grid)))]
+    rows = np.empty((len(param_grid), len(df)), dtype=np.int8)
+    with span("arena.publish"):
+        shared = SharedOHLCV(df, fingerprint)
+    try:
+        pool = _get_pool()
+        jobs = [pool.apply_async(_signals_cell, (shared.handle(), strategy_code, part, timeout * len(part)))
+                for part in slices]
+        for k, job in enumerate(jobs):
+            result = _absorb(job.get(timeout=timeout * len(slices[k]) + 5))
+            if "error" in result:
+                raise RuntimeError(result["error"])
+            rows[k::MAX_WORKERS] = result["signals"]
+    except mp.TimeoutError:
+        _reset_pool()
+        raise RuntimeError(f"Signal generation timed out after {timeout}s per parameter set")
+    finally:
+        shared.release()
+    return rows
+
+def run_battle_grid(frames: dict, strategies: list, timeout: float = DEFAULT_TIMEOUT,
+                    use_cache: bool = True, with_trades: bool = False) -> dict:
+    """
+    frames:     {ticker: OHLCV DataFrame}
+    strategies: [{"name": ..., "code": ..., "params": {...} or None}, ...]
+    Returns {ticker: {strategy_name: result}}. Failed cells carry an "error" key
+    instead of metrics, everything else is still returned.
+    Cells already in the persistent result cache are answered without a worker.
+    with_trades: each result also carries "trades" (cells are always re-run,
+    since the cache doesn't store trades; results still refresh the cache).
+    """
+    results = {ticker: {} for ticker in frames}
+    published = {}
+    pending = []
+    try:
+        # 1. Publish each frame once
+        data_hashes = {ticker: frame_fingerprint(df) for ticker, df in frames.items()} if use_cache else {}
+        with span("arena.publish"):
+            for ticker, df in frames.items():
+                published[ticker] = SharedOHLCV(df, data_hashes.get(ticker))
+
+        # 2. Fan out the strategies x tickers grid
+        pool = _get_pool()
+        for ticker, shared in published.items():
+            data_hash = data_hashes.get(ticker)
+            for strat in strategies:
+                cache_entry = None
+                if use_cache:
+                    cache_entry = (*result_cache.make_key(strat["code"], strat.get("params"), data_hash), data_hash)
+                    cached = None if with_trades else result_cache.get(cache_entry[0])
+                    if cached is not None:
+                        results[ticker][strat["name"]] = dict(cached, cached=True)
+                        continue
+                job = pool.apply_async(_run_cell, (shared.handle(), strat["code"], strat.get("params"), timeout, with_trades))
+                pending.append((ticker, strat["name"], job, cache_entry))
+
+        # 3. Collect. Workers enforce the per-strategy limit themselves; this
+        # deadline only catches a worker that can't be interrupted.
+        waves = math.ceil(len(pending) / max(1, MAX_WORKERS))
+        deadline = time.monotonic() + waves * timeout + 5
+        stuck = False
+        for ticker, name, job, cache_entry in pending:
+            remaining = max(0.0, deadline - time.monotonic())
+            try:
+                results[ticker][name] = _absorb(job.get(timeout=remaining), name)
+                if cache_entry:
+                    result_cache.put(*cache_entry, results[ticker][name])
+            except mp.TimeoutError:
+                results[ticker][name] = {"error": f"Timed out after {timeout}s"}
+                stuck = True
+            except Exception as e:
+                results[ticker][name] = {"error": str(e)}
+        if stuck:
+            _reset_pool()
+    finally:
+        for shared in published.values():
+            shared.release()
+
+    return results
@@ -0,0 +1,8 @@
+"""
+Offline benchmark suite for the backtest, optimizer and allocator hot paths.
+
+    cd backend
+    python -m benchmarks.run --sizes 1k,10k --out bench.json
+    python -m benchmarks.run --sizes 1k,10k --baseline bench.json --threshold 0.25
+    python -m benchmarks.startup --budget 1.0
+"""
@@ -0,0 +1,183 @@
+import asyncio
+import os
+
+import numpy as np
+
+from benchmarks.synthetic import make_ohlcv, MAX_DAILY_BARS
+
+# Benchmark cases. Each case has make_input() (untimed, called before every
+# run so in-place mutation by run_backtest can't leak between runs) and
+# fn(input) (timed). Per-unit cost is wall time / units: bars for backtests,
+# arm-allocations for the allocator.
+
+STRATEGY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "strategies")
+BUNDLED_STRATEGIES = ["golden-cross1", "rsi-bot1", "golden-cross-rl"]
+
+# Largest n each path is run at; the slow paths would take hours beyond this
+PATH_LIMITS = {
+    "signals.per_bar": 2_000,
+    "signals.incremental": 1_000_000,
+    "signals.vectorized": 10_000_000,
+    "signals.vectorized_cached": 10_000_000,
+    "run_backtest": 10_000_000,
+    "execute_strategy": 10_000_000,
+    "run_backtest_stream": 10_000_000,
+    "param_grid": 100_000,
+    "optimize_strategy": 10_000,
+}
+GRID_POINTS = 64
+OPTIMIZER_EVALS = 16
+MAB_ARMS = [3, 100, 1_000]
+MAB_CALLS = 1_000
+MAB_DRAWS = 2_000
+STREAM_CHUNK_ROWS = 100_000
+
+
+class Case:
+    def __init__(self, path, strategy, n, freq, make_input, fn, limit=None, units=None):
+        self.path = path
+        self.strategy = strategy
+        self.n = n
+        self.freq = freq
+        self.make_input = make_input
+        self.fn = fn
+        self.limit = limit if limit is not None else PATH_LIMITS.get(path)
+        self.units = units or n  # What per-unit cost is divided by
+
+    @property
+    def name(self):
+        parts = [self.path, self.strategy, str(self.n), self.freq]
+        return "/".join(p for p in parts if p)
+
+
+def load_code(strategy: str) -> str:
+    with open(os.path.join(STRATEGY_DIR, f"{strategy}.py")) as f:
+        return f.read()
+
+
+def build_cases(sizes, freqs, seed=0, paths=None):
+    """
+    Every (path, strategy, size, freq) combination within PATH_LIMITS.
+    paths: optional list of substrings to filter case names by.
+    """
+    from execution_engine import load_strategy_class, execute_strategy, execute_strategy_stream, execute_param_grid
+    from rl_brain import optimize_strategy, detect_parameters
+    from result_cache import result_cache
+    from mab_logic import FairMultiArmedBandit
+    from strategies.indicator_cache import indicator_cache
+
+    cases = []
+    frames = {}
+
+    def frame(n, freq):
+        # One shared read-only original per size; every run gets its own copy
+        if (n, freq) not in frames:
+            frames[(n, freq)] = make_ohlcv(n, freq=freq, seed=seed)
+        return frames[(n, freq)]
+
+    for freq in freqs:
+        for n in sizes:
+            if freq == "daily" and n > MAX_DAILY_BARS:
+                continue  # e.g. 10M daily bars don't fit in a datetime64 index
+
+            for strategy in BUNDLED_STRATEGIES:
+                code = load_code(strategy)
+                cls = load_strategy_class(code)
+                probe = cls()
+
+                def copy(n=n, freq=freq):
+                    indicator_cache.clear()  # Cold indicators: every run computes its own
+                    return frame(n, freq).copy()
+
+                signal_paths = [("signals.per_bar", "generate_signals_per_bar")]
+                if probe.has_incremental_signals():
+                    signal_paths.append(("signals.incremental", "generate_signals_incremental"))
+                if probe.has_vectorized_signals():
+                    signal_paths.append(("signals.vectorized", "generate_signals"))
+                for path, method in signal_paths:
+                    cases.append(Case(path, strategy, n, freq, copy,
+                                      lambda df, cls=cls, method=method: getattr(cls(), method)(df)))
+                if probe.has_vectorized_signals():
+                    # A second strategy on the same data in a battle: indicators come from the cache
+                    def warm(n=n, freq=freq, cls=cls):
+                        df = copy(n, freq)
+                        cls().generate_signals(df)
+                        return df
+                    cases.append(Case("signals.vectorized_cached", strategy, n, freq, warm,
+                                      lambda df, cls=cls: cls().generate_signals(df)))
+
+                # Full backtest uses the fastest path the strategy has
+                fastest = "signals.vectorized" if probe.has_vectorized_signals() else (
+                    "signals.incremental" if probe.has_incremental_signals() else "signals.per_bar")
+                limit = PATH_LIMITS[fastest]
+                cases.append(Case("run_backtest", strategy, n, freq, copy,
+                                  lambda df, cls=cls: cls().run_backtest(df), limit=limit))
+                cases.append(Case("execute_strategy", strategy, n, freq, copy,
+                                  lambda df, code=code: execute_strategy(code, df), limit=limit))
+                if probe.has_incremental_signals() or probe.lookback_bars() is not None:
+                    # Same backtest in bounded memory: compare peak_mem_mb with run_backtest
+                    cases.append(Case("run_backtest_stream", strategy, n, freq, copy,
+                                      lambda df, code=code: execute_strategy_stream(code, _chunks(df, STREAM_CHUNK_ROWS)),
+                                      limit=limit))
+
+                grid = _grid_for(detect_parameters(code)[0])
+                if grid:
+                    cases.append(Case("param_grid", strategy, n, freq, copy,
+                                      lambda df, code=code, grid=grid: execute_param_grid(code, df, grid)))
+
+                def fresh_for_optimizer(n=n, freq=freq):
+                    result_cache.purge()  # Otherwise every repeat would be a cache hit
+                    return frame(n, freq).copy()
+                cases.append(Case("optimize_strategy", strategy, n, freq, fresh_for_optimizer,
+                                  lambda df, code=code: _drain(optimize_strategy(code, df, engine="random",
+                                                                                max_evals=OPTIMIZER_EVALS, seed=seed))))
+
+    for arms in MAB_ARMS:
+        def make_bandit(arms=arms):
+            np.random.seed(seed)
+            bandit = FairMultiArmedBandit(n_arms=arms)
+            bandit.alpha[:] = np.random.randint(1, 20, arms)
+            bandit.beta[:] = np.random.randint(1, 20, arms)
+            return bandit
+        cases.append(Case("mab.calculate_allocation", "", arms, "", make_bandit,
+                          lambda bandit: [bandit.calculate_allocation(50) for _ in range(MAB_CALLS)],
+                          units=arms * MAB_CALLS))
+        cases.append(Case("mab.expected_allocation", "", arms, "", make_bandit,
+                          lambda bandit: bandit.expected_allocation(50, n_draws=MAB_DRAWS),
+                          units=arms * MAB_DRAWS))
+
+    selected = []
+    for case in cases:
+        if case.limit is not None and case.n > case.limit:
+            continue
+        if paths and not any(p in case.name for p in paths):
+            continue
+        selected.append(case)
+    return selected
+
+
+def _grid_for(defaults):
+    # Small sweep around the strategy's own defaults
+    names = list(defaults)
+    if not names:
+        return []
+    base = defaults
+    grid = []
+    for k in range(GRID_POINTS):
+        params = dict(base)
+        for j, n in enumerate(names):
+            params[n] = int(base[n]) + ((k >> j) % 4) * 3
+        grid.append(params)
+    return grid
+
+
+def _chunks(df, rows):
+    for start in range(0, len(df), rows):
+        yield df.iloc[start:start + rows]
+
+
+def _drain(agen):
+    async def consume():
+        async for _ in agen:
+            pass
+    asyncio.run(consume())
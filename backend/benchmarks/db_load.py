@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# Concurrent-read load test for the database layer.
+# Builds a scratch DB of strategies, then runs N reader threads polling the
+# strategy list while one writer keeps committing (as the job queue and result
+# cache do), under each combination of
+#   engine:  plain (rollback journal, synchronous=FULL) | tuned (WAL, NORMAL, cache)
+#   listing: full rows with code (the old /api/strategies) | summary page
+# and reports read throughput, read latency and writer commits.
+
+if "ALPHA_DB_URL" not in os.environ:
+    os.environ["ALPHA_DB_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="alpha-bench-"), "bench.db")
+
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, make_engine
+from models import Strategy
+
+CODE_BYTES = 4000   # Typical generated strategy source
+
+
+def build_db(path: str, n_strategies: int, seed: int = 0):
+    rng = random.Random(seed)
+    db_engine = make_engine("sqlite:///" + path, tuned=False)
+    Base.metadata.create_all(bind=db_engine, tables=[Strategy.__table__])
+    filler = "# " + "x" * 76 + "\n"
+    with db_engine.begin() as conn:
+        conn.execute(Strategy.__table__.insert(), [{
+            "name": f"strategy_{i}",
+            "filename": f"strategy_{i}.py",
+            "code": f"class AlphaStrategy(BaseStrategy):  # {i}\n" + filler * (CODE_BYTES // len(filler)),
+            "sharpe_ratio": round(rng.gauss(0.5, 1.0), 4),
+        } for i in range(n_strategies)])
+    db_engine.dispose()
+
+
+def _read_full(db):
+    return len(db.query(Strategy).all())
+
+def _read_summary(db):
+    from main import _list_strategies
+    return len(_list_strategies(db, 200, 0, "id")[0])
+
+LISTINGS = {"full": _read_full, "summary": _read_summary}
+
+
+def run_scenario(path: str, tuned: bool, listing: str, readers: int, seconds: float,
+                 write_interval: float, n_strategies: int) -> dict:
+    db_engine = make_engine("sqlite:///" + path, tuned=tuned)
+    Session = sessionmaker(bind=db_engine)
+    read = LISTINGS[listing]
+    read(Session())  # Warm-up: connect, apply pragmas, load pages
+
+    stop = threading.Event()
+    latencies = [[] for _ in range(readers)]
+    errors = {"read": 0, "write": 0}
+    commits = [0]
+
+    def reader(slot):
+        while not stop.is_set():
+            db = Session()
+            started = time.perf_counter()
+            try:
+                read(db)
+                latencies[slot].append(time.perf_counter() - started)
+            except Exception:
+                errors["read"] += 1
+            finally:
+                db.close()
+
+    def writer():
+        rng = random.Random(1)
+        while not stop.is_set():
+            db = Session()
+            try:
+                db.query(Strategy).filter(Strategy.id == rng.randint(1, n_strategies)) \
+                    .update({Strategy.sharpe_ratio: rng.gauss(0.5, 1.0)})
+                db.commit()
+                commits[0] += 1
+            except Exception:
+                db.rollback()
+                errors["write"] += 1
+            finally:
+                db.close()
+            time.sleep(write_interval)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    db_engine.dispose()
+
+    samples = sorted(x for slot in latencies for x in slot)
+    return {
+        "engine": "tuned" if tuned else "plain",
+        "listing": listing,
+        "readers": readers,
+        "reads_per_s": round(len(samples) / seconds, 1),
+        "read_p50_ms": round(statistics.median(samples) * 1000, 3) if samples else None,
+        "read_p95_ms": round(samples[int(0.95 * (len(samples) - 1))] * 1000, 3) if samples else None,
+        "commits_per_s": round(commits[0] / seconds, 1),
+        "read_errors": errors["read"],
+        "write_errors": errors["write"],
+    }
+
+
+def run_load_test(n_strategies=2000, readers=8, seconds=5.0, write_interval=0.002, verbose=True) -> dict:
+    workdir = tempfile.mkdtemp(prefix="alpha-dbload-")
+    results = []
+    for tuned in (False, True):
+        for listing in LISTINGS:
+            # Fresh file per scenario: journal_mode=WAL is persistent
+            path = os.path.join(workdir, f"{'tuned' if tuned else 'plain'}-{listing}.db")
+            build_db(path, n_strategies)
+            result = run_scenario(path, tuned, listing, readers, seconds, write_interval, n_strategies)
+            results.append(result)
+            if verbose:
+                print(f"{result['engine']:<6} {result['listing']:<8} {result['reads_per_s']:>10.1f} reads/s "
+                      f"p50 {result['read_p50_ms']:>9.2f} ms  p95 {result['read_p95_ms']:>9.2f} ms  "
+                      f"{result['commits_per_s']:>7.1f} commits/s  errors {result['read_errors']}/{result['write_errors']}",
+                      flush=True)
+
+    by_key = {(r["engine"], r["listing"]): r for r in results}
+    baseline, best = by_key[("plain", "full")], by_key[("tuned", "summary")]
+    return {
+        "meta": {"strategies": n_strategies, "readers": readers, "seconds": seconds,
+                 "write_interval_s": write_interval, "python": sys.version.split()[0]},
+        "results": results,
+        "read_speedup": round(best["reads_per_s"] / baseline["reads_per_s"], 2) if baseline["reads_per_s"] else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Alpha-Mechanism concurrent read load test")
+    parser.add_argument("--strategies", type=int, default=2000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each scenario")
+    parser.add_argument("--write-interval", type=float, default=0.002, help="Writer pause between commits (s)")
+    parser.add_argument("--out", help="Write the results JSON here")
+    args = parser.parse_args(argv)
+
+    report = run_load_test(args.strategies, args.readers, args.seconds, args.write_interval)
+    print(f"Reads/s, tuned+summary vs plain+full: x{report['read_speedup']}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
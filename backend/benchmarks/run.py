@@ -0,0 +1,173 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Benchmarks must never touch the real alpha.db (the optimizer writes to the
+# result cache), so point the DB at a scratch file before anything imports it.
+if "ALPHA_DB_URL" not in os.environ:
+    os.environ["ALPHA_DB_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="alpha-bench-"), "bench.db")
+
+from benchmarks.cases import build_cases
+from benchmarks.synthetic import parse_size
+
+# Noise floor: differences smaller than this are never called a regression
+MIN_DELTA_S = 0.001
+
+
+def measure(case, repeat: int) -> dict:
+    """
+    Times fn(input) `repeat` times (inputs are rebuilt outside the timer),
+    then does one extra run under tracemalloc for peak memory.
+    """
+    if case.units <= 100_000 and repeat > 1:
+        case.fn(case.make_input())  # Warm-up: fill compile/strategy caches
+
+    timings = []
+    for _ in range(repeat):
+        data = case.make_input()
+        gc.collect()
+        start = time.perf_counter()
+        case.fn(data)
+        timings.append(time.perf_counter() - start)
+        del data
+
+    data = case.make_input()
+    gc.collect()
+    tracemalloc.start()
+    case.fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+
+    best = min(timings)
+    return {
+        "name": case.name,
+        "path": case.path,
+        "strategy": case.strategy,
+        "n": case.n,
+        "freq": case.freq,
+        "repeat": repeat,
+        "wall_s": round(best, 6),
+        "wall_median_s": round(statistics.median(timings), 6),
+        "peak_mem_mb": round(peak / 2**20, 3),
+        "ns_per_unit": round(best / case.units * 1e9, 2),
+    }
+
+
+def run_suite(sizes, freqs, repeat=3, seed=0, paths=None, verbose=True) -> dict:
+    import numpy as np
+    import pandas as pd
+
+    results = []
+    for case in build_cases(sizes, freqs, seed=seed, paths=paths):
+        result = measure(case, repeat)
+        results.append(result)
+        if verbose:
+            print(f"{result['name']:<55} {result['wall_s']*1000:>10.2f} ms "
+                  f"{result['peak_mem_mb']:>9.1f} MB {result['ns_per_unit']:>12.1f} ns/unit", flush=True)
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """
+    Returns one row per case present in both runs; status is
+    "regression" when wall time grew by more than threshold (e.g. 0.2 = 20%).
+    """
+    base = {r["name"]: r for r in baseline["results"]}
+    rows = []
+    for r in current["results"]:
+        old = base.get(r["name"])
+        if old is None:
+            continue
+        ratio = r["wall_s"] / old["wall_s"] if old["wall_s"] else float("inf")
+        delta = r["wall_s"] - old["wall_s"]
+        if ratio > 1 + threshold and delta > MIN_DELTA_S:
+            status = "regression"
+        elif ratio < 1 - threshold and -delta > MIN_DELTA_S:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append({
+            "name": r["name"],
+            "baseline_s": old["wall_s"],
+            "current_s": r["wall_s"],
+            "ratio": round(ratio, 3),
+            "baseline_mem_mb": old.get("peak_mem_mb"),
+            "current_mem_mb": r.get("peak_mem_mb"),
+            "status": status,
+        })
+    return rows
+
+
+def print_comparison(rows):
+    for row in rows:
+        flag = {"regression": "!! ", "improved": "++ "}.get(row["status"], "   ")
+        print(f"{flag}{row['name']:<55} {row['baseline_s']*1000:>10.2f} -> "
+              f"{row['current_s']*1000:>10.2f} ms  x{row['ratio']:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Alpha-Mechanism hot-path benchmarks (offline)")
+    parser.add_argument("--sizes", default="1k,10k", help="Comma list: 1k,10k,100k,1M,10M or raw ints")
+    parser.add_argument("--freqs", default="daily", help="Comma list of daily,minute")
+    parser.add_argument("--paths", default="", help="Only run cases whose name contains one of these")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Compare this run against a stored results JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two stored results files without running anything")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+    else:
+        sizes = [parse_size(s) for s in args.sizes.split(",") if s]
+        freqs = [f for f in args.freqs.split(",") if f]
+        paths = [p for p in args.paths.split(",") if p] or None
+        current = run_suite(sizes, freqs, repeat=args.repeat, seed=args.seed, paths=paths)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(current, f, indent=2)
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+
+    if baseline is None:
+        return 0
+
+    rows = compare(baseline, current, args.threshold)
+    print_comparison(rows)
+    regressions = [r for r in rows if r["status"] == "regression"]
+    print(f"{len(regressions)} regression(s) over {args.threshold:.0%} across {len(rows)} shared cases")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Startup budget check.
+# Imports the app in a fresh interpreter under `python -X importtime`, reports
+# the slowest imports and fails when startup goes over budget or when one of
+# the heavy optional subsystems (which main.py loads lazily) sneaks back in.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BUDGET_S = 1.0
+# Must not be imported just to start the API
+DEFAULT_FORBIDDEN = ["pandas", "numpy", "yfinance", "google.generativeai", "fitz", "torch"]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+{module}.create_app()
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed_s": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def parse_importtime(stderr: str) -> list:
+    """
+    Returns [{"module", "self_us", "cumulative_us", "depth"}] in import order.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = _split(line)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append({"module": name.strip(), "self_us": self_us, "cumulative_us": cumulative_us, "depth": depth})
+    return rows
+
+def _split(line: str):
+    # "import time:  self_us | cumulative_us | <2 spaces per nesting level>name"
+    self_us, cumulative_us, name = line.split(":", 1)[1].split("|", 2)
+    return int(self_us), int(cumulative_us), name[1:]
+
+
+def direct_imports(rows: list, module: str) -> list:
+    """
+    What `module` itself imported, each charged with everything it pulled in.
+    importtime prints children before their parent, one level deeper.
+    """
+    end = next((i for i, r in enumerate(rows) if r["module"] == module and r["depth"] == 0), None)
+    if end is None:
+        return []
+    direct = []
+    for r in reversed(rows[:end]):
+        if r["depth"] == 0:
+            break
+        if r["depth"] == 1:
+            direct.append(r)
+    return direct[::-1]
+
+
+def measure_startup(module: str = "main") -> dict:
+    env = dict(os.environ)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+    probe = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {"elapsed_s": probe["elapsed_s"], "modules": probe["modules"],
+            "imports": parse_importtime(proc.stderr)}
+
+
+def report(module="main", repeat=3, top=15, budget=DEFAULT_BUDGET_S, forbidden=None) -> dict:
+    runs = [measure_startup(module) for _ in range(repeat)]
+    best = min(runs, key=lambda r: r["elapsed_s"])  # First run also pays for cold .pyc/disk caches
+    forbidden = DEFAULT_FORBIDDEN if forbidden is None else forbidden
+    loaded = set(best["modules"])
+
+    direct = direct_imports(best["imports"], module)
+    return {
+        "module": module,
+        "elapsed_s": round(best["elapsed_s"], 4),
+        "elapsed_runs_s": [round(r["elapsed_s"], 4) for r in runs],
+        "budget_s": budget,
+        "over_budget": best["elapsed_s"] > budget,
+        "modules_loaded": len(loaded),
+        "forbidden_loaded": [m for m in forbidden if m in loaded],
+        "slowest_direct": sorted(direct, key=lambda r: -r["cumulative_us"])[:top],
+        "slowest_self": sorted(best["imports"], key=lambda r: -r["self_us"])[:top],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Alpha-Mechanism startup import-time report")
+    parser.add_argument("--module", default="main", help="Module exposing create_app()")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_S, help="Seconds allowed for import + create_app()")
+    parser.add_argument("--forbid", default=",".join(DEFAULT_FORBIDDEN),
+                        help="Comma list of modules that must not be imported at startup")
+    parser.add_argument("--out", help="Write the report JSON here")
+    args = parser.parse_args(argv)
+
+    result = report(args.module, repeat=args.repeat, top=args.top, budget=args.budget,
+                    forbidden=[m for m in args.forbid.split(",") if m])
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+    print(f"{args.module}: {result['elapsed_s'] * 1000:.0f} ms (budget {args.budget * 1000:.0f} ms), "
+          f"{result['modules_loaded']} modules")
+    print(f"Slowest imports made by {args.module} (cumulative):")
+    for row in result["slowest_direct"]:
+        print(f"  {row['cumulative_us'] / 1000:>9.1f} ms  {row['module']}")
+
+    failed = False
+    if result["over_budget"]:
+        print(f"!! Startup is over budget by {(result['elapsed_s'] - args.budget) * 1000:.0f} ms")
+        failed = True
+    if result["forbidden_loaded"]:
+        print(f"!! Heavy modules imported at startup: {', '.join(result['forbidden_loaded'])}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+# Seeded synthetic OHLCV, so benchmarks never need the network and two runs
+# on the same seed see byte-identical data.
+
+FREQS = {
+    "daily": "D",
+    "minute": "min",
+}
+
+# datetime64[ns] only spans 1677-2262, which caps a daily index at ~213k bars
+MAX_DAILY_BARS = 200_000
+
+SIZES = {
+    "1k": 1_000,
+    "10k": 10_000,
+    "100k": 100_000,
+    "1M": 1_000_000,
+    "10M": 10_000_000,
+}
+
+def parse_size(label: str) -> int:
+    if label in SIZES:
+        return SIZES[label]
+    return int(label)
+
+def make_ohlcv(n_bars: int, freq: str = "daily", seed: int = 0,
+               drift: float = 0.0002, volatility: float = 0.01) -> pd.DataFrame:
+    """
+    Geometric random walk for Close; Open/High/Low/Volume built around it.
+    Columns match what yfinance returns (Open, High, Low, Close, Volume).
+    """
+    if freq not in FREQS:
+        raise ValueError(f"Unknown freq '{freq}'. Choose from {sorted(FREQS)}")
+    if freq == "daily" and n_bars > MAX_DAILY_BARS:
+        raise ValueError(f"A daily index can't hold {n_bars} bars (max {MAX_DAILY_BARS})")
+
+    rng = np.random.default_rng(seed)
+    log_returns = rng.normal(drift, volatility, n_bars)
+    close = 100.0 * np.exp(np.cumsum(log_returns))
+
+    open_ = np.empty(n_bars)
+    open_[0] = 100.0
+    open_[1:] = close[:-1] * (1 + rng.normal(0, volatility / 4, n_bars - 1))
+    spread = np.abs(rng.normal(0, volatility / 2, n_bars))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.lognormal(13, 0.5, n_bars).round()
+
+    start = "1700-01-01" if freq == "daily" else "2000-01-03"
+    index = pd.date_range(start, periods=n_bars, freq=FREQS[freq], name="Date")
+    return pd.DataFrame({
+        "Open": open_,
+        "High": high,
+        "Low": low,
+        "Close": close,
+        "Volume": volume,
+    }, index=index)
@@ -0,0 +1,208 @@
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+
+# Battle chart payloads.
+# A chart is a shared date axis plus one float array per series (Benchmark and
+# each strategy's equity, both rebased to 100). Long histories are cut down to
+# a client point budget with LTTB before anything is formatted, and the result
+# goes out in one of three layouts:
+#   rows      [{"date", "Benchmark", <strategy>...}, ...]   (original shape)
+#   columnar  {"dates": [...], "series": {name: [...]}}
+#   binary    one buffer for all tickers, see pack_binary()
+
+FORMATS = ("rows", "columnar", "binary")
+DTYPES = {"float32": np.float32, "float64": np.float64}
+DECIMALS = 2               # JSON precision (chart resolution)
+BINARY_MAGIC = b"ABT1"
+
+
+class Chart:
+    def __init__(self, index: pd.DatetimeIndex, series: dict, n_source: int = None):
+        self.index = index
+        self.series = series            # {name: float64 array, NaN = no value}
+        self.n_source = len(index) if n_source is None else n_source
+
+
+def battle_chart(df: pd.DataFrame, cells: dict) -> Chart:
+    """
+    cells: {strategy_name: result} for one ticker; failed cells are skipped.
+    Equity curves shorter than the data are padded with NaN.
+    """
+    n = len(df)
+    close = df["Close"].to_numpy(dtype=np.float64)
+    benchmark = np.empty(n)
+    if n:
+        benchmark[0] = 1.0
+        benchmark[1:] = close[1:] / close[:-1]
+        benchmark = np.nan_to_num(benchmark, nan=1.0).cumprod() * 100  # pct_change().fillna(0) equivalent
+
+    series = {"Benchmark": benchmark}
+    for name, result in cells.items():
+        if "error" in result:
+            continue
+        curve = np.asarray(result["equity_curve"], dtype=np.float64)[:n] * 100
+        if len(curve) < n:
+            curve = np.concatenate([curve, np.full(n - len(curve), np.nan)])
+        series[name] = curve
+    return Chart(df.index, series)
+
+
+# --- Downsampling ---
+
+def lttb_indices(ys: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets over several series sharing one x axis.
+    ys: (n_series, n). Each series is scaled to its own range and a bucket's
+    point is the one with the largest triangle area summed over series, so the
+    kept dates suit every line at once. The first and last points and every
+    series' global min and max are always kept (so the result can run a few
+    points over n_out). Returns sorted indices.
+    """
+    n = ys.shape[1]
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    n_out = max(n_out, 3)
+
+    # 1. Scale each series to [0, 1]; gaps count as the bottom of the range
+    lo = np.nanmin(ys, axis=1, keepdims=True)
+    span = np.nanmax(ys, axis=1, keepdims=True) - lo
+    span[~(span > 0)] = 1.0
+    z = np.nan_to_num((ys - np.nan_to_num(lo)) / span)
+    x = np.arange(n, dtype=np.float64)
+
+    # 2. n_out - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        start, stop = edges[b], edges[b + 1]
+        next_start, next_stop = (edges[b + 1], edges[b + 2]) if b + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = z[:, next_start:next_stop].mean(axis=1, keepdims=True)
+        cx, cy = x[start:stop], z[:, start:stop]
+        ay = z[:, a:a + 1]
+        area = np.abs((x[a] - avg_x) * (cy - ay) - (x[a] - cx) * (avg_y - ay)).sum(axis=0)
+        a = start + int(area.argmax())
+        selected[b + 1] = a
+
+    # 3. Visual extremes
+    finite = ~np.isnan(ys).all(axis=1)
+    extremes = np.concatenate([np.nanargmin(ys[finite], axis=1), np.nanargmax(ys[finite], axis=1)])
+    return np.union1d(selected, extremes)
+
+def downsample(chart: Chart, max_points: int = None) -> Chart:
+    if not max_points or len(chart.index) <= max_points:
+        return chart
+    keep = lttb_indices(np.vstack(list(chart.series.values())), max_points)
+    return Chart(chart.index[keep], {name: values[keep] for name, values in chart.series.items()}, chart.n_source)
+
+
+# --- Encoders ---
+
+def format_dates(index: pd.DatetimeIndex) -> list:
+    # Daily bars keep the original "YYYY-MM-DD" labels; intraday bars need the time
+    intraday = len(index) and (index.normalize() != index).any()
+    return index.strftime("%Y-%m-%dT%H:%M:%S" if intraday else "%Y-%m-%d").tolist()
+
+def _json_values(values: np.ndarray, decimals: int) -> list:
+    rounded = np.round(values, decimals)
+    nan = np.isnan(rounded)
+    if nan.any():
+        return np.where(nan, None, rounded).tolist()  # JSON has no NaN
+    return rounded.tolist()
+
+def to_rows(chart: Chart, decimals: int = DECIMALS) -> list:
+    names = list(chart.series)
+    columns = [_json_values(chart.series[name], decimals) for name in names]
+    keys = ["date", *names]
+    rows = [dict(zip(keys, row)) for row in zip(format_dates(chart.index), *columns)]
+    if any(None in column for column in columns):
+        # A short equity curve leaves its key out of the later rows, as before
+        rows = [{k: v for k, v in row.items() if v is not None} for row in rows]
+    return rows
+
+def to_columnar(chart: Chart, decimals: int = DECIMALS) -> dict:
+    return {
+        "dates": format_dates(chart.index),
+        "series": {name: _json_values(values, decimals) for name, values in chart.series.items()},
+        "n_points": len(chart.index),
+        "n_source": chart.n_source,
+    }
+
+def pack_binary(charts: dict, dtype: str = "float32", meta: dict = None) -> bytes:
+    """
+    charts: {ticker: Chart}. Layout (little-endian):
+        b"ABT1" | uint32 header length | header JSON | arrays, each 8-byte aligned
+    Header: {"dtype", "tickers": {ticker: {"n_points", "n_source", "dates": offset,
+    "series": {name: offset}}}, **meta}. Dates are float64 epoch milliseconds
+    (new Date(ms) in JS); series use dtype, NaN = no value. Offsets are from the
+    start of the buffer, so a client can wrap them in typed arrays without copying.
+    """
+    np_dtype = DTYPES[dtype]
+    arrays, layout = [], {}
+    for ticker, chart in charts.items():
+        index = pd.DatetimeIndex(chart.index)
+        if index.tz is not None:
+            index = index.tz_convert("UTC").tz_localize(None)
+        entry = {"n_points": len(index), "n_source": chart.n_source, "series": {}}
+        arrays.append((entry, None, index.values.astype("datetime64[ms]").astype(np.int64).astype(np.float64)))
+        for name, values in chart.series.items():
+            arrays.append((entry, name, values.astype(np_dtype)))
+        layout[ticker] = entry
+
+    # Offsets depend on the header length, which depends on the offsets:
+    # grow the data start until the header fits in front of it, then pad.
+    header = {"dtype": dtype, "tickers": layout, **(meta or {})}
+    base = 8
+    while True:
+        _assign_offsets(arrays, base)
+        header_bytes = json.dumps(header, default=str).encode("utf-8")
+        needed = _align(8 + len(header_bytes))
+        if needed <= base:
+            break
+        base = needed
+    header_bytes = header_bytes.ljust(base - 8)
+
+    out = bytearray(BINARY_MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+    for _, _, values in arrays:
+        out.extend(b"\0" * (_align(len(out)) - len(out)))
+        out.extend(values.tobytes())
+    return bytes(out)
+
+def _assign_offsets(arrays, base: int):
+    offset = base
+    for entry, name, values in arrays:
+        offset = _align(offset)
+        if name is None:
+            entry["dates"] = offset
+        else:
+            entry["series"][name] = offset
+        offset += values.nbytes
+
+def _align(offset: int, to: int = 8) -> int:
+    return -(-offset // to) * to
+
+def unpack_binary(payload: bytes) -> dict:
+    """
+    Inverse of pack_binary, for Python clients: {"header": ..., "tickers":
+    {ticker: {"dates": DatetimeIndex, "series": {name: array}}}}.
+    """
+    if payload[:4] != BINARY_MAGIC:
+        raise ValueError("Not a battle chart buffer")
+    (header_len,) = struct.unpack("<I", payload[4:8])
+    header = json.loads(payload[8:8 + header_len].decode("utf-8").rstrip())
+    np_dtype = DTYPES[header["dtype"]]
+    tickers = {}
+    for ticker, entry in header["tickers"].items():
+        n = entry["n_points"]
+        dates = np.frombuffer(payload, dtype=np.float64, count=n, offset=entry["dates"])
+        tickers[ticker] = {
+            "dates": pd.to_datetime(dates.astype(np.int64), unit="ms"),
+            "series": {name: np.frombuffer(payload, dtype=np_dtype, count=n, offset=offset)
+                       for name, offset in entry["series"].items()},
+        }
+    return {"header": header, "tickers": tickers}
@@ -1,14 +1,50 @@
 # backend/database.py
-from sqlalchemy import create_engine
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 # This creates the file 'alpha.db' inside the backend folder
-SQLITE_URL = "sqlite:///./alpha.db"
+# (ALPHA_DB_URL points somewhere else, e.g. a scratch DB for benchmarks)
+SQLITE_URL = os.getenv("ALPHA_DB_URL", "sqlite:///./alpha.db")
 
-engine = create_engine(
-    SQLITE_URL, connect_args={"check_same_thread": False}
-)
+# SQLite tuning, applied to every new connection.
+# WAL lets readers keep reading while one writer commits (the default rollback
+# journal locks the whole file), and with WAL synchronous=NORMAL is still
+# crash-safe: a power cut can only lose the last few commits, never corrupt.
+SQLITE_WAL = os.getenv("SQLITE_WAL", "1") == "1"
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))          # Page cache per connection
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+DB_THREADS = int(os.getenv("DB_THREADS", "8"))                     # Threads behind run_db
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        if SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")  # Negative = KiB
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 2**20}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+def make_engine(url: str = SQLITE_URL, tuned: bool = True):
+    """
+    tuned=False gives the plain engine (rollback journal, synchronous=FULL),
+    kept for the concurrency benchmark.
+    """
+    new_engine = create_engine(url, connect_args={"check_same_thread": False})
+    if tuned and new_engine.dialect.name == "sqlite" and new_engine.url.database not in (None, "", ":memory:"):
+        event.listen(new_engine, "connect", _apply_pragmas)
+    return new_engine
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -19,4 +55,46 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Async access.
+# SQLite has no truly async driver (aiosqlite also runs sqlite3 on a thread),
+# so async code awaits session work on a dedicated thread pool. Keeping it
+# separate from the default pool means DB reads never queue behind backtests.
+_db_executor = None
+
+def _get_db_executor():
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+    return _db_executor
+
+def _in_session(fn, args, session_factory):
+    db = session_factory()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+async def run_db(fn, *args, session_factory=None):
+    """
+    await run_db(fn, *args) -> fn(db, *args) run with its own session off the event loop.
+    fn commits itself if it writes.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_db_executor(), _in_session, fn, args, session_factory or SessionLocal)
+
+def ensure_schema(table):
+    """
+    create_all never alters an existing table, so columns and indexes a model
+    gained later are added here (SQLite ALTER TABLE ADD COLUMN; new columns are NULL).
+    """
+    table.create(bind=engine, checkfirst=True)
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name not in existing:
+                conn.exec_driver_sql(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}')
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
@@ -1,41 +1,254 @@
 import pandas as pd
-import importlib.util
+import numpy as np
+import hashlib
+import inspect
+import json
 import os
 import sys
+import threading
+import types
+from collections import OrderedDict
 # Make sure we can import BaseStrategy
 sys.path.append(os.path.join(os.path.dirname(__file__), "strategies"))
-from strategies.base import BaseStrategy
+from strategies.base import BaseStrategy, batch_metrics, trades_from_signals
+from strategies import backtest_kernel
+from strategy_compiler import vectorize
+from telemetry import span
 
-def execute_strategy(strategy_code: str, df: pd.DataFrame, params: dict = None):
+STRATEGY_HEADER = "from strategies.base import BaseStrategy\n"
+
+class StrategyCache:
+    """
+    In-process LRU of compiled AlphaStrategy classes, keyed by a hash of the source.
+    Modules are built in memory with compile/exec, so nothing is written to disk
+    and concurrent requests can't overwrite each other's code.
+    """
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self._classes = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def code_hash(strategy_code: str) -> str:
+        return hashlib.sha256(strategy_code.encode("utf-8")).hexdigest()
+
+    def get(self, strategy_code: str):
+        key = self.code_hash(strategy_code)
+        with self._lock:
+            cls = self._classes.get(key)
+            if cls is not None:
+                self._classes.move_to_end(key)
+                self.hits += 1
+                return cls
+            self.misses += 1
+
+        # Compile outside the lock (a slow import in one strategy shouldn't block the rest)
+        cls = _compile_strategy(strategy_code, key)
+
+        with self._lock:
+            self._classes[key] = cls
+            self._classes.move_to_end(key)
+            while len(self._classes) > self.max_size:
+                self._classes.popitem(last=False)
+                self.evictions += 1
+        return cls
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._classes),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._classes.clear()
+
+def _compile_strategy(strategy_code: str, key: str):
+    module_name = f"strategy_{key[:12]}"
+    module = types.ModuleType(module_name)
+    module.__file__ = f"<{module_name}>"
+    code_obj = compile(STRATEGY_HEADER + strategy_code, module.__file__, "exec")
+    exec(code_obj, module.__dict__)
+
+    if not hasattr(module, 'AlphaStrategy'):
+        raise ValueError("Class 'AlphaStrategy' not found")
+    # Strategies with only generate_signal get a whole-series generate_signals
+    # when their code translates (see strategy_compiler)
+    return vectorize(module.AlphaStrategy, strategy_code)
+
+strategy_cache = StrategyCache(max_size=int(os.getenv("STRATEGY_CACHE_SIZE", "64")))
+
+def load_strategy_class(strategy_code: str):
+    """
+    Returns the AlphaStrategy class for this source (compiled once, then cached).
+    """
+    return strategy_cache.get(strategy_code)
+
+def execute_strategy(strategy_code: str, df: pd.DataFrame, params: dict = None, with_trades: bool = False,
+                     costs: dict = None):
     """
     Runs the strategy with OPTIONAL custom parameters (for RL tuning).
+    costs: {"fee_bps", "slippage_bps"} overrides (see strategies/backtest_kernel.py).
+    with_trades adds result["trades"]: the trade events derived from the
+    signal's position changes (see trades_from_signals), for the ledger.
     """
-    temp_path = "strategies/temp_strategy_exec.py"
-    
-    # 1. Write Code
-    final_code = "from strategies.base import BaseStrategy\n" + strategy_code
-    with open(temp_path, "w") as f:
-        f.write(final_code)
-        
     try:
-        # 2. Import Module
-        spec = importlib.util.spec_from_file_location("temp_strategy_exec", temp_path)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        
-        if not hasattr(module, 'AlphaStrategy'):
-            return {"error": "Class 'AlphaStrategy' not found"}
-            
-        # 3. Instantiate with Custom Params (The Magic Step)
+        # 1. Load Class (cached by code hash)
+        with span("strategy.load"):
+            strategy_class = load_strategy_class(strategy_code)
+
+        # 2. Instantiate with Custom Params (The Magic Step)
         if params:
             # We unpack the dictionary: AlphaStrategy(short_window=12, long_window=30)
-            strategy_instance = module.AlphaStrategy(**params)
+            strategy_instance = strategy_class(**params)
         else:
-            strategy_instance = module.AlphaStrategy()
-        
-        # 4. Run Backtest
-        results = strategy_instance.run_backtest(df)
+            strategy_instance = strategy_class()
+
+        # 3. Run Backtest
+        results = strategy_instance.run_backtest(df, costs)
+        if with_trades and "Signal" in df:
+            results["trades"] = trades_from_signals(df["Signal"].to_numpy(), df["Close"].to_numpy(), df.index)
         return results
-        
+
+    except Exception as e:
+        return {"error": str(e)}
+
+def execute_strategy_stream(strategy_code: str, chunks, params: dict = None, equity_points: int = 1000,
+                            costs: dict = None):
+    """
+    execute_strategy over an iterable of consecutive OHLCV chunks, in bounded
+    memory (see BaseStrategy.run_backtest_stream).
+    """
+    try:
+        with span("strategy.load"):
+            strategy_class = load_strategy_class(strategy_code)
+        strategy_instance = strategy_class(**params) if params else strategy_class()
+        return strategy_instance.run_backtest_stream(chunks, equity_points=equity_points, costs=costs)
+
+    except Exception as e:
+        return {"error": str(e)}
+
+def strategy_info(strategy_code: str) -> dict:
+    """
+    What the optimizer and the result cache need to know about a strategy
+    before running it, from AlphaStrategy.__init__:
+      defaults  constructor arguments that have a default
+      params    every tunable argument with its default (10 when it has none)
+      ranges    search range per tunable argument (smart heuristics on the name)
+      grid      whether it has a batched generate_signals_grid
+    Values are JSON-safe, so the sandbox can send them back. {"error": ...} on failure.
+    """
+    try:
+        strategy_class = load_strategy_class(strategy_code)
+
+        # Get the arguments of __init__ (excluding 'self')
+        sig = inspect.signature(strategy_class.__init__)
+        defaults, params, param_ranges = {}, {}, {}
+        for name, param in sig.parameters.items():
+            if name == 'self': continue
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD): continue
+
+            # Default value
+            if param.default is not inspect.Parameter.empty:
+                defaults[name] = param.default
+            params[name] = param.default if param.default is not inspect.Parameter.empty else 10
+
+            # Set smart search ranges based on name
+            if 'window' in name or 'period' in name:
+                param_ranges[name] = (5, 100) # Search between 5 and 100
+            elif 'threshold' in name:
+                param_ranges[name] = (10, 90) # Search RSI thresholds
+            else:
+                param_ranges[name] = (1, 50) # Generic fallback
+
+        try:
+            grid = strategy_class().has_grid_signals()
+        except Exception:
+            grid = False  # Needs constructor arguments: no batched grid
+        info = {"defaults": defaults, "params": params, "ranges": param_ranges, "grid": grid}
+        return json.loads(json.dumps(info, default=str))
+
+    except Exception as e:
+        return {"error": str(e)}
+
+def signal_matrix(strategy_code: str, df: pd.DataFrame, param_grid: list) -> np.ndarray:
+    """
+    (len(param_grid), len(df)) signals, NaN as flat. Raises on strategy errors.
+    Row i of each signal only uses bars up to i, so a slice of this matrix is
+    what a backtest on that slice would trade with warmed-up indicators.
+    """
+    with span("strategy.load"):
+        strategy_class = load_strategy_class(strategy_code)
+    template = strategy_class()
+
+    with span("grid.signals"):
+        if template.has_grid_signals():
+            signals = np.asarray(template.generate_signals_grid(df, param_grid), dtype=np.float64)
+        else:
+            signals = np.array([
+                strategy_class(**params).compute_signals(df).to_numpy(dtype=np.float64)
+                for params in param_grid
+            ]).reshape(len(param_grid), len(df))
+        return np.nan_to_num(signals, nan=0.0)
+
+def execute_param_grid(strategy_code: str, df: pd.DataFrame, param_grid: list, costs: dict = None,
+                       objective: str = "sharpe"):
+    """
+    Scores every parameter set in param_grid in one vectorized pass.
+    Uses the strategy's generate_signals_grid when it has one; otherwise builds
+    the signal matrix row by row and still scores it in one batch.
+    Returns [{"params", "sharpe_ratio", "total_return_pct", "max_drawdown_pct", ...}]
+    in grid order, or {"error": ...}.
+    """
+    try:
+        signals = signal_matrix(strategy_code, df, param_grid)
+        return score_signals(signals, df['Close'].to_numpy(dtype=np.float64), param_grid, costs, objective)
+
+    except Exception as e:
+        return {"error": str(e)}
+
+def score_signals(signals: np.ndarray, close: np.ndarray, param_grid: list, costs: dict = None,
+                  objective: str = "sharpe") -> list:
+    """
+    execute_param_grid's result rows for a signal matrix that's already built.
+    A robustness objective ("robust_sharpe", "skill") adds its score to every
+    row, under robustness.OBJECTIVES[objective].
+    """
+    with span("grid.metrics"):
+        metrics = batch_metrics(signals, close, costs)
+    rows = [{
+        "params": params,
+        **backtest_kernel.rounded({name: values[k] for name, values in metrics.items()}),
+    } for k, params in enumerate(param_grid)]
+    if objective != "sharpe":
+        import robustness
+        with span("grid.robustness"):
+            scores = robustness.objective_scores(signals, close, objective, costs)
+        for row, score in zip(rows, scores):
+            row[robustness.OBJECTIVES[objective]] = round(float(score), 4) if np.isfinite(score) else None
+    return rows
+
+def execute_robustness(strategy_code: str, df: pd.DataFrame, params: dict = None, costs: dict = None, **options):
+    """
+    Bootstrap and random-entry analysis of the strategy's signals on df
+    (see robustness.analyze; options: n_samples, block_bars, seed).
+    """
+    try:
+        import robustness
+        with span("strategy.load"):
+            strategy_class = load_strategy_class(strategy_code)
+        strategy_instance = strategy_class(**params) if params else strategy_class()
+        with span("backtest.signals"):
+            signals = strategy_instance.compute_signals(df).to_numpy(dtype=np.float64)
+        with span("robustness.resample"):
+            return robustness.analyze(signals, df['Close'].to_numpy(dtype=np.float64), costs, **options)
+
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
@@ -0,0 +1,372 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from database import SessionLocal, Base, engine, _get_db_executor
+from models import Job, JobEvent
+
+# Background job queue.
+# Heavy work (backtests, battles, optimizations) is submitted as a job and
+# runs on a bounded set of asyncio workers, so the request returns a job id
+# right away and a dropped connection doesn't throw the work away.
+# Job rows and their NDJSON progress lines are persisted in SQLite; jobs that
+# were queued or running when the server stopped are re-queued on start().
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))            # Jobs running at once
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))  # Queued jobs before submit is refused
+JOB_KIND_LIMITS = os.getenv("JOB_KIND_LIMITS", "optimize=1,walk_forward=1")  # e.g. "optimize=1,battle=2"
+FLUSH_EVERY = 20  # Progress lines buffered before they're written to the DB
+
+
+class QueueFull(Exception):
+    pass
+
+
+def parse_kind_limits(spec: str) -> dict:
+    limits = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            kind, limit = part.split("=", 1)
+            limits[kind.strip()] = int(limit)
+    return limits
+
+
+class _LiveJob:
+    """
+    In-memory side of a queued/running job. Streams read from here; once the
+    job is finished (and flushed) they read from job_events instead.
+    """
+    def __init__(self, kind: str, payload: dict):
+        self.kind = kind
+        self.payload = payload
+        self.lines = []
+        self.flushed = 0
+        self.flush_lock = asyncio.Lock()
+        self.changed = asyncio.Event()  # Swapped for a fresh one after every set()
+        self.task = None
+        self.cancelled = False
+        self.abandoned = False  # Server shutting down: leave the DB row for the next start()
+        self.done = False
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class JobManager:
+    """
+    handlers: {kind: async fn(payload, emit) -> result}. emit(dict) appends
+    one progress packet (same shape as optimize_strategy's lines); it must be
+    called from the event loop. The returned result is stored as JSON.
+    """
+    def __init__(self, session_factory=SessionLocal, workers: int = JOB_WORKERS,
+                 queue_limit: int = JOB_QUEUE_LIMIT, kind_limits: dict = None):
+        self.session_factory = session_factory
+        self.workers = max(1, workers)
+        self.queue_limit = queue_limit
+        self.kind_limits = kind_limits if kind_limits is not None else parse_kind_limits(JOB_KIND_LIMITS)
+        self.handlers = {}
+
+        self._heap = []  # (-priority, seq, job_id)
+        self._seq = itertools.count()
+        self._live = {}
+        self._running = Counter()
+        self._available = None
+        self._worker_tasks = []
+
+    def register(self, kind: str, handler):
+        self.handlers[kind] = handler
+
+    # --- Lifecycle ---
+
+    async def start(self):
+        if self._available is not None:
+            return  # Already started (or starting)
+        self._available = asyncio.Event()
+        Base.metadata.create_all(bind=engine, tables=[Job.__table__, JobEvent.__table__])
+        for row in await self._db(self._load_unfinished):
+            self._enqueue(row["id"], row["kind"], row["payload"], row["priority"])
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # Running jobs are left as "running" in the DB so start() re-queues them
+        for live in list(self._live.values()):
+            if live.task:
+                live.abandoned = True
+                live.task.cancel()
+        for task in self._worker_tasks:
+            task.cancel()
+        self._worker_tasks = []
+        self._live.clear()
+        self._heap = []
+        self._available = None
+
+    # --- Public API ---
+
+    async def submit(self, kind: str, payload: dict, priority: int = 0) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}'. Choose from {sorted(self.handlers)}")
+        if self.queued() >= self.queue_limit:
+            raise QueueFull(f"{self.queued()} jobs already queued")
+        await self.start()
+
+        job_id = uuid.uuid4().hex
+        await self._db(self._insert, job_id, kind, payload, priority)
+        self._enqueue(job_id, kind, payload, priority)
+        return job_id
+
+    async def cancel(self, job_id: str) -> bool:
+        """
+        Queued jobs are dropped; running ones get CancelledError at their next
+        await (work already handed to a thread or worker process finishes in the
+        background and is discarded). Returns False if the job isn't active.
+        """
+        live = self._live.get(job_id)
+        if live is None or live.done:
+            return False
+        if live.task is None:
+            live.cancelled = True
+            await self._finish(job_id, live, "cancelled", None, "Cancelled before it started")
+        else:
+            live.task.cancel()
+        return True
+
+    def queued(self) -> int:
+        return sum(1 for live in self._live.values() if live.task is None and not live.cancelled)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "kind_limits": self.kind_limits,
+            "queued": self.queued(),
+            "running": dict(self._running),
+        }
+
+    async def get(self, job_id: str):
+        return await self._db(self._read_job, job_id)
+
+    async def list(self, status: str = None, kind: str = None, limit: int = 50, offset: int = 0):
+        return await self._db(self._list_jobs, status, kind, limit, offset)
+
+    async def stream(self, job_id: str, offset: int = 0):
+        """
+        Yields the job's NDJSON progress lines from offset on, following the
+        job live until it finishes.
+        """
+        live = self._live.get(job_id)
+        if live is None:
+            for line in await self._db(self._read_events, job_id, offset):
+                yield line + "\n"
+            return
+        while True:
+            changed = live.changed
+            while offset < len(live.lines):
+                yield live.lines[offset] + "\n"
+                offset += 1
+            if live.done:
+                return
+            await changed.wait()
+
+    # --- Scheduling ---
+
+    def _enqueue(self, job_id, kind, payload, priority):
+        self._live[job_id] = _LiveJob(kind, payload)
+        heapq.heappush(self._heap, (-priority, next(self._seq), job_id))
+        if self._available is not None:
+            self._available.set()
+
+    def _pick(self):
+        # Highest priority job whose kind is under its concurrency limit
+        held = []
+        picked = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            live = self._live.get(entry[2])
+            if live is None or live.cancelled:
+                continue
+            limit = self.kind_limits.get(live.kind)
+            if limit is not None and self._running[live.kind] >= limit:
+                held.append(entry)
+                continue
+            picked = entry[2]
+            break
+        for entry in held:
+            heapq.heappush(self._heap, entry)
+        return picked
+
+    async def _worker(self):
+        available = self._available
+        while True:
+            job_id = self._pick()
+            if job_id is None:
+                available.clear()
+                await available.wait()
+                continue
+
+            live = self._live[job_id]
+            self._running[live.kind] += 1
+            live.task = asyncio.create_task(self._run(job_id, live))
+            try:
+                await asyncio.wait({live.task})
+            finally:
+                self._running[live.kind] -= 1
+                available.set()  # A kind slot may have opened up
+
+    async def _run(self, job_id: str, live: _LiveJob):
+        emit = lambda packet: self._emit(job_id, live, packet)
+        try:
+            await self._db(self._mark_started, job_id)
+            result = await self.handlers[live.kind](live.payload, emit)
+            await self._finish(job_id, live, "succeeded", result, None)
+        except asyncio.CancelledError:
+            if live.abandoned:
+                raise
+            await self._finish(job_id, live, "cancelled", None, "Cancelled while running")
+        except Exception as e:
+            await self._finish(job_id, live, "failed", None, str(e))
+
+    def _emit(self, job_id: str, live: _LiveJob, packet: dict):
+        live.lines.append(json.dumps(packet, default=str))
+        live.notify()
+        if len(live.lines) - live.flushed >= FLUSH_EVERY:
+            asyncio.get_running_loop().create_task(self._flush(job_id, live))
+
+    async def _flush(self, job_id: str, live: _LiveJob):
+        async with live.flush_lock:
+            start, end = live.flushed, len(live.lines)
+            if end > start:
+                await self._db(self._insert_events, job_id, start, live.lines[start:end])
+                live.flushed = end
+
+    async def _finish(self, job_id, live, status, result, error):
+        packet = {"log": f"JOB {status.upper()}", "status": status}
+        if error:
+            packet["error"] = error
+        self._emit(job_id, live, packet)
+        await self._flush(job_id, live)
+        await self._db(self._mark_finished, job_id, status, result, error, len(live.lines))
+        live.done = True
+        live.notify()
+        self._live.pop(job_id, None)
+
+    # --- Persistence (runs on run_db's executor, so it never queues behind backtests) ---
+
+    async def _db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(_get_db_executor(), fn, *args)
+
+    def _session(self):
+        return self.session_factory()
+
+    def _insert(self, job_id, kind, payload, priority):
+        db = self._session()
+        try:
+            db.add(Job(id=job_id, kind=kind, status="queued", priority=priority,
+                       payload=json.dumps(payload, default=str)))
+            db.commit()
+        finally:
+            db.close()
+
+    def _load_unfinished(self):
+        db = self._session()
+        try:
+            rows = (db.query(Job).filter(Job.status.in_(("queued", "running")))
+                    .order_by(Job.created_at).all())
+            for row in rows:
+                row.status = "queued"  # Interrupted by a restart: run it again
+            if rows:
+                # The rerun streams its progress from scratch
+                db.query(JobEvent).filter(JobEvent.job_id.in_([r.id for r in rows])).delete(synchronize_session=False)
+            db.commit()
+            return [{"id": r.id, "kind": r.kind, "payload": json.loads(r.payload or "{}"),
+                     "priority": r.priority or 0} for r in rows]
+        finally:
+            db.close()
+
+    def _mark_started(self, job_id):
+        db = self._session()
+        try:
+            db.query(Job).filter(Job.id == job_id).update({"status": "running", "started_at": datetime.utcnow()})
+            db.commit()
+        finally:
+            db.close()
+
+    def _mark_finished(self, job_id, status, result, error, n_events):
+        db = self._session()
+        try:
+            db.query(Job).filter(Job.id == job_id).update({
+                "status": status,
+                "result": json.dumps(result, default=str) if result is not None else None,
+                "error": error,
+                "n_events": n_events,
+                "finished_at": datetime.utcnow(),
+            })
+            db.commit()
+        finally:
+            db.close()
+
+    def _insert_events(self, job_id, start, lines):
+        db = self._session()
+        try:
+            db.add_all([JobEvent(job_id=job_id, seq=start + i, line=line) for i, line in enumerate(lines)])
+            db.commit()
+        finally:
+            db.close()
+
+    def _read_events(self, job_id, offset):
+        db = self._session()
+        try:
+            rows = (db.query(JobEvent.line).filter(JobEvent.job_id == job_id, JobEvent.seq >= offset)
+                    .order_by(JobEvent.seq).all())
+            return [r.line for r in rows]
+        finally:
+            db.close()
+
+    def _read_job(self, job_id, with_result=True):
+        db = self._session()
+        try:
+            row = db.query(Job).filter(Job.id == job_id).first()
+            return _job_dict(row, with_result) if row else None
+        finally:
+            db.close()
+
+    def _list_jobs(self, status, kind, limit, offset):
+        db = self._session()
+        try:
+            # Summary columns only; payload and result can be large
+            query = db.query(Job.id, Job.kind, Job.status, Job.priority, Job.n_events, Job.error,
+                             Job.created_at, Job.started_at, Job.finished_at)
+            if status:
+                query = query.filter(Job.status == status)
+            if kind:
+                query = query.filter(Job.kind == kind)
+            rows = query.order_by(Job.created_at.desc()).limit(limit).offset(offset).all()
+            return [_job_dict(r, with_result=False) for r in rows]
+        finally:
+            db.close()
+
+
+def _job_dict(row, with_result=True) -> dict:
+    data = {
+        "job_id": row.id,
+        "kind": row.kind,
+        "status": row.status,
+        "priority": row.priority,
+        "n_events": row.n_events,
+        "error": row.error,
+        "created_at": row.created_at,
+        "started_at": row.started_at,
+        "finished_at": row.finished_at,
+    }
+    if with_result:
+        data["payload"] = json.loads(row.payload or "{}")
+        data["result"] = json.loads(row.result) if row.result else None
+    return data
+
+
+job_manager = JobManager()
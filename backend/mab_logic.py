@@ -1,4 +1,53 @@
+import os
 import numpy as np
+from datetime import datetime
+
+from database import SessionLocal, engine, Base
+from models import Strategy, BanditArm
+
+DEFAULT_DRAWS = int(os.getenv("MAB_DRAWS", "2000"))  # Monte Carlo draws per allocation
+MAX_CHUNK = 2_000_000  # Beta samples held in memory at once (draws x arms)
+MAX_SQL_VARIABLES = 999  # Bound parameters per SQLite statement (the limit before 3.32; 32766 after)
+
+def monte_carlo_allocation(alpha, beta, fairness_score: float, n_draws: int = DEFAULT_DRAWS, seed: int = 0):
+    """
+    Expected Thompson weights over n_draws posterior draws, blended with the
+    equal split exactly like calculate_allocation:
+        w = (1 - lambda) * E[theta_i / sum(theta)] + lambda / n_arms
+    Also returns the regret of w in % of the attainable reward:
+        100 * E[max(theta) - w . theta] / E[max(theta)]
+    Seeded, so the same posterior always gives the same weights.
+    """
+    alpha = np.asarray(alpha, dtype=np.float64)
+    beta = np.asarray(beta, dtype=np.float64)
+    n_arms = len(alpha)
+    if n_arms == 0:
+        return np.zeros(0), 0.0
+
+    lam = fairness_score / 100.0
+    chunk = max(1, min(n_draws, MAX_CHUNK // n_arms))
+    rng = np.random.default_rng(seed)
+
+    # One pass over the draws: expected greedy weights, E[theta] and E[max theta].
+    # The blended weights are fixed once greedy is known, so E[w . theta] = w . E[theta]
+    greedy = np.zeros(n_arms)
+    mean_theta = np.zeros(n_arms)
+    best = 0.0
+    for start in range(0, n_draws, chunk):
+        theta = rng.beta(alpha, beta, size=(min(chunk, n_draws - start), n_arms))
+        totals = theta.sum(axis=1, keepdims=True)
+        totals[totals == 0] = 1.0
+        greedy += (theta / totals).sum(axis=0)
+        mean_theta += theta.sum(axis=0)
+        best += theta.max(axis=1).sum()
+    greedy /= n_draws
+    mean_theta /= n_draws
+    best /= n_draws
+    weights = (1 - lam) * greedy + lam / n_arms
+
+    lost = best - mean_theta @ weights
+    regret = 100.0 * lost / best if best > 0 else 0.0
+    return weights, float(regret)
 
 class FairMultiArmedBandit:
     """
@@ -21,6 +70,15 @@ class FairMultiArmedBandit:
         else:
             self.beta[arm_index] += 1
 
+    def update_batch(self, arm_indices, rewards):
+        """
+        Many updates at once. Rewards in [0, 1] (fractional rewards count as
+        partial wins); repeated arms accumulate.
+        """
+        rewards = np.clip(np.asarray(rewards, dtype=np.float64), 0.0, 1.0)
+        np.add.at(self.alpha, arm_indices, rewards)
+        np.add.at(self.beta, arm_indices, 1.0 - rewards)
+
     def calculate_allocation(self, fairness_score: int):
         """
         Returns the % allocation for each arm.
@@ -30,26 +88,134 @@ class FairMultiArmedBandit:
         """
         # 1. Sample from Beta Distribution (Thompson Sampling)
         # This asks: "Based on history, how likely is each arm to win?"
-        samples = [np.random.beta(self.alpha[i], self.beta[i]) for i in range(self.n_arms)]
+        samples = np.random.beta(self.alpha, self.beta)
         
         # 2. Normalize to get "Greedy Weights"
-        total_sample = sum(samples)
+        total_sample = samples.sum()
         if total_sample == 0:
-            greedy_weights = [1.0 / self.n_arms] * self.n_arms
+            greedy_weights = np.full(self.n_arms, 1.0 / self.n_arms)
         else:
-            greedy_weights = [s / total_sample for s in samples]
+            greedy_weights = samples / total_sample
         
         # 3. Calculate "Fair Weights" (Equal split)
-        fair_weights = [1.0 / self.n_arms for _ in range(self.n_arms)]
+        fair_weights = np.full(self.n_arms, 1.0 / self.n_arms)
         
         # 4. Blend them based on the Slider (Fairness Score)
         # lambda represents how much we care about fairness (0.0 to 1.0)
         lam = fairness_score / 100.0
         
-        final_weights = []
-        for i in range(self.n_arms):
-            # The Core Formula: (1 - lambda) * Greedy + lambda * Fair
-            weight = ((1 - lam) * greedy_weights[i]) + (lam * fair_weights[i])
-            final_weights.append(weight)
+        # The Core Formula: (1 - lambda) * Greedy + lambda * Fair
+        final_weights = (1 - lam) * greedy_weights + lam * fair_weights
             
-        return final_weights
\ No newline at end of file
+        return final_weights.tolist()
+
+    def expected_allocation(self, fairness_score: int, n_draws: int = DEFAULT_DRAWS, seed: int = 0):
+        """
+        Stable version of calculate_allocation: the expectation over n_draws
+        Thompson draws instead of one. Returns (weights, regret %).
+        """
+        return monte_carlo_allocation(self.alpha, self.beta, fairness_score, n_draws, seed)
+
+
+class StrategyAllocator:
+    """
+    One bandit arm per saved strategy, with alpha/beta persisted in bandit_arms
+    (so every API worker sees the same posterior). Rewards come from real
+    backtests in batches; allocation is the Monte Carlo expectation.
+    """
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._table_ready = False
+
+    def _ensure_table(self):
+        if not self._table_ready:
+            Base.metadata.create_all(bind=engine, tables=[BanditArm.__table__])
+            self._table_ready = True
+
+    def arms(self):
+        """
+        Returns (strategy_ids, names, alpha, beta) for every saved strategy.
+        """
+        self._ensure_table()
+        db = self.session_factory()
+        try:
+            rows = (db.query(Strategy.id, Strategy.name, BanditArm.alpha, BanditArm.beta)
+                    .outerjoin(BanditArm, BanditArm.strategy_id == Strategy.id)
+                    .order_by(Strategy.id).all())
+        finally:
+            db.close()
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        names = [r[1] for r in rows]
+        alpha = np.array([r[2] if r[2] is not None else 1.0 for r in rows], dtype=np.float64)
+        beta = np.array([r[3] if r[3] is not None else 1.0 for r in rows], dtype=np.float64)
+        return ids, names, alpha, beta
+
+    def update_batch(self, rewards) -> int:
+        """
+        rewards: iterable of (strategy_id, reward in [0, 1]). Aggregated per
+        strategy, then applied as upserts of up to MAX_SQL_VARIABLES bound
+        values each, in one transaction (increments happen in SQL, so
+        concurrent writers don't lose updates). Returns the number of arms touched.
+        """
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        totals = {}
+        for strategy_id, reward in rewards:
+            reward = min(1.0, max(0.0, float(reward)))
+            wins, pulls = totals.get(strategy_id, (0.0, 0))
+            totals[strategy_id] = (wins + reward, pulls + 1)
+        if not totals:
+            return 0
+
+        self._ensure_table()
+        now = datetime.utcnow()
+        rows = [
+            {"strategy_id": sid, "alpha": 1.0 + wins, "beta": 1.0 + pulls - wins, "pulls": pulls, "updated_at": now}
+            for sid, (wins, pulls) in totals.items()
+        ]
+        per_statement = MAX_SQL_VARIABLES // len(rows[0])
+        db = self.session_factory()
+        try:
+            # Several statements when there are many arms, one transaction
+            for start in range(0, len(rows), per_statement):
+                stmt = sqlite_insert(BanditArm).values(rows[start:start + per_statement])
+                stmt = stmt.on_conflict_do_update(index_elements=["strategy_id"], set_={
+                    # excluded.* carries the prior (1, 1) on top of the increment
+                    "alpha": BanditArm.alpha + stmt.excluded.alpha - 1.0,
+                    "beta": BanditArm.beta + stmt.excluded.beta - 1.0,
+                    "pulls": BanditArm.pulls + stmt.excluded.pulls,
+                    "updated_at": stmt.excluded.updated_at,
+                })
+                db.execute(stmt)
+            db.commit()
+        finally:
+            db.close()
+        return len(totals)
+
+    def allocate(self, fairness_score: int, n_draws: int = DEFAULT_DRAWS, seed: int = 0) -> dict:
+        ids, names, alpha, beta = self.arms()
+        weights, regret = monte_carlo_allocation(alpha, beta, fairness_score, n_draws, seed)
+        return {
+            "strategy_ids": ids,
+            "names": names,
+            "weights": weights,
+            "win_rate": alpha / (alpha + beta) if len(ids) else np.zeros(0),
+            "pulls": alpha + beta - 2.0,
+            "regret": regret,
+        }
+
+    def reset(self, strategy_id: int = None) -> int:
+        self._ensure_table()
+        db = self.session_factory()
+        try:
+            query = db.query(BanditArm)
+            if strategy_id is not None:
+                query = query.filter(BanditArm.strategy_id == strategy_id)
+            removed = query.delete(synchronize_session=False)
+            db.commit()
+            return removed
+        finally:
+            db.close()
+
+
+allocator = StrategyAllocator()
@@ -1,33 +1,83 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List
-import pandas as pd
-import yfinance as yf
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Optional
+import asyncio
+import json
+import sys
+import time
+from pydantic import BaseModel, Field
 
 # Internal Modules
-from database import engine, Base, get_db
+# Only the light ones are imported here. The VLM (PyMuPDF, Gemini), market data
+# (pandas, yfinance), the execution engine and the optimizer are imported inside
+# the endpoints that use them, so startup and worker forks stay fast and the
+# API starts without network access or API keys.
+# Check the startup cost with: python -m benchmarks.startup
+from database import engine, Base, run_db
 from models import Strategy
-from vlm_engine import extract_code_from_pdf
-from execution_engine import execute_strategy
-from rl_brain import optimize_strategy  # <--- NEW IMPORT
-from mab_logic import FairMultiArmedBandit
+from telemetry import (span, record_span, collect_trace, log_trace, render_prometheus,
+                       registry, HTTP_SECONDS)
+from jobs import job_manager, QueueFull
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+class TimedJSONResponse(JSONResponse):
+    # Times the json.dumps step separately from the handler
+    def render(self, content) -> bytes:
+        with span("response.serialize"):
+            return super().render(content)
 
-app = FastAPI(title="Alpha-Mechanism API")
+router = APIRouter()
 
-# CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Per-endpoint latency + per-stage breakdown (Server-Timing header and the alpha.trace log)
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    with collect_trace() as spans:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", "unmatched")
+    HTTP_SECONDS.observe(elapsed, method=request.method, route=route_path, status=response.status_code)
+    if spans:
+        response.headers["Server-Timing"] = ", ".join(
+            f"{s['stage'].replace('.', '-')};dur={s['seconds'] * 1000:.2f}" for s in spans[:32])
+    log_trace(f"{request.method} {route_path}", spans, elapsed)
+    return response
+
+def _cache_samples():
+    # Reports only what's already loaded; scraping /metrics must not import the engine
+    samples = []
+    if "execution_engine" in sys.modules:
+        cache = sys.modules["execution_engine"].strategy_cache.stats()
+        for field in ("hits", "misses", "evictions"):
+            samples.append(("alpha_strategy_cache_" + field + "_total", "counter",
+                            f"Compiled-strategy cache {field}", {}, cache[field]))
+        samples.append(("alpha_strategy_cache_size", "gauge", "Compiled strategies held in memory", {}, cache["size"]))
+    if "result_cache" in sys.modules:
+        result_cache = sys.modules["result_cache"].result_cache
+        samples.append(("alpha_result_cache_hits_total", "counter", "Backtest result cache hits", {}, result_cache.hits))
+        samples.append(("alpha_result_cache_misses_total", "counter", "Backtest result cache misses", {}, result_cache.misses))
+    if "sandbox" in sys.modules:
+        pool = sys.modules["sandbox"].sandbox_pool.stats()
+        for field in ("runs", "recycled", "crashed", "timed_out"):
+            samples.append(("alpha_sandbox_" + field + "_total", "counter", f"Sandboxed strategy {field.replace('_', ' ')}",
+                            {}, pool[field]))
+        samples.append(("alpha_sandbox_idle_workers", "gauge", "Sandbox workers waiting for a run", {}, pool["idle"]))
+    if "strategies.indicator_cache" in sys.modules:
+        # This process only; arena workers keep their own
+        cache = sys.modules["strategies.indicator_cache"].indicator_cache.stats()
+        for field in ("hits", "misses", "evictions"):
+            samples.append(("alpha_indicator_cache_" + field + "_total", "counter",
+                            f"Indicator cache {field}", {}, cache[field]))
+        samples.append(("alpha_indicator_cache_bytes", "gauge", "Indicator arrays held in memory", {}, cache["bytes"]))
+    return samples
+
+registry.register_collector(_cache_samples)
 
 # --- Pydantic Models ---
 class StrategySaveRequest(BaseModel):
@@ -37,125 +87,619 @@ class StrategySaveRequest(BaseModel):
 class BattleRequest(BaseModel):
     strategy_ids: List[int]
     ticker: str = "AAPL"
+    tickers: Optional[List[str]] = None  # Strategies x tickers grid in one request
+    timeout: Optional[float] = None       # Per-strategy wall-clock limit (seconds), default ARENA_TIMEOUT
+    learn: bool = False                   # Feed beat-the-benchmark results to the capital allocator (fresh runs only)
+    record_trades: bool = False           # Write every cell's trades to the ledger (bypasses the result cache)
+    format: str = "rows"                  # rows / columnar / binary (see charts.py)
+    max_points: Optional[int] = None      # LTTB-downsample each chart to about this many dates
+    dtype: str = "float32"                # Binary format only: float32 / float64 series
 
 class BacktestRequest(BaseModel):
     code: str
     ticker: str = "AAPL"
+    profile: bool = False  # Run uncached under cProfile and return the dump
+    record_trades: bool = False        # Write this run's trades to the ledger (returns run_id)
+    strategy_id: Optional[int] = None  # Ledger attribution for ad-hoc code
+    period: str = "2y"
+    interval: str = "1d"
+    stream: bool = False               # Chunked backtest in bounded memory, for long intraday histories
+    chunk_rows: int = 100_000          # Bars per chunk when streaming
+    equity_points: int = 1000          # Streaming: equity curve thinned to at most this many bars
+    fee_bps: Optional[float] = None       # Per unit traded; None = BACKTEST_FEE_BPS
+    slippage_bps: Optional[float] = None  # Per unit traded; None = BACKTEST_SLIPPAGE_BPS
+
+class RobustnessRequest(BaseModel):
+    code: str
+    ticker: str = "AAPL"
+    period: str = "2y"
+    interval: str = "1d"
+    params: Optional[dict] = None
+    n_samples: int = 2000               # Resamples per test (bootstrap and random entry)
+    block_bars: Optional[int] = None    # Bootstrap block length; None = n_bars^(1/3)
+    seed: int = 0
+    fee_bps: Optional[float] = None
+    slippage_bps: Optional[float] = None
 
 class AllocationRequest(BaseModel):
-    fairness_score: int
+    fairness_score: int = Field(..., ge=0, le=100)
+    top: int = Field(8, ge=1)  # Arms shown individually; the rest are grouped as "Other"
+    n_draws: int = Field(2000, ge=1, le=100_000)  # Monte Carlo draws behind the expected weights
+
+class RewardUpdate(BaseModel):
+    strategy_id: int
+    reward: float          # 0..1 (1 = win)
+
+class JobRequest(BaseModel):
+    kind: str               # backtest / battle / optimize / walk_forward
+    payload: dict = {}      # Same body as the matching endpoint (optimize, walk_forward: strategy_id + query params)
+    priority: int = 0       # Higher runs first
 
 # --- API ENDPOINTS ---
 
-@app.get("/")
+@router.get("/")
 def health_check():
     return {"status": "online", "system": "Alpha-Mechanism v1.0"}
 
+@router.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # 1. UPLOAD & SAVE
-@app.post("/api/upload_paper")
-async def upload_paper(file: UploadFile = File(...)):
+@router.post("/api/upload_paper")
+async def upload_paper(file: UploadFile = File(...), backend: Optional[str] = None):
+    from vlm_engine import ingest_pdf
+    model = _vlm_backend(backend)
     try:
         content = await file.read()
-        generated_code = extract_code_from_pdf(content)
-        return {"status": "success", "code": generated_code}
+        # PDF parsing and the model call both block, so keep them off the event loop
+        result = await run_in_threadpool(ingest_pdf, content, model)
+        return {"status": "success", **result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/save_strategy")
-async def save_strategy(request: StrategySaveRequest, db: Session = Depends(get_db)):
+@router.post("/api/upload_paper_stream")
+async def upload_paper_stream(file: UploadFile = File(...), backend: Optional[str] = None):
+    # NDJSON: {"log": ...} per pipeline stage, then {"status": "success", "code": ...}
+    from vlm_engine import ingest_pdf
+    model = _vlm_backend(backend)
+    content = await file.read()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    progress = lambda packet: loop.call_soon_threadsafe(queue.put_nowait, packet)
+
+    def run():
+        progress({"status": "success", **ingest_pdf(content, model, progress=progress)})
+
+    async def lines():
+        worker = loop.run_in_executor(None, run)
+        while True:
+            packet = await queue.get()
+            yield json.dumps(packet) + "\n"
+            if "status" in packet:
+                break
+        await worker
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def _vlm_backend(name: Optional[str]):
+    from vlm_engine import get_backend
     try:
-        safe_name = request.name.replace(" ", "_").replace(".py", "")
-        filename = f"{safe_name}.py"
-        file_path = f"strategies/{filename}"
-        
-        with open(file_path, "w") as f:
-            f.write(request.code)
-            
-        existing = db.query(Strategy).filter(Strategy.name == safe_name).first()
-        if existing:
-            existing.code = request.code
-        else:
-            new_strat = Strategy(name=safe_name, filename=filename, code=request.code)
-            db.add(new_strat)
-        
-        db.commit()
+        return get_backend(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/api/save_strategy")
+async def save_strategy(request: StrategySaveRequest):
+    try:
+        await run_db(_save_strategy, request.name.replace(" ", "_").replace(".py", ""), request.code)
         return {"status": "success", "message": "Strategy saved"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/strategies")
-def get_strategies(db: Session = Depends(get_db)):
-    return db.query(Strategy).all()
+def _save_strategy(db: Session, safe_name: str, code: str):
+    filename = f"{safe_name}.py"
+    file_path = f"strategies/{filename}"
+
+    with open(file_path, "w") as f:
+        f.write(code)
+
+    existing = db.query(Strategy).filter(Strategy.name == safe_name).first()
+    if existing:
+        existing.code = code
+    else:
+        new_strat = Strategy(name=safe_name, filename=filename, code=code)
+        db.add(new_strat)
+
+    db.commit()
+
+# Listing returns summaries only; the dashboard polls it, and the source of
+# every strategy was most of the payload. Code loads per strategy, on demand.
+STRATEGY_SUMMARY = (Strategy.id, Strategy.name, Strategy.sharpe_ratio, Strategy.created_at)
+STRATEGY_ORDER = {
+    "id": (Strategy.id,),
+    "name": (Strategy.name,),
+    "newest": (Strategy.created_at.desc(), Strategy.id.desc()),
+    "sharpe": (Strategy.sharpe_ratio.is_(None), Strategy.sharpe_ratio.desc(), Strategy.id),
+}
+MAX_PAGE = 1000
+
+def _list_strategies(db: Session, limit: int, offset: int, order: str):
+    rows = db.query(*STRATEGY_SUMMARY).order_by(*STRATEGY_ORDER[order]).limit(limit).offset(offset).all()
+    total = db.query(func.count(Strategy.id)).scalar()
+    return [dict(r._mapping) for r in rows], total
+
+def _get_strategy(db: Session, strategy_id: int):
+    row = db.query(*STRATEGY_SUMMARY, Strategy.filename, Strategy.code).filter(Strategy.id == strategy_id).first()
+    return dict(row._mapping) if row else None
+
+@router.get("/api/strategies")
+async def get_strategies(response: Response, limit: int = 200, offset: int = 0, order: str = "id"):
+    if order not in STRATEGY_ORDER:
+        raise HTTPException(status_code=400, detail=f"order must be one of {sorted(STRATEGY_ORDER)}")
+    rows, total = await run_db(_list_strategies, max(1, min(limit, MAX_PAGE)), max(0, offset), order)
+    response.headers["X-Total-Count"] = str(total)
+    return rows
+
+@router.get("/api/strategies/{strategy_id}")
+async def get_strategy(strategy_id: int):
+    strategy = await run_db(_get_strategy, strategy_id)
+    if not strategy:
+        raise HTTPException(status_code=404, detail="Strategy not found")
+    return strategy
 
 # 2. EXECUTION & BATTLE
-@app.post("/api/run_backtest")
+@router.post("/api/run_backtest")
 async def run_backtest_endpoint(request: BacktestRequest):
-    df = yf.download(request.ticker, period="2y", interval="1d")
+    return await run_in_threadpool(_run_backtest, request)
+
+def _run_backtest(request: BacktestRequest):
+    # Generated code runs in the sandbox pool (sandbox.py), never in this process
+    from market_data import get_ohlcv
+    from sandbox import execute_strategy, execute_strategy_stream, profile_strategy
+    from result_cache import cached_execute_strategy
+
+    costs = {"fee_bps": request.fee_bps, "slippage_bps": request.slippage_bps}
+    if request.stream:
+        # Never holds the whole history: chunks come straight off the disk store
+        if request.profile or request.record_trades:
+            return {"error": "stream can't be combined with profile or record_trades"}
+        return execute_strategy_stream(request.code, request.ticker, request.period, request.interval,
+                                       max(1, request.chunk_rows), equity_points=request.equity_points, costs=costs)
+
+    with span("market_data.load"):
+        df = get_ohlcv(request.ticker, period=request.period, interval=request.interval)
     if df.empty: return {"error": "No market data"}
-    if isinstance(df.columns, pd.MultiIndex): df.columns = df.columns.get_level_values(0)
-    
-    return execute_strategy(request.code, df)
 
-@app.post("/api/run_battle")
-async def run_battle_endpoint(request: BattleRequest, db: Session = Depends(get_db)):
-    df = yf.download(request.ticker, period="1y", interval="1d")
-    if df.empty: raise HTTPException(status_code=400, detail="No data")
-    if isinstance(df.columns, pd.MultiIndex): df.columns = df.columns.get_level_values(0)
-    
-    # Benchmark
-    df['Market_Return'] = df['Close'].pct_change().fillna(0)
-    df['Benchmark'] = (1 + df['Market_Return']).cumprod() * 100
-    dates = df.index.strftime('%Y-%m-%d').tolist()
+    if request.profile:
+        # Save profile.pstats_b64 (base64-decoded) as a .prof file for snakeviz / flameprof
+        result, profile = profile_strategy(request.code, df, costs=costs)
+        return {**result, "profile": profile}
+
+    if request.record_trades:
+        from trade_ledger import record_trades
+        result = execute_strategy(request.code, df, with_trades=True, costs=costs)
+        if "trades" in result:
+            with span("ledger.write"):
+                result.update(record_trades(result.pop("trades"), request.strategy_id, request.ticker))
+        return result
     
-    master_data = [{"date": d, "Benchmark": round(df['Benchmark'].iloc[i], 2)} for i, d in enumerate(dates)]
-
-    for strat_id in request.strategy_ids:
-        strategy_record = db.query(Strategy).filter(Strategy.id == strat_id).first()
-        if not strategy_record: continue
-            
-        result = execute_strategy(strategy_record.code, df.copy())
-        if "error" in result: continue
-            
-        equity_curve = result["equity_curve"]
-        safe_name = strategy_record.name
-        for i, val in enumerate(equity_curve):
-            if i < len(master_data):
-                master_data[i][safe_name] = round(val * 100, 2)
-
-    return master_data
+    return cached_execute_strategy(request.code, df, execute=execute_strategy, costs=costs)
+
+@router.post("/api/run_battle")
+async def run_battle_endpoint(request: BattleRequest):
+    from market_data import get_ohlcv
+    from arena import run_battle_grid, DEFAULT_TIMEOUT
+    from charts import battle_chart, downsample, to_rows, to_columnar, pack_binary, FORMATS, DTYPES
+
+    if request.format not in FORMATS or request.dtype not in DTYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(FORMATS)}, dtype one of {list(DTYPES)}")
+    tickers = request.tickers or [request.ticker]
+
+    # One query for every fighter, kept in request order
+    strategies = await run_db(_get_strategy_codes, request.strategy_ids)
+    strategy_ids = {strat["name"]: strat["id"] for strat in strategies}
+
+    frames = {}
+    with span("market_data.load"):
+        for ticker in tickers:
+            df = await run_in_threadpool(get_ohlcv, ticker, "1y", "1d")
+            if not df.empty:
+                frames[ticker] = df
+    if not frames: raise HTTPException(status_code=400, detail="No data")
+
+    # Fan out to the worker pool off the event loop
+    with span("battle.grid"):
+        grid = await run_in_threadpool(run_battle_grid, frames, strategies, request.timeout or DEFAULT_TIMEOUT,
+                                       True, request.record_trades)
+
+    runs = []
+    if request.record_trades:
+        from trade_ledger import record_trades
+        with span("ledger.write"):
+            for ticker, cells in grid.items():
+                for name, result in cells.items():
+                    if "trades" in result:
+                        run = await run_in_threadpool(record_trades, result.pop("trades"), strategy_ids[name], ticker)
+                        runs.append({"ticker": ticker, "strategy": name, **run})
+
+    charts_started = time.perf_counter()
+    charts = {}
+    errors = []
+    rewards = []
+    for ticker, df in frames.items():
+        # Benchmark + equity curves on one date axis, cut to the point budget
+        chart = battle_chart(df, grid[ticker])
+        benchmark_return_pct = chart.series["Benchmark"][-1] - 100
+
+        for safe_name, result in grid[ticker].items():
+            if "error" in result:
+                errors.append({"ticker": ticker, "strategy": safe_name, "error": result["error"]})
+                continue
+
+            # A "win" for the allocator: beating buy & hold on this ticker. A result
+            # from the result cache is evidence the allocator has already seen.
+            if result.pop("cached", False):
+                continue
+            beat = result["total_return_pct"] is not None and result["total_return_pct"] > benchmark_return_pct
+            rewards.append((strategy_ids[safe_name], 1.0 if beat else 0.0))
+
+        charts[ticker] = downsample(chart, request.max_points)
+    if request.format == "binary":
+        payload = pack_binary(charts, request.dtype, {"errors": errors, "runs": runs})
+    elif request.format == "columnar":
+        payload = {ticker: to_columnar(chart) for ticker, chart in charts.items()}
+    else:
+        payload = {ticker: to_rows(chart) for ticker, chart in charts.items()}
+    record_span("battle.charts", time.perf_counter() - charts_started)
+
+    if request.learn and rewards:
+        from mab_logic import allocator
+        await run_in_threadpool(allocator.update_batch, rewards)
+
+    if request.format == "binary":
+        return Response(payload, media_type="application/octet-stream")
+    # Single-ticker requests keep the original response shape (a list of rows)
+    if not request.tickers and request.format == "rows":
+        return payload[request.ticker]
+    response = {"format": request.format, "results": payload, "errors": errors}
+    if request.record_trades:
+        response["runs"] = runs
+    return response
 
 # 3. RL OPTIMIZER (REAL)
-@app.get("/api/optimize_stream/{strategy_id}")
-async def optimize_stream_endpoint(strategy_id: int, db: Session = Depends(get_db)):
-    strategy_record = db.query(Strategy).filter(Strategy.id == strategy_id).first()
-    if not strategy_record:
+@router.get("/api/optimize_stream/{strategy_id}")
+async def optimize_stream_endpoint(strategy_id: int, engine: str = "random", max_evals: int = 20,
+                                   max_seconds: Optional[float] = None, population: Optional[int] = None,
+                                   ticker: str = "AAPL", period: str = "1y", interval: str = "1d",
+                                   objective: str = "sharpe", fee_bps: Optional[float] = None,
+                                   slippage_bps: Optional[float] = None):
+    from market_data import get_ohlcv
+    from rl_brain import optimize_strategy
+
+    strategy = await run_db(_get_strategy, strategy_id)
+    if not strategy:
         raise HTTPException(status_code=404, detail="Strategy not found")
         
-    df = yf.download("AAPL", period="1y", interval="1d")
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
+    with span("market_data.load"):
+        df = await run_in_threadpool(get_ohlcv, ticker, period, interval)
         
     return StreamingResponse(
-        optimize_strategy(strategy_record.code, df), 
+        optimize_strategy(strategy["code"], df, engine=engine, max_evals=max_evals,
+                          max_seconds=max_seconds, population=population, objective=objective,
+                          costs={"fee_bps": fee_bps, "slippage_bps": slippage_bps}),
+        media_type="application/x-ndjson"
+    )
+
+# Walk-forward: tune on each fold's train window, score on the test window after it
+@router.get("/api/walk_forward/{strategy_id}")
+async def walk_forward_endpoint(strategy_id: int, ticker: str = "AAPL", period: str = "5y", interval: str = "1d",
+                                folds: int = 5, mode: str = "rolling", train_bars: Optional[int] = None,
+                                test_bars: Optional[int] = None, engine: str = "random", max_evals: int = 50,
+                                population: Optional[int] = None, seed: int = 0, objective: str = "sharpe",
+                                fee_bps: Optional[float] = None, slippage_bps: Optional[float] = None):
+    from market_data import get_ohlcv
+    from walk_forward import walk_forward
+
+    strategy = await run_db(_get_strategy, strategy_id)
+    if not strategy:
+        raise HTTPException(status_code=404, detail="Strategy not found")
+
+    with span("market_data.load"):
+        df = await run_in_threadpool(get_ohlcv, ticker, period, interval)
+    if df.empty:
+        raise HTTPException(status_code=400, detail="No data")
+
+    return StreamingResponse(
+        walk_forward(strategy["code"], df, n_folds=folds, mode=mode, train_bars=train_bars, test_bars=test_bars,
+                     engine=engine, max_evals=max_evals, population=population, seed=seed, objective=objective,
+                     costs={"fee_bps": fee_bps, "slippage_bps": slippage_bps}),
         media_type="application/x-ndjson"
     )
 
+# Paper-trading replay: saved strategies decide bar by bar on a recorded feed, as server-sent events
+def _get_strategy_codes(db: Session, strategy_ids: list) -> list:
+    # In request order; a repeated name gets its id appended so events stay unambiguous
+    records = {r.id: r for r in db.query(Strategy.id, Strategy.name, Strategy.code).filter(Strategy.id.in_(strategy_ids))}
+    strategies, names = [], set()
+    for r in (records.get(strategy_id) for strategy_id in dict.fromkeys(strategy_ids)):
+        if r:
+            name = r.name if r.name not in names else f"{r.name} ({r.id})"
+            names.add(name)
+            strategies.append({"id": r.id, "name": name, "code": r.code})
+    return strategies
+
+@router.get("/api/replay")
+async def replay_endpoint(strategy_ids: List[int] = Query(...), ticker: str = "AAPL", period: str = "1y",
+                          interval: str = "1d", speed: float = 1.0, max_bars: Optional[int] = None,
+                          fee_bps: Optional[float] = None, slippage_bps: Optional[float] = None):
+    from replay import replay, sse
+
+    strategies = await run_db(_get_strategy_codes, strategy_ids)
+    if not strategies:
+        raise HTTPException(status_code=404, detail="Strategy not found")
+    return StreamingResponse(
+        sse(replay(strategies, ticker, period=period, interval=interval, speed=max(0.0, speed), max_bars=max_bars,
+                   costs={"fee_bps": fee_bps, "slippage_bps": slippage_bps})),
+        media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+
+# Robustness: bootstrap / random-entry distributions of one strategy's backtest
+@router.post("/api/robustness")
+async def robustness_endpoint(request: RobustnessRequest):
+    result = await run_in_threadpool(_run_robustness, request)
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return result
+
+def _run_robustness(request: RobustnessRequest):
+    # Runs in the sandbox pool, like /api/run_backtest
+    from market_data import get_ohlcv
+    from sandbox import execute_robustness
+
+    with span("market_data.load"):
+        df = get_ohlcv(request.ticker, period=request.period, interval=request.interval)
+    if df.empty: return {"error": "No market data"}
+    return execute_robustness(request.code, df, request.params,
+                              costs={"fee_bps": request.fee_bps, "slippage_bps": request.slippage_bps},
+                              n_samples=max(1, min(request.n_samples, 100_000)), block_bars=request.block_bars,
+                              seed=request.seed)
+
+# Background jobs: same work as the endpoints above, off the request path
+async def _backtest_job(payload: dict, emit):
+    request = BacktestRequest(**payload)
+    emit({"log": f"Backtesting on {request.ticker}..."})
+    result = await run_in_threadpool(_run_backtest, request)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    emit({"log": f"Sharpe: {result.get('sharpe_ratio')} | Return: {result.get('total_return_pct')}%"})
+    return result
+
+async def _robustness_job(payload: dict, emit):
+    request = RobustnessRequest(**payload)
+    emit({"log": f"Resampling {request.n_samples} paths on {request.ticker}..."})
+    result = await run_in_threadpool(_run_robustness, request)
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    emit({"log": f"Sharpe: {result.get('sharpe_ratio')} | P(skill): {result.get('prob_skill')}"})
+    return result
+
+async def _battle_job(payload: dict, emit):
+    request = BattleRequest(**payload)
+    if request.format == "binary":
+        request.format = "columnar"  # Job results are stored as JSON
+    emit({"log": f"Battle: {len(request.strategy_ids)} strategies x {len(request.tickers or [request.ticker])} tickers"})
+    return await run_battle_endpoint(request)
+
+async def _optimize_job(payload: dict, emit):
+    from market_data import get_ohlcv
+    from rl_brain import optimize_strategy
+
+    strategy = await run_db(_get_strategy, payload.get("strategy_id"))
+    if not strategy:
+        raise ValueError("Strategy not found")
+
+    df = await run_in_threadpool(get_ohlcv, payload.get("ticker", "AAPL"), payload.get("period", "1y"),
+                                 payload.get("interval", "1d"))
+    best = {"best_params": None, "best_sharpe": None, "episodes": 0}
+    async for line in optimize_strategy(strategy["code"], df, engine=payload.get("engine", "random"),
+                                        max_evals=payload.get("max_evals", 20),
+                                        max_seconds=payload.get("max_seconds"),
+                                        population=payload.get("population"),
+                                        objective=payload.get("objective", "sharpe"),
+                                        costs={"fee_bps": payload.get("fee_bps"),
+                                               "slippage_bps": payload.get("slippage_bps")}):
+        packet = json.loads(line)
+        emit(packet)
+        if "reward" in packet:
+            best["episodes"] = packet["episode"]
+            if best["best_sharpe"] is None or packet["reward"] > best["best_sharpe"]:
+                best["best_sharpe"] = packet["reward"]
+                best["best_params"] = packet["params"]
+    return best
+
+async def _walk_forward_job(payload: dict, emit):
+    from market_data import get_ohlcv
+    from walk_forward import walk_forward
+
+    strategy = await run_db(_get_strategy, payload.get("strategy_id"))
+    if not strategy:
+        raise ValueError("Strategy not found")
+
+    df = await run_in_threadpool(get_ohlcv, payload.get("ticker", "AAPL"), payload.get("period", "5y"),
+                                 payload.get("interval", "1d"))
+    result = {"folds": [], "summary": None}
+    async for line in walk_forward(strategy["code"], df, n_folds=payload.get("folds", 5),
+                                   mode=payload.get("mode", "rolling"), train_bars=payload.get("train_bars"),
+                                   test_bars=payload.get("test_bars"), engine=payload.get("engine", "random"),
+                                   max_evals=payload.get("max_evals", 50), population=payload.get("population"),
+                                   seed=payload.get("seed", 0), objective=payload.get("objective", "sharpe"),
+                                   costs={"fee_bps": payload.get("fee_bps"),
+                                          "slippage_bps": payload.get("slippage_bps")}):
+        packet = json.loads(line)
+        emit(packet)
+        if "fold" in packet:
+            result["folds"].append({k: v for k, v in packet.items() if k != "log"})
+        elif "summary" in packet:
+            result["summary"] = packet["summary"]
+        elif packet.get("log", "").startswith("Error"):
+            raise RuntimeError(packet["log"])
+    return result
+
+job_manager.register("backtest", _backtest_job)
+job_manager.register("battle", _battle_job)
+job_manager.register("optimize", _optimize_job)
+job_manager.register("walk_forward", _walk_forward_job)
+job_manager.register("robustness", _robustness_job)
+
+@router.post("/api/jobs")
+async def submit_job(request: JobRequest):
+    try:
+        job_id = await job_manager.submit(request.kind, request.payload, request.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/api/jobs")
+async def list_jobs(status: Optional[str] = None, kind: Optional[str] = None, limit: int = 50, offset: int = 0):
+    jobs = await job_manager.list(status=status, kind=kind, limit=max(1, min(limit, MAX_PAGE)), offset=max(0, offset))
+    return {"jobs": jobs, "queue": job_manager.stats()}
+
+@router.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/api/jobs/{job_id}/stream")
+async def stream_job(job_id: str, offset: int = 0):
+    # Same NDJSON packets as /api/optimize_stream, ending with {"status": ...}
+    if not await job_manager.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(job_manager.stream(job_id, offset), media_type="application/x-ndjson")
+
+@router.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    if not await job_manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is not queued or running")
+    return {"status": "success", "job_id": job_id}
+
+# Trade ledger
+@router.get("/api/trades")
+def get_trades(strategy_id: Optional[int] = None, symbol: Optional[str] = None, run_id: Optional[str] = None,
+               action: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None,
+               cursor: Optional[str] = None, limit: int = 500):
+    from trade_ledger import query_trades
+    try:
+        return query_trades(strategy_id, symbol, run_id, action, start, end, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/api/trades/runs")
+def get_trade_runs(strategy_id: Optional[int] = None, symbol: Optional[str] = None, limit: int = 50, offset: int = 0):
+    from trade_ledger import list_runs
+    return list_runs(strategy_id, symbol, limit=limit, offset=offset)
+
+@router.delete("/api/trades")
+def delete_trades(run_id: Optional[str] = None, strategy_id: Optional[int] = None):
+    from trade_ledger import delete_trades as delete_ledger_trades
+    if run_id is None and strategy_id is None:
+        raise HTTPException(status_code=400, detail="Pass run_id and/or strategy_id")
+    return {"status": "success", "removed": delete_ledger_trades(run_id=run_id, strategy_id=strategy_id)}
+
+# Result cache inspection
+@router.get("/api/result_cache")
+def result_cache_stats(limit: int = 20):
+    from result_cache import result_cache
+    return result_cache.stats(limit=limit)
+
+@router.delete("/api/result_cache")
+def purge_result_cache(code_hash: Optional[str] = None):
+    from result_cache import result_cache
+    removed = result_cache.purge(code_hash=code_hash)
+    return {"status": "success", "removed": removed}
+
 # 4. FAIRNESS MAB
-mab_system = FairMultiArmedBandit(n_arms=3)
-# Pre-train
-mab_system.update(0, 1)
-mab_system.update(0, 1)
-mab_system.update(1, 1)
-mab_system.update(1, 0)
-mab_system.update(2, 0)
-
-@app.post("/api/allocate_capital")
+# One arm per saved strategy; alpha/beta live in the DB and are updated by battles
+ALLOCATION_COLORS = ["#ff0055", "#00ccff", "#00ff9d", "#ffcc00", "#b266ff", "#ff8800", "#00ffee", "#ff66cc"]
+
+@router.post("/api/allocate_capital")
 async def allocate_capital(request: AllocationRequest):
-    weights = mab_system.calculate_allocation(request.fairness_score)
-    response_data = [
-        {"name": "High Frequency", "value": round(weights[0] * 100, 1), "fill": "#ff0055"},
-        {"name": "Mean Reversion", "value": round(weights[1] * 100, 1), "fill": "#00ccff"},
-        {"name": "Long Term", "value": round(weights[2] * 100, 1), "fill": "#00ff9d"},
-    ]
-    regret_index = request.fairness_score * 0.8 + (3.5) # Simple calc
-    return {"allocation": response_data, "regret_index": round(regret_index, 1)}
\ No newline at end of file
+    from mab_logic import allocator
+    result = await run_in_threadpool(allocator.allocate, request.fairness_score, request.n_draws)
+
+    weights = result["weights"]
+    order = sorted(range(len(weights)), key=lambda i: -weights[i])
+    response_data = [{
+        "name": result["names"][i],
+        "strategy_id": int(result["strategy_ids"][i]),
+        "value": round(weights[i] * 100, 1),
+        "fill": ALLOCATION_COLORS[k % len(ALLOCATION_COLORS)],
+    } for k, i in enumerate(order[:request.top])]
+    rest = order[request.top:]
+    if rest:
+        response_data.append({"name": f"Other ({len(rest)})", "value": round(sum(weights[i] for i in rest) * 100, 1),
+                              "fill": "#555555"})
+    return {"allocation": response_data, "regret_index": round(result["regret"], 1), "arms": len(weights)}
+
+@router.get("/api/allocator")
+async def allocator_state(offset: int = 0, limit: int = 100):
+    from mab_logic import allocator
+    ids, names, alpha, beta = await run_in_threadpool(allocator.arms)
+    return {
+        "arms": len(ids),
+        "items": [{"strategy_id": int(ids[i]), "name": names[i], "alpha": alpha[i], "beta": beta[i],
+                   "win_rate": round(alpha[i] / (alpha[i] + beta[i]), 4)}
+                  for i in range(offset, min(offset + limit, len(ids)))],
+    }
+
+@router.post("/api/allocator/rewards")
+async def allocator_rewards(updates: List[RewardUpdate]):
+    from mab_logic import allocator
+    touched = await run_in_threadpool(allocator.update_batch, [(u.strategy_id, u.reward) for u in updates])
+    return {"status": "success", "arms_updated": touched}
+
+@router.delete("/api/allocator")
+async def allocator_reset(strategy_id: Optional[int] = None):
+    from mab_logic import allocator
+    removed = await run_in_threadpool(allocator.reset, strategy_id)
+    return {"status": "success", "removed": removed}
+
+# --- App factory ---
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create tables
+    Base.metadata.create_all(bind=engine)
+    from sandbox import sandbox_pool, SANDBOX_ENABLED
+    if SANDBOX_ENABLED:
+        sandbox_pool.start()  # Fork before the job workers start threads; workers warm up on their own
+    # The arena pool too (after the sandbox, which forks before pandas is loaded)
+    from arena import start_pool, shutdown_pool
+    start_pool()
+    await job_manager.start()  # Also re-queues jobs interrupted by the last shutdown
+    yield
+    await job_manager.stop()
+    shutdown_pool()
+    sandbox_pool.shutdown()
+
+def create_app() -> FastAPI:
+    app = FastAPI(title="Alpha-Mechanism API", default_response_class=TimedJSONResponse, lifespan=lifespan)
+
+    # CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Total-Count", "Server-Timing"],
+    )
+    app.middleware("http")(record_latency)
+    app.include_router(router)
+    return app
+
+app = create_app()
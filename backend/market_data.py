@@ -0,0 +1,513 @@
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl  # POSIX; elsewhere writers in different processes aren't serialized
+except ImportError:
+    fcntl = None
+
+# Market data layer.
+# Providers know how to fetch OHLCV; OHLCVStore keeps it on disk as one .npy
+# file per column (memory-mapped on read, appended to in segments);
+# MarketData sits in front of both with a hot in-memory LRU so repeated
+# battles on the same ticker never re-fetch or re-parse.
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_cache")
+MAX_SEGMENTS = int(os.getenv("MARKET_MAX_SEGMENTS", "32"))           # Closed segments before they're merged
+OPEN_BAR_TTL_S = float(os.getenv("MARKET_OPEN_BAR_TTL_S", "900"))    # How long today's fetched bars count as fresh
+KEY_LOCK_STRIPES = 64
+
+
+# --- Providers ---
+
+class MarketDataProvider:
+    """
+    Fetches OHLCV bars for [start, end) and returns a DataFrame indexed by
+    timestamp with flat columns (Open, High, Low, Close, Volume...).
+    """
+    name = "base"
+
+    def fetch(self, ticker: str, start: date, end: date, interval: str = "1d") -> pd.DataFrame:
+        raise NotImplementedError("Provider must implement fetch")
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = "yfinance"
+
+    def fetch(self, ticker, start, end, interval="1d"):
+        import yfinance as yf  # Heavy import, only needed when we actually go online
+
+        df = yf.download(ticker, start=start, end=end, interval=interval, progress=False)
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = df.columns.get_level_values(0)
+        return df
+
+
+class LocalDirectoryProvider(MarketDataProvider):
+    """
+    Reads recorded data from a directory, for air-gapped and test use.
+    Looks for <TICKER>_<interval>.parquet/.csv, then <TICKER>.parquet/.csv.
+    CSV files need the timestamp in the first column.
+    """
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _find_file(self, ticker, interval):
+        for stem in (f"{ticker}_{interval}", ticker):
+            for ext in (".parquet", ".csv"):
+                path = os.path.join(self.root, stem + ext)
+                if os.path.exists(path):
+                    return path
+        return None
+
+    def fetch(self, ticker, start, end, interval="1d"):
+        path = self._find_file(ticker, interval)
+        if path is None:
+            return pd.DataFrame()
+
+        if path.endswith(".parquet"):
+            df = pd.read_parquet(path)  # Needs pyarrow/fastparquet
+        else:
+            df = pd.read_csv(path, index_col=0, parse_dates=True)
+
+        df = df.sort_index()
+        return df.loc[_slice_mask(df.index, start, end)]
+
+
+def get_provider(name: str = None) -> MarketDataProvider:
+    """
+    Builds the provider named by MARKET_DATA_PROVIDER ("yfinance" or "local").
+    The local provider reads from MARKET_DATA_DIR.
+    """
+    name = name or os.getenv("MARKET_DATA_PROVIDER", "yfinance")
+    if name == "yfinance":
+        return YFinanceProvider()
+    if name == "local":
+        root = os.getenv("MARKET_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "market_data"))
+        return LocalDirectoryProvider(root)
+    raise ValueError(f"Unknown market data provider: {name}")
+
+
+# --- On-disk columnar cache ---
+
+class OHLCVStore:
+    """
+    One directory per ticker/interval:
+        meta.json      column names, timezone, the covered [start, end) range
+                       and the segment directories, oldest first
+        seg-*/         index.npy (int64 nanoseconds, UTC) and col_<i>.npy
+                       (float64), one file per column
+    A top-up adds a segment with just the new rows. Bars from open_from on
+    (today's, still moving) get their own last segment, which the next write
+    from open_from replaces. Past MAX_SEGMENTS the closed segments are merged
+    a column at a time through memory maps, so no write holds the history in
+    memory.
+    Segments are built in a unique temp dir and renamed into place, then
+    meta.json is swapped atomically. Writers in every process (the API and
+    the sandbox workers) serialize on <dir>.lock; readers hold it shared
+    while they map the files, and a map stays readable after a merge
+    unlinks its file.
+    Reads are memory-mapped, so only the requested rows are pulled from disk.
+    """
+    def __init__(self, root: str = DEFAULT_CACHE_DIR):
+        self.root = root
+
+    def _dir(self, ticker, interval):
+        safe = "".join(c if c.isalnum() or c in "-_.^=" else "_" for c in ticker.upper())
+        return os.path.join(self.root, safe, interval)
+
+    @contextlib.contextmanager
+    def lock(self, ticker, interval, shared: bool = False):
+        """
+        Exclusive for writers, held from the coverage check to the last write;
+        shared for readers.
+        """
+        folder = self._dir(ticker, interval)
+        os.makedirs(os.path.dirname(folder), exist_ok=True)
+        with open(folder + ".lock", "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield  # Closing the file releases the lock
+
+    def coverage(self, ticker, interval):
+        meta = self._read_meta(ticker, interval)
+        if meta is None:
+            return None
+        return date.fromisoformat(meta["start"]), date.fromisoformat(meta["end"])
+
+    def open_bars(self, ticker, interval):
+        """
+        (open_from, fetched_at): bars from open_from on were still moving when
+        fetched at fetched_at (epoch seconds). None when no covered day was open.
+        """
+        meta = self._read_meta(ticker, interval)
+        if meta is None or meta["open_from"] is None:
+            return None
+        return date.fromisoformat(meta["open_from"]), meta["fetched_at"]
+
+    def _read_meta(self, ticker, interval):
+        path = os.path.join(self._dir(ticker, interval), "meta.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            meta = json.load(f)
+        return meta if "segments" in meta else None  # Single-file layout: rebuilt on the next write
+
+    def _maps(self, ticker, interval):
+        # meta and every segment's (index, columns) memory maps, taken together
+        with self.lock(ticker, interval, shared=True):
+            meta = self._read_meta(ticker, interval)
+            if meta is None:
+                return None, []
+            maps = []
+            for name in meta["segments"]:
+                folder = os.path.join(self._dir(ticker, interval), name)
+                index = np.load(os.path.join(folder, "index.npy"), mmap_mode="r")
+                columns = [np.load(os.path.join(folder, f"col_{i}.npy"), mmap_mode="r")
+                           for i in range(len(meta["columns"]))]
+                maps.append((index, columns))
+        return meta, maps
+
+    def read(self, ticker, interval, start: date = None, end: date = None) -> pd.DataFrame:
+        """
+        Rows in [start, end); None means unbounded on that side.
+        """
+        meta, maps = self._maps(ticker, interval)
+        if meta is None:
+            return pd.DataFrame()
+        pieces = [(index[lo:hi], [c[lo:hi] for c in columns]) for index, columns, lo, hi in _pieces(maps, start, end)]
+        return _join(meta, pieces)  # Copies just the slices out of the maps
+
+    def iter_chunks(self, ticker, interval, start: date = None, end: date = None, chunk_rows: int = 100_000):
+        """
+        Same rows as read(), as consecutive DataFrames of at most chunk_rows,
+        so only one chunk is ever in memory.
+        """
+        meta, maps = self._maps(ticker, interval)
+        if meta is None:
+            return
+        pieces, n = [], 0
+        for index, columns, lo, hi in _pieces(maps, start, end):
+            while lo < hi:
+                take = min(hi - lo, chunk_rows - n)
+                pieces.append((index[lo:lo + take], [c[lo:lo + take] for c in columns]))
+                n, lo = n + take, lo + take
+                if n == chunk_rows:
+                    yield _join(meta, pieces)
+                    pieces, n = [], 0
+        if pieces:
+            yield _join(meta, pieces)
+
+    def write(self, ticker, interval, df: pd.DataFrame, start: date, end: date, today: date = None):
+        """
+        Adds df's bars in [start, end) and records that range as covered.
+        Call under lock(), with [start, end) ending at the covered start, or
+        starting at the covered end or at open_from (the open segment is then
+        replaced). Bars from today on go to a new open segment.
+        """
+        today = today or date.today()
+        folder = self._dir(ticker, interval)
+        meta = self._read_meta(ticker, interval)
+        if meta is None:
+            shutil.rmtree(folder, ignore_errors=True)
+            os.makedirs(folder)
+            meta = {
+                "columns": [str(c) for c in df.columns],
+                "tz": _tz(df.index),
+                "index_name": df.index.name,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "segments": [],
+                "open": None,
+                "open_from": None,
+                "fetched_at": None,
+            }
+        self._sweep(folder, meta)
+
+        df = df.loc[_slice_mask(df.index, start, end)]
+        df = df[~df.index.duplicated(keep="last")].sort_index()
+        index = _index_ns(df.index)
+        values = df.reindex(columns=meta["columns"]).to_numpy(dtype="float64").T  # Columns the store lacks are dropped
+
+        dropped = []
+        if meta["segments"] and end <= date.fromisoformat(meta["start"]):
+            name = self._write_segment(folder, index, values)
+            meta["segments"][:0] = [name] if name else []
+        else:
+            if meta["open"]:
+                meta["segments"].remove(meta["open"])
+                dropped.append(meta["open"])
+            split = int(np.searchsorted(index, _to_ns(today), side="left"))
+            closed = self._write_segment(folder, index[:split], values[:, :split])
+            opened = self._write_segment(folder, index[split:], values[:, split:])
+            meta["segments"] += [name for name in (closed, opened) if name]
+            meta["open"] = opened
+            meta["open_from"] = today.isoformat() if max(end, date.fromisoformat(meta["end"])) > today else None
+            meta["fetched_at"] = time.time()
+
+        meta["start"] = min(start, date.fromisoformat(meta["start"])).isoformat()
+        meta["end"] = max(end, date.fromisoformat(meta["end"])).isoformat()
+
+        closed = [name for name in meta["segments"] if name != meta["open"]]
+        if len(closed) > MAX_SEGMENTS:
+            merged = self._merge(folder, closed, len(meta["columns"]))
+            meta["segments"] = [merged] + meta["segments"][len(closed):]
+            dropped += closed
+
+        self._write_meta(folder, meta)
+        for name in dropped:
+            shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+
+    def _write_segment(self, folder, index: np.ndarray, values: np.ndarray):
+        if len(index) == 0:
+            return None
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=folder)
+        np.save(os.path.join(tmp, "index.npy"), index)
+        for i, column in enumerate(values):
+            np.save(os.path.join(tmp, f"col_{i}.npy"), column)
+        return self._publish(folder, tmp)
+
+    def _merge(self, folder, names: list, n_columns: int):
+        # One segment from several, copied file by file through memory maps
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=folder)
+        for file in ["index.npy"] + [f"col_{i}.npy" for i in range(n_columns)]:
+            parts = [np.load(os.path.join(folder, name, file), mmap_mode="r") for name in names]
+            out = np.lib.format.open_memmap(os.path.join(tmp, file), mode="w+", dtype=parts[0].dtype,
+                                            shape=(sum(len(p) for p in parts),))
+            at = 0
+            for part in parts:
+                out[at:at + len(part)] = part
+                at += len(part)
+            out.flush()
+            del out
+        return self._publish(folder, tmp)
+
+    def _publish(self, folder, tmp):
+        name = "seg-" + os.path.basename(tmp)[len(".tmp-"):]
+        os.replace(tmp, os.path.join(folder, name))
+        return name
+
+    def _write_meta(self, folder, meta: dict):
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=folder)
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(folder, "meta.json"))
+
+    def _sweep(self, folder, meta: dict):
+        # Temp files and unlisted segments left by a writer that died (we hold the lock)
+        keep = set(meta["segments"]) | {"meta.json"}
+        for name in os.listdir(folder):
+            if name not in keep:
+                path = os.path.join(folder, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+
+
+# --- Facade ---
+
+class MarketData:
+    """
+    get_ohlcv() answers from the in-memory LRU, then the disk store, and only
+    asks the provider for the date ranges the store doesn't cover yet.
+    """
+    def __init__(self, provider: MarketDataProvider = None, store: OHLCVStore = None, memory_items: int = 32):
+        self.provider = provider or get_provider()
+        self.store = store or OHLCVStore(os.getenv("MARKET_CACHE_DIR", DEFAULT_CACHE_DIR))
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()       # Guards the in-memory LRU
+        # Striped per ticker/interval locks for disk + provider: a fixed set, however many tickers are seen
+        self._key_locks = [threading.Lock() for _ in range(KEY_LOCK_STRIPES)]
+
+    def _key_lock(self, ticker, interval):
+        return self._key_locks[hash((ticker, interval)) % len(self._key_locks)]
+
+    def get_ohlcv(self, ticker: str, period: str = "1y", interval: str = "1d",
+                  start: date = None, end: date = None) -> pd.DataFrame:
+        """
+        Returns a fresh copy (callers like run_backtest add columns in place).
+        """
+        if start is None or end is None:
+            start, end = period_to_range(period)
+        key = (ticker.upper(), interval, start, end)
+
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                return cached.copy()
+
+        # Different tickers can load in parallel; the same ticker loads once
+        with self._key_lock(*key[:2]):
+            with self._lock:
+                cached = self._memory.get(key)
+            if cached is None:
+                cached = self._load(ticker.upper(), interval, start, end)
+
+        if not cached.empty:
+            with self._lock:
+                self._memory[key] = cached
+                self._memory.move_to_end(key)
+                while len(self._memory) > self.memory_items:
+                    self._memory.popitem(last=False)
+        return cached.copy()
+
+    def iter_ohlcv(self, ticker: str, period: str = "1y", interval: str = "1d",
+                   start: date = None, end: date = None, chunk_rows: int = 100_000):
+        """
+        get_ohlcv in chunks of chunk_rows, streamed from the disk store and
+        bypassing the in-memory LRU. Ranges the store doesn't cover yet are
+        fetched and appended first (each provider call still holds its own
+        range in memory; the stored history is never loaded).
+        """
+        if start is None or end is None:
+            start, end = period_to_range(period)
+        ticker = ticker.upper()
+        with self._key_lock(ticker, interval):
+            self._ensure(ticker, interval, start, end)
+        return self.store.iter_chunks(ticker, interval, start, end, chunk_rows)
+
+    def _load(self, ticker, interval, start, end):
+        if not self._ensure(ticker, interval, start, end):
+            return pd.DataFrame()
+        return self.store.read(ticker, interval, start, end)
+
+    def _ensure(self, ticker, interval, start, end) -> bool:
+        """
+        Makes the store cover [start, end), fetching only what it lacks: the
+        edges outside the covered range, and the open bars once they're from
+        a past day or older than OPEN_BAR_TTL_S. False when the provider has no data.
+        """
+        today = date.today()
+        with self.store.lock(ticker, interval):
+            coverage = self.store.coverage(ticker, interval)
+            if coverage is None:
+                fresh = self.provider.fetch(ticker, start, end, interval)
+                if fresh.empty:
+                    return False
+                self.store.write(ticker, interval, fresh, start, end, today)
+                return True
+
+            cov_start, cov_end = coverage
+            tail_from = cov_end if end > cov_end else None
+            open_bars = self.store.open_bars(ticker, interval)
+            if open_bars is not None:
+                open_from, fetched_at = open_bars
+                stale = open_from < today or time.time() - fetched_at > OPEN_BAR_TTL_S
+                if tail_from is not None or (end > open_from and stale):
+                    tail_from = open_from  # The open segment is only ever replaced whole
+
+            # Incremental top-up: fetch and append just the edges (empty ones still extend the coverage)
+            if start < cov_start:
+                self.store.write(ticker, interval, self.provider.fetch(ticker, start, cov_start, interval),
+                                 start, cov_start, today)
+            if tail_from is not None:
+                tail_end = max(end, cov_end)
+                self.store.write(ticker, interval, self.provider.fetch(ticker, tail_from, tail_end, interval),
+                                 tail_from, tail_end, today)
+        return True
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+def get_market_data() -> MarketData:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = MarketData()
+        return _default
+
+def get_ohlcv(ticker: str, period: str = "1y", interval: str = "1d") -> pd.DataFrame:
+    """
+    Drop-in replacement for yf.download(ticker, period=..., interval=...)
+    with flat columns.
+    """
+    return get_market_data().get_ohlcv(ticker, period=period, interval=interval)
+
+def iter_ohlcv(ticker: str, period: str = "1y", interval: str = "1d", chunk_rows: int = 100_000):
+    return get_market_data().iter_ohlcv(ticker, period=period, interval=interval, chunk_rows=chunk_rows)
+
+
+# --- Helpers ---
+
+_PERIOD_UNITS = {"d": 1, "wk": 7, "mo": 31, "y": 366}
+
+def period_to_range(period: str, today: date = None):
+    """
+    "2y" -> (today - 2 years, tomorrow). End is exclusive so today's bar is included.
+    """
+    today = today or date.today()
+    for unit in sorted(_PERIOD_UNITS, key=len, reverse=True):
+        if period.endswith(unit) and period[:-len(unit)].isdigit():
+            n = int(period[:-len(unit)])
+            if unit == "y":
+                start = _shift_years(today, n)
+            elif unit == "mo":
+                start = (pd.Timestamp(today) - pd.DateOffset(months=n)).date()
+            else:
+                start = today - timedelta(days=n * _PERIOD_UNITS[unit])
+            return start, today + timedelta(days=1)
+    raise ValueError(f"Unsupported period: {period}")
+
+def _shift_years(d: date, n: int) -> date:
+    try:
+        return d.replace(year=d.year - n)
+    except ValueError:  # Feb 29
+        return d.replace(year=d.year - n, day=28)
+
+def _frame(meta: dict, index_ns: np.ndarray, data: dict) -> pd.DataFrame:
+    idx = pd.DatetimeIndex(index_ns.view("datetime64[ns]"), name=meta.get("index_name"))
+    if meta.get("tz"):
+        idx = idx.tz_localize("UTC").tz_convert(meta["tz"])
+    return pd.DataFrame(data, index=idx)
+
+def _tz(index):
+    return str(index.tz) if getattr(index, "tz", None) is not None else None
+
+def _index_ns(index) -> np.ndarray:
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return index.values.astype("datetime64[ns]").view("int64")
+
+def _pieces(maps: list, start, end):
+    # (index, columns, lo, hi) for each segment holding rows in [start, end)
+    for index, columns in maps:
+        lo = 0 if start is None else int(np.searchsorted(index, _to_ns(start), side="left"))
+        hi = len(index) if end is None else int(np.searchsorted(index, _to_ns(end), side="left"))
+        if lo < hi:
+            yield index, columns, lo, hi
+
+def _join(meta: dict, pieces: list) -> pd.DataFrame:
+    # One frame from (index, columns) slices, in order
+    index = np.concatenate([np.empty(0, dtype=np.int64)] + [p[0] for p in pieces])
+    data = {col: np.concatenate([np.empty(0)] + [p[1][i] for p in pieces]) for i, col in enumerate(meta["columns"])}
+    return _frame(meta, index, data)
+
+def _to_ns(d) -> int:
+    return pd.Timestamp(datetime(d.year, d.month, d.day)).value
+
+def _slice_mask(index, start, end):
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return (index >= pd.Timestamp(start)) & (index < pd.Timestamp(end))
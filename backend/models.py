@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, LargeBinary, Text, Index
 from database import Base
 from datetime import datetime
 
@@ -20,5 +20,91 @@ class Trade(Base):
     symbol = Column(String)
     action = Column(String) # BUY/SELL
     price = Column(Float)
-    timestamp = Column(DateTime, default=datetime.utcnow)
-    
\ No newline at end of file
+    timestamp = Column(DateTime, default=datetime.utcnow)  # Bar time of the fill
+    run_id = Column(String, index=True)   # One backtest run (uuid4 hex)
+    bar_index = Column(Integer)
+    quantity = Column(Float)              # |position_after - position_before|
+    position_before = Column(Float)
+    position_after = Column(Float)
+
+    __table_args__ = (
+        Index("ix_trades_strategy_symbol_time", "strategy_id", "symbol", "timestamp"),
+        Index("ix_trades_symbol_time", "symbol", "timestamp"),
+    )
+
+class BacktestResult(Base):
+    """
+    Content-addressed cache of execute_strategy results.
+    key = sha256(code hash | canonical params | OHLCV fingerprint)
+    """
+    __tablename__ = "backtest_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, index=True)
+    code_hash = Column(String, index=True)
+    params = Column(Text)        # Canonical JSON
+    data_hash = Column(String)
+    sharpe_ratio = Column(Float, nullable=True)
+    total_return_pct = Column(Float, nullable=True)
+    metrics = Column(Text)       # JSON of every scalar metric in the result
+    equity_curve = Column(LargeBinary)  # zlib-compressed float64 array
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_hit_at = Column(DateTime, default=datetime.utcnow)
+    hits = Column(Integer, default=0)
+
+class Job(Base):
+    """
+    A queued backtest / battle / optimization. Payload and result are JSON;
+    progress lines live in job_events so a client can replay them later.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True, index=True)  # uuid4 hex
+    kind = Column(String, index=True)     # backtest / battle / optimize
+    status = Column(String, index=True)   # queued / running / succeeded / failed / cancelled
+    priority = Column(Integer, default=0) # Higher runs first
+    payload = Column(Text)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    n_events = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class JobEvent(Base):
+    __tablename__ = "job_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, index=True)
+    seq = Column(Integer)
+    line = Column(Text)  # One NDJSON progress packet
+
+class IngestCache(Base):
+    """
+    Paper ingestion cache.
+    kind="text": key = sha256(PDF bytes), value = extracted text
+    kind="code": key = sha256(text | backend | model | prompt version), value = generated code
+    """
+    __tablename__ = "ingest_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, index=True)
+    kind = Column(String)
+    value = Column(LargeBinary)  # zlib-compressed UTF-8
+    meta = Column(Text)          # JSON, e.g. {"n_pages": 12} or {"backend": "gemini"}
+    created_at = Column(DateTime, default=datetime.utcnow)
+    hits = Column(Integer, default=0)
+
+class BanditArm(Base):
+    """
+    Beta(alpha, beta) posterior of one saved strategy's win rate, for the
+    capital allocator. Strategies without a row use the uniform prior (1, 1).
+    """
+    __tablename__ = "bandit_arms"
+
+    id = Column(Integer, primary_key=True, index=True)
+    strategy_id = Column(Integer, unique=True, index=True)
+    alpha = Column(Float, default=1.0)
+    beta = Column(Float, default=1.0)
+    pulls = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,511 @@
+import asyncio
+import json
+import math
+import multiprocessing as mp
+import os
+import signal
+import threading
+import time
+from collections import namedtuple
+
+from sandbox import (_Worker, _Limits, _on_xcpu, encode, decode, OP_READY, OP_RUN, OP_RESULT, OP_STOP,
+                     ResourceLimit, SANDBOX_CPU_S, SANDBOX_WALL_S, SANDBOX_RSS_MB, KILL_GRACE)
+from telemetry import registry, span
+
+# Event-driven replay (paper trading).
+# Bars are read off the market data store (the same recorded files backtests
+# use) and handed one at a time to every strategy in the session, the way a
+# live feed would, at the bar cadence times `speed` (0 = as fast as the
+# strategies can go). Strategy code runs in the session's own sandboxed
+# workers: the strategies are dealt across up to REPLAY_WORKERS of them and
+# decide on the same bar concurrently. The workers are spawned per session
+# (the API runs threads by then, so no fork), and each strategy is loaded
+# under the sandbox's per-run limits (SANDBOX_CPU_S, SANDBOX_WALL_S,
+# SANDBOX_RSS_MB).
+# Each strategy decides on the cheapest incremental path it has:
+#   on_bar            O(1) per bar, state from init_state() carried along
+#   window            generate_signals on the last lookback_bars() + 1 bars
+#   generate_signal   on the last REPLAY_HISTORY bars
+#   generate_signals  on the last REPLAY_HISTORY bars (no lookback_bars())
+# A change of position is a paper fill at that bar's close (as
+# trades_from_signals books it) and the paper P&L runs through the backtest
+# kernel, costs included.
+# Every decision is timed inside the worker. A strategy is safe at a bar
+# resolution when its p99 decision latency fits in REPLAY_LATENCY_BUDGET of
+# one bar.
+
+REPLAY_WORKERS = int(os.getenv("REPLAY_WORKERS", str(min(4, os.cpu_count() or 1))))
+REPLAY_MAX_SESSIONS = int(os.getenv("REPLAY_MAX_SESSIONS", "2"))
+REPLAY_DECISION_S = float(os.getenv("REPLAY_DECISION_S", "5"))       # Wall-clock limit for one decision
+REPLAY_HISTORY = int(os.getenv("REPLAY_HISTORY", "5000"))            # Bars kept for the slice-based paths
+REPLAY_LATENCY_BUDGET = float(os.getenv("REPLAY_LATENCY_BUDGET", "0.1"))
+BATCH_BARS = 256        # Bars per worker round-trip when the replay isn't paced
+CHUNK_ROWS = 10_000     # Bars read off the store at a time
+STATS_EVERY = 1.0       # Seconds between "stats" events
+RESOLUTIONS = (("1s", 1), ("1m", 60), ("1h", 3600), ("1d", 86400))
+
+REPLAY_DECISION_SECONDS = registry.histogram(
+    "alpha_replay_decision_seconds", "Replay decision latency per strategy", ("strategy",),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+
+_sessions = 0
+_sessions_lock = threading.Lock()
+
+
+# --- Worker side ---
+
+class BarFeed:
+    """
+    The most recent bars, appended one at a time. bar() is the newest one as
+    the namedtuple itertuples(name="Bar") gives on_bar; frame(n) is a fresh
+    DataFrame of the last n bars (capacity at most).
+    """
+    def __init__(self, columns: list, tz: str, index_name: str, capacity: int):
+        import numpy as np
+        self.columns = columns
+        self.tz = tz
+        self.index_name = index_name
+        self.capacity = max(1, capacity)
+        self.index = np.empty(2 * self.capacity, dtype=np.int64)
+        self.values = np.empty((len(columns), 2 * self.capacity))
+        self.stop = 0
+        self.count = 0  # Bars seen, including the ones dropped off the front
+        self.Bar = namedtuple("Bar", ["Index", *columns], rename=True)
+
+    def append(self, timestamp_ns, row):
+        if self.stop == len(self.index):
+            # Full: slide the last capacity - 1 bars to the front
+            keep = self.capacity - 1
+            self.index[:keep] = self.index[self.stop - keep:self.stop]
+            self.values[:, :keep] = self.values[:, self.stop - keep:self.stop]
+            self.stop = keep
+        self.index[self.stop] = timestamp_ns
+        self.values[:, self.stop] = row
+        self.stop += 1
+        self.count += 1
+
+    def bar(self):
+        import pandas as pd
+        timestamp = pd.Timestamp(int(self.index[self.stop - 1]), tz="UTC" if self.tz else None)
+        if self.tz:
+            timestamp = timestamp.tz_convert(self.tz)
+        return self.Bar(timestamp, *self.values[:, self.stop - 1].tolist())
+
+    def frame(self, n: int):
+        import pandas as pd
+        from strategies.indicator_cache import bind
+        lo = max(0, self.stop - n)
+        index = pd.DatetimeIndex(self.index[lo:self.stop].view("datetime64[ns]"), name=self.index_name)
+        if self.tz:
+            index = index.tz_localize("UTC").tz_convert(self.tz)
+        frame = pd.DataFrame(self.values[:, lo:self.stop].T, index=index, columns=self.columns, copy=True)
+        bind(frame, cache=False)  # One-off frame: don't fill the shared indicator cache
+        return frame
+
+
+class LiveStrategy:
+    """
+    One strategy fed bar by bar. decide(feed) returns the signal for the bar
+    just appended. A strategy that raises decides 0 for that bar, like the
+    backtest paths; one that times out or runs out of memory is failed and
+    decides 0 from then on.
+    """
+    def __init__(self, name: str, strategy_class, params: dict, history: int):
+        from strategies.base import BaseStrategy
+        self.name = name
+        self.instance = strategy_class(**params) if params else strategy_class()
+        self.error = None
+        self.bars = 1
+        if self.instance.has_incremental_signals():
+            self.path = "on_bar"
+            self.state = self.instance.init_state()
+            return
+        lookback = self.instance.lookback_bars() if self.instance.has_vectorized_signals() else None
+        if lookback is not None:
+            self.path, self.bars = "window", lookback + 1
+        elif type(self.instance).generate_signal is not BaseStrategy.generate_signal:
+            self.path, self.bars = "generate_signal", history
+        else:
+            self.path, self.bars = "generate_signals", history
+
+    def decide(self, feed: BarFeed):
+        import numpy as np
+        if self.path == "on_bar":
+            self.state["bar_index"] = feed.count - 1
+            return self.instance.on_bar(feed.bar(), self.state)
+        frame = feed.frame(self.bars)
+        if self.path == "generate_signal":
+            return self.instance.generate_signal(frame)
+        return np.asarray(self.instance.generate_signals(frame), dtype=np.float64)[-1]
+
+
+def _replay_main(conn, cpu_s: float, wall_s: float, rss_mb: float):
+    # Same setup as a sandbox worker; wall_s is the limit for one decision
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_xcpu)
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    import arena
+    from execution_engine import load_strategy_class
+    conn.send_bytes(encode(OP_READY, {"pid": os.getpid()}))
+
+    feed, strategies = None, []
+    while True:
+        try:
+            op, header, arrays = decode(conn.recv_bytes())
+        except (EOFError, OSError):
+            return
+        if op == OP_STOP:
+            return
+        if "strategies" in header:
+            strategies, reply = _load(header["strategies"], load_strategy_class, arena, rss_mb)
+            feed = BarFeed(header["columns"], header["tz"], header["index_name"],
+                           max([s.bars for s in strategies if s is not None], default=1))
+            conn.send_bytes(encode(OP_RESULT, reply))
+            continue
+        reply, arrays = _decide(strategies, feed, arrays, arena, wall_s, rss_mb)
+        try:
+            conn.send_bytes(encode(OP_RESULT, reply, arrays))
+        except (EOFError, OSError):
+            return
+
+def _load(specs: list, load_strategy_class, arena, rss_mb: float):
+    # A strategy that doesn't load keeps its slot (None) and decides 0 throughout.
+    # Compiling and constructing run strategy code, so each gets a run's limits.
+    strategies, paths, errors = [], {}, {}
+    use_alarm = hasattr(signal, "setitimer") and SANDBOX_WALL_S
+    if use_alarm:
+        signal.signal(signal.SIGALRM, arena._on_alarm)
+    for spec in specs:
+        live = None
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, SANDBOX_WALL_S)
+        try:
+            with _Limits(SANDBOX_CPU_S, rss_mb):
+                live = LiveStrategy(spec["name"], load_strategy_class(spec["code"]), spec.get("params"), REPLAY_HISTORY)
+            paths[spec["name"]] = live.path
+        except arena.StrategyTimeout:
+            errors[spec["name"]] = f"Loading timed out after {SANDBOX_WALL_S}s"
+        except ResourceLimit:
+            errors[spec["name"]] = f"CPU limit exceeded ({SANDBOX_CPU_S}s)"
+        except MemoryError:
+            errors[spec["name"]] = f"Memory limit exceeded ({rss_mb} MB)"
+        except Exception as e:
+            errors[spec["name"]] = str(e)
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        strategies.append(live)
+    return strategies, {"paths": paths, "errors": errors}
+
+def _decide(strategies: list, feed: BarFeed, arrays: dict, arena, wall_s: float, rss_mb: float):
+    import numpy as np
+    index = arrays["index"]
+    values = arrays["values"].reshape(len(feed.columns), len(index))
+    signals = np.zeros((len(strategies), len(index)))
+    latency = np.full((len(strategies), len(index)), np.nan)
+    errors = {}
+    use_alarm = hasattr(signal, "setitimer") and wall_s
+    if use_alarm:
+        signal.signal(signal.SIGALRM, arena._on_alarm)
+
+    with _Limits(0, rss_mb):
+        for j in range(len(index)):
+            feed.append(index[j], values[:, j])
+            for k, live in enumerate(strategies):
+                if live is None or live.error:
+                    continue
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, wall_s)
+                started = time.perf_counter()
+                try:
+                    value = float(live.decide(feed))
+                except arena.StrategyTimeout:
+                    value, live.error = 0.0, f"Decision timed out after {wall_s}s"
+                except MemoryError:
+                    value, live.error = 0.0, f"Memory limit exceeded ({rss_mb} MB)"
+                except Exception:
+                    value = 0.0
+                finally:
+                    if use_alarm:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+                latency[k, j] = time.perf_counter() - started
+                signals[k, j] = value if value == value else 0.0  # NaN is flat
+                if live.error:
+                    errors[live.name] = live.error
+    return {"errors": errors}, {"signals": signals.ravel(), "latency": latency.ravel()}
+
+
+# --- Parent side ---
+
+class ReplayWorkers:
+    """
+    The session's workers, each deciding for its share of the strategies
+    (strategy k goes to worker k % n). Blocking: call from a thread.
+    """
+    def __init__(self, strategies: list, n_workers: int = REPLAY_WORKERS):
+        ctx = mp.get_context("spawn")  # Sessions start while the API's threads run
+        self.strategies = strategies
+        self.n = max(1, min(n_workers, len(strategies)))
+        self.workers = [_Worker(ctx, 0, REPLAY_DECISION_S, SANDBOX_RSS_MB, target=_replay_main) for _ in range(self.n)]
+
+    def load(self, columns: list, tz: str, index_name: str) -> dict:
+        """
+        Compiles every strategy in its worker, each under a run's limits.
+        Returns {"paths": {name: path}, "errors": {name: error}}.
+        """
+        paths, errors = {}, {}
+        for w, worker in enumerate(self.workers):
+            worker.wait_ready()
+            specs = [{"name": s["name"], "code": s["code"], "params": s.get("params")} for s in self.strategies[w::self.n]]
+            reply, _ = self._exchange(worker, {"strategies": specs, "columns": columns, "tz": tz,
+                                               "index_name": index_name}, SANDBOX_WALL_S * len(specs) + KILL_GRACE)
+            paths.update(reply["paths"])
+            errors.update(reply["errors"])
+        return {"paths": paths, "errors": errors}
+
+    def decide(self, index, values):
+        """
+        index (n,) int64 ns, values (n_columns, n). Returns (signals, latency),
+        both (n_strategies, n) in strategy order, and {name: error} for
+        strategies that failed on these bars.
+        """
+        import numpy as np
+        n = len(index)
+        for worker in self.workers:
+            worker.conn.send_bytes(encode(OP_RUN, {"bars": n}, {"index": index, "values": values}))
+        signals = np.zeros((len(self.strategies), n))
+        latency = np.full((len(self.strategies), n), np.nan)
+        errors = {}
+        for w, worker in enumerate(self.workers):
+            group = len(self.strategies[w::self.n])
+            reply, arrays = self._receive(worker, REPLAY_DECISION_S * group * n + KILL_GRACE)
+            signals[w::self.n] = arrays["signals"].reshape(group, n)
+            latency[w::self.n] = arrays["latency"].reshape(group, n)
+            errors.update(reply["errors"])
+        return signals, latency, errors
+
+    def _exchange(self, worker, message: dict, timeout: float):
+        worker.conn.send_bytes(encode(OP_RUN, message))
+        return self._receive(worker, timeout)
+
+    def _receive(self, worker, timeout: float):
+        try:
+            if not worker.conn.poll(timeout):
+                worker.kill()  # Stuck where SIGALRM can't reach
+                raise RuntimeError("Replay worker stopped responding")
+            _, header, arrays = decode(worker.conn.recv_bytes())
+        except (EOFError, OSError):
+            worker.process.join(0.5)
+            raise RuntimeError(f"Replay worker died (exit code {worker.process.exitcode})")
+        return header, arrays
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
+
+
+def latency_summary(latency, gap: float = None) -> dict:
+    """
+    Decision latency percentiles (ms) for one strategy's timed decisions, and
+    the resolutions its p99 fits: RESOLUTIONS whose bar is at least
+    p99 / REPLAY_LATENCY_BUDGET long. late_pct: share of decisions slower than
+    the replay's bar gap (paced replays only).
+    """
+    import numpy as np
+    latency = latency[~np.isnan(latency)]
+    if not len(latency):
+        return {"decisions": 0, "latency_ms": None, "late_pct": None, "safe_for": []}
+    p50, p90, p99 = np.percentile(latency, [50, 90, 99])
+    return {
+        "decisions": int(len(latency)),
+        "latency_ms": {
+            "mean": round(float(latency.mean()) * 1000, 4),
+            "p50": round(float(p50) * 1000, 4),
+            "p90": round(float(p90) * 1000, 4),
+            "p99": round(float(p99) * 1000, 4),
+            "max": round(float(latency.max()) * 1000, 4),
+        },
+        "late_pct": round(float((latency > gap).mean()) * 100, 2) if gap else None,
+        "safe_for": [name for name, seconds in RESOLUTIONS if p99 <= REPLAY_LATENCY_BUDGET * seconds],
+    }
+
+async def replay(strategies: list, ticker: str, period: str = "1y", interval: str = "1d", speed: float = 1.0,
+                 max_bars: int = None, costs: dict = None):
+    """
+    strategies: [{"name": ..., "code": ..., "params": {...} or None}, ...]
+    Yields event dicts, in order:
+        {"event": "start", "strategies": {name: path}, "bar_seconds", "gap_seconds"}
+        {"event": "bar", "bar", "timestamp", "close", "signals": {name: signal}}   paced replays only
+        {"event": "fill", "strategy", "bar", "timestamp", "action", "price",
+         "position_before", "position_after", "quantity"}
+        {"event": "stats", "bars", "lag_s", "strategies": {name: {...}}}            about every STATS_EVERY s
+        {"event": "error", "error", "strategy"?}
+        {"event": "summary", "bars", "elapsed_s", "strategies": {name: {latency, safe_for, metrics...}}}
+    speed: bars are played at their own cadence (median gap between bars)
+    times speed; 0 plays them as fast as the strategies decide.
+    """
+    global _sessions
+    import numpy as np
+    from market_data import iter_ohlcv
+    from strategies import backtest_kernel as kernel
+
+    with _sessions_lock:
+        if _sessions >= REPLAY_MAX_SESSIONS:
+            yield {"event": "error", "error": f"{REPLAY_MAX_SESSIONS} replays are already running, try again later"}
+            return
+        _sessions += 1
+
+    names = [s["name"] for s in strategies]
+    workers = None
+    try:
+        chunks = iter_ohlcv(ticker, period, interval, CHUNK_ROWS)
+        with span("market_data.load"):
+            chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None or chunk.empty:
+            yield {"event": "error", "error": "No market data"}
+            return
+        tz = str(chunk.index.tz) if chunk.index.tz is not None else None
+        workers = await asyncio.to_thread(ReplayWorkers, strategies)
+        with span("replay.load"):
+            loaded = await asyncio.to_thread(workers.load, [str(c) for c in chunk.columns], tz, chunk.index.name)
+        for name, error in loaded["errors"].items():
+            yield {"event": "error", "strategy": name, "error": error}
+
+        index_ns = _index_ns(chunk.index)
+        bar_seconds = float(np.median(np.diff(index_ns))) / 1e9 if len(index_ns) > 1 else 0.0
+        gap = bar_seconds / speed if speed > 0 and bar_seconds > 0 else 0.0
+        yield {"event": "start", "ticker": ticker, "strategies": loaded["paths"],
+               "bar_seconds": bar_seconds, "gap_seconds": gap}
+
+        cost = kernel.cost_rate(costs)
+        state = kernel.new_state(len(strategies))
+        position = np.zeros(len(strategies))
+        latencies, fills = [], np.zeros(len(strategies), dtype=np.int64)
+        failed = set(loaded["errors"])
+        started = time.monotonic()
+        next_stats = started + STATS_EVERY
+        bars, lag = 0, 0.0
+        close_column = list(chunk.columns).index("Close")
+
+        while chunk is not None and (max_bars is None or bars < max_bars):
+            if max_bars is not None:
+                chunk = chunk.iloc[:max_bars - bars]
+            index_ns = _index_ns(chunk.index)
+            values = chunk.to_numpy(dtype=np.float64).T.copy()
+            step = 1 if gap else BATCH_BARS
+            for lo in range(0, len(index_ns), step):
+                hi = min(lo + step, len(index_ns))
+                if gap:
+                    # Wait for the bar's slot; if decisions run late, the feed doesn't wait for them
+                    due = started + bars * gap
+                    now = time.monotonic()
+                    if due > now:
+                        await asyncio.sleep(due - now)
+                    lag = max(0.0, time.monotonic() - due)
+                signals, latency, errors = await asyncio.to_thread(workers.decide, index_ns[lo:hi], values[:, lo:hi])
+                latencies.append(latency)
+                for name, error in errors.items():
+                    if name not in failed:
+                        failed.add(name)
+                        yield {"event": "error", "strategy": name, "error": error}
+                for k, name in enumerate(names):
+                    for seconds in latency[k][~np.isnan(latency[k])]:
+                        REPLAY_DECISION_SECONDS.observe(seconds, strategy=name)
+
+                close = values[close_column, lo:hi]
+                kernel.update(state, signals, close, cost)
+                timestamps = chunk.index[lo:hi]
+                if gap:
+                    yield {"event": "bar", "bar": bars, "timestamp": timestamps[0].isoformat(), "close": float(close[0]),
+                           "signals": dict(zip(names, signals[:, 0].tolist()))}
+                for event in _fills(names, signals, position, close, timestamps, bars):
+                    yield event
+                fills += np.count_nonzero(np.diff(signals, axis=1, prepend=position[:, None]), axis=1)
+                position = signals[:, -1].copy()
+                bars += hi - lo
+
+                if time.monotonic() >= next_stats:
+                    next_stats = time.monotonic() + STATS_EVERY
+                    yield _stats(names, latencies, state, position, bars, lag, gap)
+
+            with span("market_data.load"):
+                chunk = await asyncio.to_thread(next, chunks, None)
+
+        latency = np.hstack(latencies) if latencies else np.empty((len(names), 0))
+        summary = {}
+        for k, name in enumerate(names):
+            summary[name] = {
+                "path": loaded["paths"].get(name),
+                **latency_summary(latency[k], gap),
+                "error": loaded["errors"].get(name),
+                "fills": int(fills[k]),
+                **{metric: value if value is None or math.isfinite(value) else None  # JSON has no NaN
+                   for metric, value in kernel.report(state, cost, row=k).items()},
+            }
+            if name in failed:
+                summary[name]["safe_for"] = []
+        yield {"event": "summary", "ticker": ticker, "bars": bars,
+               "elapsed_s": round(time.monotonic() - started, 3), "strategies": summary}
+    except Exception as e:
+        yield {"event": "error", "error": str(e)}
+    finally:
+        if workers is not None:
+            await asyncio.to_thread(workers.close)
+        with _sessions_lock:
+            _sessions -= 1
+
+def _index_ns(index):
+    import numpy as np
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return np.asarray(index.values.astype("datetime64[ns]").view(np.int64))
+
+def _fills(names, signals, position, close, timestamps, first_bar):
+    # One fill per bar where a strategy's target position changes, at that bar's close
+    import numpy as np
+    before = np.empty_like(signals)
+    before[:, 0] = position
+    before[:, 1:] = signals[:, :-1]
+    for k, j in zip(*np.nonzero(signals != before)):
+        after = float(signals[k, j])
+        was = float(before[k, j])
+        yield {
+            "event": "fill",
+            "strategy": names[k],
+            "bar": first_bar + int(j),
+            "timestamp": timestamps[j].isoformat(),
+            "action": "BUY" if after > was else "SELL",
+            "price": float(close[j]),
+            "position_before": was,
+            "position_after": after,
+            "quantity": abs(after - was),
+        }
+
+def _stats(names, latencies, state, position, bars, lag, gap) -> dict:
+    import numpy as np
+    from strategies import backtest_kernel as kernel
+    latency = np.hstack(latencies)
+    strategies = {}
+    for k, name in enumerate(names):
+        stats = latency_summary(latency[k], gap)
+        strategies[name] = {
+            "decisions": stats["decisions"],
+            "latency_ms": stats["latency_ms"],
+            "position": float(position[k]),
+            "equity": round(float(state[k, kernel.EQUITY]), 6),
+        }
+    return {"event": "stats", "bars": bars, "lag_s": round(lag, 4), "strategies": strategies}
+
+
+def sse(events):
+    """
+    Server-sent events for an event-dict stream: "event: <kind>" plus the
+    dict as JSON data.
+    """
+    async def lines():
+        async for event in events:
+            yield f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+    return lines()
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from database import SessionLocal, engine, Base
+from models import BacktestResult
+from execution_engine import execute_strategy, StrategyCache
+from strategies.backtest_kernel import cost_key
+
+# Persistent backtest memoization.
+# A backtest is a pure function of (strategy source, params, input OHLCV), so
+# its result is stored in SQLite under a hash of exactly those three things.
+# The optimizer re-visiting a clipped parameter vector, or a battle re-running
+# the same strategy on the same data, becomes a single indexed lookup.
+
+DEFAULT_TTL = int(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))      # seconds
+DEFAULT_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Hash of the index, column names and numeric values of an OHLCV frame.
+    Call it BEFORE run_backtest adds its own columns.
+    """
+    h = hashlib.sha256()
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    h.update(index.values.astype("datetime64[ns]").view("int64").tobytes())
+    for col in df.columns:
+        h.update(str(col).encode("utf-8"))
+        h.update(np.ascontiguousarray(df[col].to_numpy(dtype="float64")).tobytes())
+    return h.hexdigest()
+
+def canonical_params(strategy_code: str, params: dict = None) -> str:
+    """
+    Params merged over the constructor defaults, as sorted JSON, so that
+    AlphaStrategy() and AlphaStrategy(**defaults) share one cache entry.
+    """
+    from sandbox import inspect_strategy
+    merged = {}
+    try:
+        merged.update(inspect_strategy(strategy_code)["defaults"])  # Loaded in a sandbox worker, once per source
+    except Exception:
+        pass  # Broken code: the run will fail anyway and errors aren't cached
+    merged.update(params or {})
+    return json.dumps(merged, sort_keys=True, default=str)
+
+def result_key(code_hash: str, params_json: str, data_hash: str, costs: str = cost_key()) -> str:
+    # costs: backtest_kernel.cost_key, so runs under different fees never share a result
+    return hashlib.sha256(f"{code_hash}|{params_json}|{data_hash}|{costs}".encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, session_factory=SessionLocal, ttl_seconds: int = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._table_ready = False
+
+    def _ensure_table(self):
+        if not self._table_ready:
+            Base.metadata.create_all(bind=engine, tables=[BacktestResult.__table__])
+            self._table_ready = True
+
+    def make_key(self, strategy_code: str, params: dict, data_hash: str, costs: dict = None):
+        params_json = canonical_params(strategy_code, params)
+        code_hash = StrategyCache.code_hash(strategy_code)
+        return result_key(code_hash, params_json, data_hash, cost_key(costs)), code_hash, params_json
+
+    def get(self, key: str):
+        self._ensure_table()
+        db = self.session_factory()
+        try:
+            row = db.query(BacktestResult).filter(BacktestResult.key == key).first()
+            if row is None or self._expired(row):
+                with self._lock:
+                    self.misses += 1
+                return None
+            row.hits = (row.hits or 0) + 1
+            row.last_hit_at = datetime.utcnow()
+            db.commit()
+            with self._lock:
+                self.hits += 1
+            return _decode(row)
+        finally:
+            db.close()
+
+    def put(self, key: str, code_hash: str, params_json: str, data_hash: str, result: dict):
+        if "error" in result:
+            return  # Never cache failures (they may be transient, e.g. a timeout)
+        self._ensure_table()
+        metrics = {k: v for k, v in result.items() if k not in ("equity_curve", "elapsed_s", "trades")}
+        curve = np.asarray(result.get("equity_curve", []), dtype="float64")
+
+        db = self.session_factory()
+        try:
+            row = db.query(BacktestResult).filter(BacktestResult.key == key).first()
+            if row is None:
+                row = BacktestResult(key=key)
+                db.add(row)
+            row.code_hash = code_hash
+            row.params = params_json
+            row.data_hash = data_hash
+            row.sharpe_ratio = _finite(metrics.get("sharpe_ratio"))
+            row.total_return_pct = _finite(metrics.get("total_return_pct"))
+            row.metrics = json.dumps(metrics, default=str)
+            row.equity_curve = zlib.compress(curve.tobytes())
+            row.created_at = datetime.utcnow()
+            db.commit()
+        except Exception:
+            db.rollback()  # Lost a race with another writer for the same key; that's fine
+        finally:
+            db.close()
+
+        with self._lock:
+            self._puts += 1
+            run_eviction = self._puts % 50 == 0
+        if run_eviction:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Drops expired rows, then the least recently used rows above max_entries.
+        """
+        self._ensure_table()
+        db = self.session_factory()
+        try:
+            removed = 0
+            if self.ttl_seconds:
+                cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+                removed += db.query(BacktestResult).filter(BacktestResult.created_at < cutoff).delete()
+            total = db.query(BacktestResult).count()
+            if self.max_entries and total > self.max_entries:
+                stale = (db.query(BacktestResult.id)
+                         .order_by(BacktestResult.last_hit_at.asc())
+                         .limit(total - self.max_entries)
+                         .all())
+                ids = [r.id for r in stale]
+                removed += db.query(BacktestResult).filter(BacktestResult.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            return removed
+        finally:
+            db.close()
+
+    def purge(self, code_hash: str = None) -> int:
+        self._ensure_table()
+        db = self.session_factory()
+        try:
+            query = db.query(BacktestResult)
+            if code_hash:
+                query = query.filter(BacktestResult.code_hash.like(f"{code_hash}%"))  # Prefixes from stats() work too
+            removed = query.delete()
+            db.commit()
+            return removed
+        finally:
+            db.close()
+
+    def stats(self, limit: int = 20) -> dict:
+        self._ensure_table()
+        db = self.session_factory()
+        try:
+            recent = (db.query(BacktestResult)
+                      .order_by(BacktestResult.last_hit_at.desc())
+                      .limit(limit).all())
+            return {
+                "entries": db.query(BacktestResult).count(),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "recent": [{
+                    "key": r.key[:16],
+                    "code_hash": r.code_hash[:12],
+                    "params": json.loads(r.params),
+                    "sharpe_ratio": r.sharpe_ratio,
+                    "total_return_pct": r.total_return_pct,
+                    "hits": r.hits,
+                    "created_at": r.created_at,
+                } for r in recent],
+            }
+        finally:
+            db.close()
+
+    def _expired(self, row) -> bool:
+        if not self.ttl_seconds or row.created_at is None:
+            return False
+        return row.created_at < datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+
+
+result_cache = ResultCache()
+
+def cached_execute_strategy(strategy_code: str, df: pd.DataFrame, params: dict = None,
+                            data_hash: str = None, execute=execute_strategy, costs: dict = None):
+    """
+    execute_strategy with a persistent result cache in front of it. execute
+    runs the misses (e.g. sandbox.execute_strategy).
+    """
+    data_hash = data_hash or frame_fingerprint(df)
+    key, code_hash, params_json = result_cache.make_key(strategy_code, params, data_hash, costs)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+    result = execute(strategy_code, df, params, costs=costs)
+    result_cache.put(key, code_hash, params_json, data_hash, result)
+    return result
+
+def _decode(row) -> dict:
+    result = json.loads(row.metrics)
+    result["equity_curve"] = np.frombuffer(zlib.decompress(row.equity_curve), dtype="float64").tolist()
+    return result
+
+def _finite(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if np.isfinite(value) else None
@@ -2,97 +2,207 @@ import numpy as np
 import pandas as pd
 import json
 import asyncio
-import inspect
-import importlib.util
-from execution_engine import execute_strategy
+import math
+import time
+from execution_engine import score_signals
+from arena import SharedOHLCV, submit_cell, run_signal_matrix, _reset_pool, MAX_WORKERS, DEFAULT_TIMEOUT
+from sandbox import inspect_strategy, signal_matrix
+from robustness import OBJECTIVES
+from search_engines import make_engine
+from result_cache import result_cache, frame_fingerprint
+from strategies.indicator_cache import bind, indicator_cache
+from telemetry import span, record_span
 
-# Simple "Hill Climbing" Optimizer (Better for this use case than PPO)
-# Why? PPO needs thousands of episodes. You don't want to wait 5 hours.
-# Hill Climbing finds the best parameters in ~30 seconds.
+# Population-based optimizer.
+# A search engine (random / grid / cmaes / tpe) proposes a whole generation of
+# parameter sets, the generation is backtested concurrently on the arena's
+# worker pool (OHLCV shared once, not copied per run), and every result is
+# streamed to the UI as soon as it lands. Strategy code only ever runs in
+# workers: the sandbox inspects it and runs grid kernels, the arena pool the rest.
+# The reward is the Sharpe ratio, or a robustness objective (robustness.py):
+# those need each candidate's signal row, so a generation is scored in one
+# batch like the grid kernel's, from rows built on the worker pool.
 
-async def optimize_strategy(strategy_code: str, df: pd.DataFrame):
+def detect_parameters(strategy_code: str):
+    """
+    Inspects AlphaStrategy.__init__ and returns (defaults, search ranges).
+    The code is loaded in a sandbox worker (see execution_engine.strategy_info);
+    blocking, so call it off the event loop.
+    """
+    info = inspect_strategy(strategy_code)
+    return dict(info["params"]), dict(info["ranges"])
+
+def _score_generation(strategy_code: str, df: pd.DataFrame, batch: list, objective: str, data_hash: str,
+                      grid_kernel: bool, costs: dict = None):
+    # Signal rows from one sandbox run (grid kernel) or the arena pool, then
+    # one batch of metrics plus the objective
+    try:
+        if grid_kernel:
+            signals = signal_matrix(strategy_code, df, batch, data_hash)
+        else:
+            signals = run_signal_matrix(df, strategy_code, batch, DEFAULT_TIMEOUT, data_hash)
+        return score_signals(signals, df['Close'].to_numpy(dtype=np.float64), batch, costs, objective)
+    except Exception as e:
+        return {"error": str(e)}
+
+def _deliver(loop, queue, item):
+    # Runs on the pool's result thread. If the optimization was cancelled and
+    # its loop is gone, drop the result: raising here would kill that thread.
+    try:
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+    except RuntimeError:
+        pass
+
+async def optimize_strategy(strategy_code: str, df: pd.DataFrame, engine: str = "random",
+                            max_evals: int = 20, max_seconds: float = None,
+                            population: int = None, seed: int = None, objective: str = "sharpe",
+                            costs: dict = None):
     """
     1. Inspects the strategy code to find tunable parameters.
-    2. Runs a loop trying different values.
-    3. Streams the progress to the UI.
+    2. Asks the search engine for generations of candidates and backtests
+       each generation in parallel.
+    3. Streams the progress to the UI (one NDJSON line per evaluation).
+    Stops after max_evals evaluations or max_seconds of wall-clock, whichever comes first.
+    objective: the reward, "sharpe", "robust_sharpe" or "skill" (see robustness.py).
+    costs: {"fee_bps", "slippage_bps"} overrides for every candidate's backtest.
     """
-    
+
     # 1. ANALYZE THE STRATEGY CODE
-    # We save it momentarily to import it and check __init__
-    temp_path = "strategies/temp_inspector.py"
-    with open(temp_path, "w") as f:
-        f.write("from strategies.base import BaseStrategy\n" + strategy_code)
-    
-    spec = importlib.util.spec_from_file_location("temp_inspector", temp_path)
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-    
-    # Get the arguments of __init__ (excluding 'self')
-    sig = inspect.signature(module.AlphaStrategy.__init__)
-    params = {}
-    
-    # Define ranges for common parameter names (Smart Heuristics)
-    param_ranges = {}
-    for name, param in sig.parameters.items():
-        if name == 'self': continue
-        
-        # Default value
-        default = param.default if param.default is not inspect.Parameter.empty else 10
-        params[name] = default
-        
-        # Set smart search ranges based on name
-        if 'window' in name or 'period' in name:
-            param_ranges[name] = (5, 100) # Search between 5 and 100
-        elif 'threshold' in name:
-            param_ranges[name] = (10, 90) # Search RSI thresholds
-        else:
-            param_ranges[name] = (1, 50) # Generic fallback
+    loop = asyncio.get_running_loop()
+    try:
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}'. Choose from {list(OBJECTIVES)}")
+        with span("optimizer.detect"):
+            info = await loop.run_in_executor(None, inspect_strategy, strategy_code)
+        params, param_ranges = dict(info["params"]), dict(info["ranges"])
+        searcher = make_engine(engine, param_ranges, seed=seed)
+    except Exception as e:
+        yield json.dumps({"log": f"Error: {e}"}) + "\n"
+        return
 
     yield json.dumps({"log": f"DETECTED PARAMETERS: {list(params.keys())}"}) + "\n"
+    if not param_ranges:
+        yield json.dumps({"log": "Nothing to tune."}) + "\n"
+        return
+
+    # Window-style strategies can score a whole generation in one vectorized
+    # pass, so there's no need for the worker pool (or small generations)
+    grid_mode = info["grid"]
+    if not population:
+        if grid_mode and searcher.name in ("random", "grid"):
+            population = max_evals
+        else:
+            # One slot per worker, but never below CMA-ES's default lambda = 4 + 3 ln(d)
+            population = max(MAX_WORKERS, 4 + int(3 * math.log(len(param_ranges))))
+    if grid_mode:
+        yield json.dumps({"log": "BATCHED GRID KERNEL: scoring each generation in one pass"}) + "\n"
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    yield json.dumps({"log": f"ENGINE: {searcher.name} | POPULATION: {population} | BUDGET: {max_evals} evals"
+                             + (f" / {max_seconds}s" if max_seconds else "")}) + "\n"
 
     # 2. THE OPTIMIZATION LOOP
+    label = "Sharpe" if objective == "sharpe" else objective
     best_sharpe = -999
     best_params = params.copy()
-    
-    # We will try 20 iterations of random "Mutations"
-    for i in range(1, 21):
-        await asyncio.sleep(0.1) # UI buffer
-        
-        # Mutate parameters slightly
-        current_test_params = best_params.copy()
-        for key in param_ranges:
-            low, high = param_ranges[key]
-            # Randomly change the value by +/- 20%
-            change = np.random.randint(-5, 6) 
-            new_val = current_test_params[key] + change
-            # Clip to bounds
-            new_val = max(low, min(high, new_val))
-            current_test_params[key] = int(new_val)
-            
-        # RUN REAL BACKTEST
-        result = execute_strategy(strategy_code, df.copy(), current_test_params)
-        
-        if "error" in result:
-            yield json.dumps({"log": f"Error: {result['error']}"}) + "\n"
-            continue
-            
-        sharpe = result.get('sharpe_ratio', -1)
-        
-        # Logic: If better, keep it.
-        log_msg = f"Ep {i}: Testing {current_test_params} -> Sharpe: {sharpe}"
-        if sharpe > best_sharpe:
-            best_sharpe = sharpe
-            best_params = current_test_params.copy()
-            log_msg += " (NEW RECORD! 🚀)"
-        
-        # STREAM DATA PACKET
-        data = {
-            "episode": i,
-            "log": log_msg,
-            "reward": sharpe, # The "Reward" is the Sharpe Ratio
-            "params": current_test_params # Visualization needs this
-        }
-        yield json.dumps(data) + "\n"
+
+    queue = asyncio.Queue()
+    episode = 0
+    first_generation = True
+
+    data_hash = frame_fingerprint(df)
+    bind(df, data_hash)  # Grid generations share their indicators through the cache
+
+    try:
+        with SharedOHLCV(df, data_hash) as shared:
+            handle = shared.handle()
+            while episode < max_evals and not searcher.exhausted:
+                if deadline and time.monotonic() >= deadline:
+                    yield json.dumps({"log": "Time budget reached."}) + "\n"
+                    break
+
+                size = min(population, max_evals - episode)
+                if first_generation:
+                    # Always score the author's defaults as the baseline
+                    batch = [params.copy()] + searcher.ask(size - 1)
+                    first_generation = False
+                else:
+                    batch = searcher.ask(size)
+                if not batch:
+                    break
+
+                # RUN REAL BACKTESTS (whole generation at once)
+                generation_started = time.monotonic()
+                batched = grid_mode or objective != "sharpe"
+                if batched:
+                    scored = await loop.run_in_executor(None, _score_generation, strategy_code, df, batch, objective,
+                                                        data_hash, grid_mode, costs)
+                    for k, candidate in enumerate(batch):
+                        queue.put_nowait((candidate, scored if isinstance(scored, dict) else scored[k], None))
+                for candidate in ([] if batched else batch):
+                    # Clipping pins values at the bounds, so repeats are common: check the cache first
+                    entry = (*result_cache.make_key(strategy_code, candidate, data_hash, costs), data_hash)
+                    cached = result_cache.get(entry[0])
+                    if cached is not None:
+                        queue.put_nowait((candidate, dict(cached, cached=True), None))
+                        continue
+                    submit_cell(handle, strategy_code, candidate, DEFAULT_TIMEOUT,
+                                lambda result, c=candidate, e=entry: _deliver(loop, queue, (c, result, e)), costs)
+
+                # Workers stop a candidate at DEFAULT_TIMEOUT themselves; this
+                # deadline only catches a worker that can't be interrupted
+                waves = math.ceil(len(batch) / max(1, MAX_WORKERS))
+                cells_deadline = None if batched else generation_started + waves * DEFAULT_TIMEOUT + 5
+                for _ in batch:
+                    waits = [max(0.0, t - time.monotonic()) for t in (deadline, cells_deadline) if t]
+                    try:
+                        candidate, result, entry = await asyncio.wait_for(queue.get(), timeout=min(waits, default=None))
+                    except asyncio.TimeoutError:
+                        if deadline and time.monotonic() >= deadline:
+                            break  # Stragglers finish in the pool and are dropped with the queue
+                        # A stuck worker: replacing the pool fails this generation's pending cells
+                        await loop.run_in_executor(None, _reset_pool)
+                        cells_deadline = None
+                        candidate, result, entry = await queue.get()
+                    episode += 1
+                    if entry:
+                        result_cache.put(*entry, result)
+
+                    if "error" in result:
+                        searcher.tell(candidate, -math.inf)
+                        yield json.dumps({"log": f"Ep {episode}: {candidate} -> Error: {result['error']}"}) + "\n"
+                        continue
+
+                    reward = result.get(OBJECTIVES[objective], -1)
+                    if reward is None or not np.isfinite(reward):
+                        searcher.tell(candidate, -math.inf)
+                        yield json.dumps({"log": f"Ep {episode}: Testing {candidate} -> {label}: n/a (no trades)"}) + "\n"
+                        continue
+                    searcher.tell(candidate, reward)
+
+                    # Logic: If better, keep it.
+                    log_msg = f"Ep {episode}: Testing {candidate} -> {label}: {reward}"
+                    if objective != "sharpe":
+                        log_msg += f" (Sharpe: {result.get('sharpe_ratio')})"
+                    if result.get("cached"):
+                        log_msg += " (cached)"
+                    if reward > best_sharpe:
+                        best_sharpe = reward
+                        best_params = candidate.copy()
+                        log_msg += " (NEW RECORD! 🚀)"
+
+                    # STREAM DATA PACKET
+                    data = {
+                        "episode": episode,
+                        "log": log_msg,
+                        "reward": reward, # The "Reward" is the Sharpe Ratio, or the robustness objective
+                        "params": candidate # Visualization needs this
+                    }
+                    yield json.dumps(data) + "\n"
+
+                # Submit-to-last-result for the generation (includes time spent streaming it)
+                record_span("optimizer.generation", time.monotonic() - generation_started)
+    finally:
+        indicator_cache.drop(data_hash)  # The run is over (or failed); workers' copies age out of their LRU
 
     yield json.dumps({"log": f"--- OPTIMIZATION COMPLETE ---"}) + "\n"
-    yield json.dumps({"log": f"BEST PARAMETERS: {best_params} (Sharpe: {best_sharpe})"}) + "\n"
\ No newline at end of file
+    yield json.dumps({"log": f"BEST PARAMETERS: {best_params} ({label}: {best_sharpe})"}) + "\n"
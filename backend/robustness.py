@@ -0,0 +1,184 @@
+import math
+import os
+
+import numpy as np
+
+from strategies import backtest_kernel as kernel
+
+# Robustness analysis.
+# One backtest is one path through history; these resample it thousands of
+# times to show how much of the result is skill and how much is the path:
+#   block bootstrap   the strategy's own returns, resampled in circular blocks
+#                     of block_bars (keeps volatility clustering and the
+#                     autocorrelation of holding periods), give distributions
+#                     of Sharpe, max drawdown and terminal equity
+#   random entry      the same signal series, circularly shifted against the
+#                     market by a random offset: same exposure, trade count
+#                     and holding periods, random timing. The share of these
+#                     the real timing beats is the probability of skill.
+# Every resample is a row of one (n_samples, n_bars) matrix and the metrics
+# are whole-matrix NumPy (cumprod, maximum.accumulate), in slices of at most
+# MAX_CELLS values so long histories stay bounded in memory.
+# objective_scores() scores a whole optimizer generation the same way, with
+# the same resamples for every candidate, so their ranking is fair.
+
+ROBUSTNESS_SAMPLES = int(os.getenv("ROBUSTNESS_SAMPLES", "2000"))
+OBJECTIVE_SAMPLES = int(os.getenv("ROBUSTNESS_OBJECTIVE_SAMPLES", "200"))
+MAX_CELLS = 4_000_000   # Resampled returns held at once (32 MB)
+PERCENTILES = (5, 25, 50, 75, 95)
+HISTOGRAM_BINS = 20
+
+# Optimizer objective -> the result key it maximizes
+OBJECTIVES = {"sharpe": "sharpe_ratio", "robust_sharpe": "robust_sharpe", "skill": "prob_skill"}
+
+
+def default_block_bars(n_bars: int) -> int:
+    # n^(1/3), the usual rate for block bootstrap of a mean
+    return max(1, int(round(n_bars ** (1 / 3))))
+
+def block_indices(rng, n_samples: int, n_bars: int, block_bars: int) -> np.ndarray:
+    """
+    (n_samples, n_bars) indices into a series of n_bars: runs of block_bars
+    consecutive bars from random starts, wrapping past the end.
+    """
+    n_blocks = -(-n_bars // block_bars)
+    starts = rng.integers(0, n_bars, size=(n_samples, n_blocks, 1))
+    return ((starts + np.arange(block_bars)) % n_bars).reshape(n_samples, -1)[:, :n_bars]
+
+def shift_indices(offsets: np.ndarray, n_bars: int) -> np.ndarray:
+    # Row k reads the series shifted right by offsets[k], wrapping around
+    return (np.arange(n_bars) - offsets[:, None]) % n_bars
+
+def path_metrics(returns: np.ndarray) -> dict:
+    """
+    Sharpe, max drawdown (%) and terminal equity of every row of a (k, n)
+    return matrix with no NaN, as the backtest kernel computes them.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = returns.mean(axis=1) / returns.std(axis=1, ddof=1) * math.sqrt(kernel.PERIODS_PER_YEAR)
+        equity = np.cumprod(1 + returns, axis=1)
+        peak = np.maximum(np.maximum.accumulate(equity, axis=1), 1.0)
+        max_drawdown = (1 - equity / peak).max(axis=1)
+    return {"sharpe": sharpe, "max_drawdown_pct": max_drawdown * 100, "terminal_equity": equity[:, -1]}
+
+def distribution(values: np.ndarray) -> dict:
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return None
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+    return {
+        "mean": _round(values.mean()),
+        "std": _round(values.std()),
+        **{f"p{q}": _round(v) for q, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+        "histogram": {"edges": [_round(e) for e in edges], "counts": counts.tolist()},
+    }
+
+
+def bootstrap(returns: np.ndarray, indices: np.ndarray) -> dict:
+    """
+    path_metrics for returns (n,) resampled along each row of indices.
+    """
+    rows = max(1, MAX_CELLS // max(1, indices.shape[1]))
+    parts = [path_metrics(returns[indices[lo:lo + rows]]) for lo in range(0, len(indices), rows)]
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+def random_entry_sharpe(signals: np.ndarray, close: np.ndarray, cost: float, offsets: np.ndarray) -> np.ndarray:
+    """
+    Sharpe of the signal series (n,) shifted by each offset against close.
+    """
+    n = len(signals)
+    rows = max(1, MAX_CELLS // max(1, n))
+    sharpe = []
+    for lo in range(0, len(offsets), rows):
+        returns = kernel.strategy_returns(signals[shift_indices(offsets[lo:lo + rows], n)], close, cost)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.nanmean(returns, axis=1)
+            std = np.nanstd(returns, axis=1, ddof=1)
+            sharpe.append(mean / std * math.sqrt(kernel.PERIODS_PER_YEAR))
+    return np.concatenate(sharpe)
+
+def analyze(signals, close, costs: dict = None, n_samples: int = ROBUSTNESS_SAMPLES, block_bars: int = None,
+            seed: int = 0) -> dict:
+    """
+    Bootstrap and random-entry analysis of one signal series (as run_backtest
+    trades it) on close. prob_skill: share of random-entry resamples with a
+    lower Sharpe than the real one. robust_sharpe: 5th percentile of the
+    bootstrapped Sharpe.
+    """
+    signals = np.nan_to_num(np.asarray(signals, dtype=np.float64), nan=0.0)
+    close = np.asarray(close, dtype=np.float64)
+    cost = kernel.cost_rate(costs)
+    returns = kernel.strategy_returns(signals, close, cost)[0]
+    returns = returns[~np.isnan(returns)]
+    if len(returns) < 3:
+        raise ValueError("Need at least 3 bars of returns")
+    n_samples = max(1, int(n_samples))
+    block_bars = max(1, min(int(block_bars or default_block_bars(len(returns))), len(returns)))
+    rng = np.random.default_rng(seed)
+
+    actual = path_metrics(returns[None, :])
+    resampled = bootstrap(returns, block_indices(rng, n_samples, len(returns), block_bars))
+    null_sharpe = random_entry_sharpe(signals, close, cost, rng.integers(1, len(signals), size=n_samples))
+    sharpe = float(actual["sharpe"][0])
+    finite = resampled["sharpe"][np.isfinite(resampled["sharpe"])]
+    return {
+        "n_bars": len(returns),
+        "n_samples": n_samples,
+        "block_bars": block_bars,
+        "seed": seed,
+        "sharpe_ratio": _round(sharpe),
+        "max_drawdown_pct": _round(actual["max_drawdown_pct"][0]),
+        "terminal_equity": _round(actual["terminal_equity"][0]),
+        "bootstrap": {
+            "sharpe": distribution(resampled["sharpe"]),
+            "max_drawdown_pct": distribution(resampled["max_drawdown_pct"]),
+            "terminal_equity": distribution(resampled["terminal_equity"]),
+            "prob_sharpe_positive": _round(np.mean(finite > 0)) if len(finite) else None,
+            "prob_loss": _round(np.mean(resampled["terminal_equity"] < 1)),
+        },
+        "random_entry": {"sharpe": distribution(null_sharpe)},
+        "prob_skill": _round(_skill(sharpe, null_sharpe)),
+        "robust_sharpe": _round(np.percentile(finite, 5)) if len(finite) else None,
+    }
+
+def objective_scores(signals: np.ndarray, close: np.ndarray, objective: str, costs: dict = None,
+                     n_samples: int = OBJECTIVE_SAMPLES, seed: int = 0) -> np.ndarray:
+    """
+    One score per row of a (n_params, n_bars) signal matrix, for the optimizer:
+    "robust_sharpe" or "skill" (see analyze). Every row sees the same
+    resamples. NaN where the score is undefined (e.g. never in the market).
+    """
+    if objective not in ("robust_sharpe", "skill"):
+        raise ValueError(f"Unknown objective '{objective}'. Choose from {list(OBJECTIVES)}")
+    signals = np.nan_to_num(np.atleast_2d(np.asarray(signals, dtype=np.float64)), nan=0.0)
+    close = np.asarray(close, dtype=np.float64)
+    cost = kernel.cost_rate(costs)
+    returns = kernel.strategy_returns(signals, close, cost)
+    valid = ~np.isnan(returns).any(axis=0)  # Same bars for every row: they share close
+    rng = np.random.default_rng(seed)
+
+    scores = np.full(len(signals), np.nan)
+    if valid.sum() < 3:
+        return scores
+    if objective == "robust_sharpe":
+        indices = block_indices(rng, n_samples, int(valid.sum()), default_block_bars(int(valid.sum())))
+        for k, row in enumerate(returns[:, valid]):
+            sharpe = bootstrap(row, indices)["sharpe"]
+            sharpe = sharpe[np.isfinite(sharpe)]
+            scores[k] = np.percentile(sharpe, 5) if len(sharpe) else np.nan
+    else:
+        offsets = rng.integers(1, signals.shape[1], size=n_samples)
+        actual = path_metrics(returns[:, valid])["sharpe"]
+        for k in range(len(signals)):
+            scores[k] = _skill(actual[k], random_entry_sharpe(signals[k], close, cost, offsets))
+    return scores
+
+def _skill(sharpe: float, null_sharpe: np.ndarray) -> float:
+    null_sharpe = null_sharpe[np.isfinite(null_sharpe)]
+    if not np.isfinite(sharpe) or not len(null_sharpe):
+        return math.nan
+    return float(np.mean(null_sharpe < sharpe))
+
+def _round(value, digits: int = 4):
+    value = float(value)
+    return round(value, digits) if math.isfinite(value) else None
@@ -0,0 +1,558 @@
+import json
+import multiprocessing as mp
+import os
+import queue
+import signal
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+# Sandboxed strategy execution.
+# Generated strategy code doesn't run in the API process: a small pool of
+# worker processes is forked at startup, each imports pandas/numpy and the
+# engine once, then serves runs over a pipe. A run costs one round-trip plus
+# publishing the OHLCV to shared memory, instead of an interpreter start.
+# Every run is limited:
+#   cpu   RLIMIT_CPU soft limit at (CPU used so far + SANDBOX_CPU_S): SIGXCPU ends the run
+#   wall  SIGALRM in the worker at SANDBOX_WALL_S; the parent SIGKILLs it if that doesn't land
+#   rss   RLIMIT_AS at (current size + SANDBOX_RSS_MB): allocations past it raise MemoryError
+# A worker is replaced when it crashes or is killed, after SANDBOX_MAX_RUNS
+# runs, or once its resident memory stays above SANDBOX_RSS_MB. Replacements
+# are spawned, not forked: by then the API process runs threads, and a fork
+# would copy locks they hold. Heavy imports
+# stay inside functions: starting the pool doesn't load pandas into the API.
+#
+# Wire format (one frame per message, both directions):
+#   uint8 op | uint32 header length | header JSON | raw arrays
+# header["arrays"] lists [name, numpy dtype str, count] in payload order, so
+# the equity curve and trade columns travel as bytes instead of JSON floats.
+# Strategy source is sent once per worker and referred to by hash after that.
+#
+# Besides backtests, the workers answer every other question that needs the
+# strategy's code to run: its constructor parameters (inspect_strategy,
+# cached per source in the API) and batched signal matrices for the optimizer
+# (signal_matrix). The API process never compiles strategy code itself.
+
+SANDBOX_ENABLED = os.getenv("SANDBOX_ENABLED", "1") == "1"
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1))))
+SANDBOX_MAX_RUNS = int(os.getenv("SANDBOX_MAX_RUNS", "200"))
+SANDBOX_CPU_S = float(os.getenv("SANDBOX_CPU_S", "30"))
+SANDBOX_WALL_S = float(os.getenv("SANDBOX_WALL_S", "60"))
+SANDBOX_RSS_MB = float(os.getenv("SANDBOX_RSS_MB", "2048"))
+BOOT_TIMEOUT = 60.0     # Imports on a cold worker
+KILL_GRACE = 2.0        # Past the wall limit before the parent kills the worker
+CODE_SLOTS = 64         # Strategy sources a worker keeps (by hash)
+
+OP_READY, OP_RUN, OP_RESULT, OP_STOP = 1, 2, 3, 4
+_FRAME = struct.Struct("<BI")
+
+
+# --- Wire format ---
+
+def encode(op: int, header: dict, arrays: dict = None) -> bytes:
+    blobs = []
+    if arrays:
+        import numpy as np
+        layout = []
+        for name, values in arrays.items():
+            values = np.ascontiguousarray(values)
+            layout.append([name, values.dtype.str, values.size])
+            blobs.append(values.tobytes())
+        header = {**header, "arrays": layout}
+    head = json.dumps(header, separators=(",", ":"), default=_json_default).encode("utf-8")
+    return b"".join([_FRAME.pack(op, len(head)), head, *blobs])
+
+def decode(frame: bytes):
+    """
+    Returns (op, header, {name: array}). Arrays are read-only views of frame.
+    """
+    op, head_len = _FRAME.unpack_from(frame)
+    offset = _FRAME.size + head_len
+    header = json.loads(frame[_FRAME.size:offset])
+    arrays = {}
+    if header.get("arrays"):
+        import numpy as np
+        for name, dtype, count in header.pop("arrays"):
+            dtype = np.dtype(dtype)
+            arrays[name] = np.frombuffer(frame, dtype=dtype, count=count, offset=offset)
+            offset += dtype.itemsize * count
+    return op, header, arrays
+
+def _json_default(value):
+    if hasattr(value, "item"):
+        return value.item()  # numpy scalars
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def split_result(result: dict):
+    """
+    execute_strategy result -> (JSON part, arrays): equity_curve and the trade
+    columns go out as arrays.
+    """
+    import numpy as np
+    plain, arrays = dict(result), {}
+    if "equity_curve" in plain:
+        curve = plain.pop("equity_curve")
+        if isinstance(curve, list):
+            arrays["equity_curve"] = np.fromiter(curve, dtype=np.float64, count=len(curve))
+        else:
+            arrays["equity_curve"] = np.asarray(curve, dtype=np.float64)
+    if "signals" in plain:
+        arrays["signals"] = np.ascontiguousarray(plain.pop("signals"), dtype=np.int8).ravel()
+    trades = plain.pop("trades", None)
+    if trades is not None:
+        for name, values in trades.items():
+            values = np.asarray(values)
+            arrays["trades/" + name] = values.astype("datetime64[ns]") if name == "timestamp" else values
+    return plain, arrays
+
+def join_result(plain: dict, arrays: dict) -> dict:
+    result = dict(plain)
+    if "equity_curve" in arrays:
+        result["equity_curve"] = arrays["equity_curve"].tolist()
+    if "signals" in arrays:
+        result["signals"] = arrays["signals"]
+    trades = {name.split("/", 1)[1]: values for name, values in arrays.items() if name.startswith("trades/")}
+    if trades:
+        import pandas as pd
+        trades["timestamp"] = pd.DatetimeIndex(trades["timestamp"])
+        result["trades"] = trades
+    return result
+
+
+# --- Worker side ---
+
+class ResourceLimit(BaseException):
+    # BaseException so a strategy's "except Exception" can't swallow it
+    pass
+
+def _on_xcpu(signum, frame):
+    raise ResourceLimit("CPU")
+
+class _Limits:
+    """
+    Per-run CPU and address-space limits inside a worker. Soft limits only:
+    the hard limits stay where they were, so they can be lifted after the run.
+    """
+    def __init__(self, cpu_s: float, rss_mb: float):
+        self.cpu_s = cpu_s
+        self.rss_mb = rss_mb
+        self.saved = {}
+
+    def __enter__(self):
+        try:
+            import resource
+        except ImportError:
+            return self  # No rlimits (Windows): the parent's wall clock still applies
+        if self.cpu_s:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            self._set(resource, resource.RLIMIT_CPU, int(usage.ru_utime + usage.ru_stime + self.cpu_s) + 1)
+        if self.rss_mb and _vm_bytes():
+            self._set(resource, resource.RLIMIT_AS, _vm_bytes() + int(self.rss_mb * 1024 * 1024))
+        return self
+
+    def _set(self, resource, which, soft):
+        current_soft, hard = resource.getrlimit(which)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(which, (soft, hard))
+        self.saved[which] = (current_soft, hard)
+
+    def __exit__(self, *exc):
+        if self.saved:
+            import resource
+            for which, limits in self.saved.items():
+                resource.setrlimit(which, limits)
+
+def _vm_bytes() -> int:
+    # Address space in use (the quantity RLIMIT_AS caps); 0 where /proc is missing
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+def _worker_main(conn, cpu_s: float, wall_s: float, rss_mb: float):
+    # The API's handlers came along with the fork; Ctrl-C is the parent's business
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_xcpu)
+
+    # 1. Warm up once: this is what a fresh interpreter per run would pay every time
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    import arena
+    import execution_engine
+    from strategies import backtest_kernel
+    backtest_kernel.warm()
+    conn.send_bytes(encode(OP_READY, {"pid": os.getpid()}))
+
+    # 2. Serve runs until told to stop (or the parent goes away)
+    codes = OrderedDict()
+    while True:
+        try:
+            op, header, _ = decode(conn.recv_bytes())
+        except (EOFError, OSError):
+            return
+        if op == OP_STOP:
+            return
+        plain, arrays = _serve(header, codes, arena, execution_engine, cpu_s, wall_s, rss_mb)
+        try:
+            conn.send_bytes(encode(OP_RESULT, plain, arrays))
+        except (EOFError, OSError):
+            return
+
+def _serve(header, codes, arena, execution_engine, cpu_s, wall_s, rss_mb):
+    from telemetry import collect_trace, profile_call
+
+    # Strategy source: sent once, then referred to by hash
+    code_hash = header["code_hash"]
+    if "code" in header:
+        codes[code_hash] = header["code"]
+        while len(codes) > CODE_SLOTS:
+            codes.popitem(last=False)
+    code = codes.get(code_hash)
+    if code is None:
+        return {"id": header["id"], "need_code": True}, None
+    codes.move_to_end(code_hash)
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    use_alarm = hasattr(signal, "setitimer") and wall_s
+    shm, df, profile, spans = None, None, None, []
+    try:
+        if header.get("data"):
+            shm, df = arena.attach_frame(header["data"])  # Mapped before the address-space limit is set
+        with collect_trace() as spans, _Limits(cpu_s, rss_mb):
+            if use_alarm:
+                signal.signal(signal.SIGALRM, arena._on_alarm)
+                signal.setitimer(signal.ITIMER_REAL, wall_s)
+            if header.get("stream"):
+                from market_data import iter_ohlcv
+                s = header["stream"]
+                chunks = iter_ohlcv(s["ticker"], s["period"], s["interval"], s["chunk_rows"])
+                result = execution_engine.execute_strategy_stream(code, chunks, header.get("params"),
+                                                                  s["equity_points"], header.get("costs"))
+            elif header.get("inspect"):
+                result = execution_engine.strategy_info(code)
+            elif header.get("grid") is not None:
+                try:
+                    result = {"signals": execution_engine.signal_matrix(code, df, header["grid"]).astype("int8")}
+                except Exception as e:
+                    result = {"error": str(e)}
+            elif header.get("robustness") is not None:
+                result = execution_engine.execute_robustness(code, df, header.get("params"), header.get("costs"),
+                                                             **header["robustness"])
+            elif header.get("profile"):
+                result, profile = profile_call(execution_engine.execute_strategy, code, df, header.get("params"),
+                                               costs=header.get("costs"))
+            else:
+                result = execution_engine.execute_strategy(code, df, header.get("params"),
+                                                           with_trades=header.get("with_trades", False),
+                                                           costs=header.get("costs"))
+    except arena.StrategyTimeout:
+        result = {"error": f"Timed out after {wall_s}s"}
+    except ResourceLimit:
+        result = {"error": f"CPU limit exceeded ({cpu_s}s)"}
+    except MemoryError:
+        result = {"error": f"Memory limit exceeded ({rss_mb} MB)"}
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        df = None
+        if shm is not None:
+            try:
+                shm.close()
+            except BufferError:
+                pass  # A stray view is still alive; the OS reclaims it when the worker exits
+
+    plain, arrays = split_result(result)
+    return {
+        "id": header["id"],
+        "result": plain,
+        "profile": profile,
+        "spans": spans,
+        "usage": {
+            "elapsed_s": round(time.perf_counter() - started, 4),
+            "cpu_s": round(time.process_time() - cpu_started, 4),
+            "rss_mb": round(_rss_mb(), 1),
+        },
+    }, arrays
+
+
+# --- Parent side ---
+
+class _Worker:
+    def __init__(self, ctx, cpu_s, wall_s, rss_mb, target=None):
+        # target: the worker's main loop, called as target(conn, cpu_s, wall_s, rss_mb)
+        self.conn, child_conn = ctx.Pipe(duplex=True)
+        self.process = ctx.Process(target=target or _worker_main, args=(child_conn, cpu_s, wall_s, rss_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.runs = 0
+        self.codes = OrderedDict()  # Hashes this worker already has the source for
+
+    def wait_ready(self):
+        if not self.ready:
+            if not self.conn.poll(BOOT_TIMEOUT):
+                raise RuntimeError("Sandbox worker didn't start")
+            decode(self.conn.recv_bytes())
+            self.ready = True
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send_bytes(encode(OP_STOP, {}))
+        except (EOFError, OSError):
+            pass
+        self.process.join(1)
+        self.kill()
+
+
+class SandboxPool:
+    """
+    Pre-forked workers running strategy code under per-run limits.
+    run() blocks until a worker is free and its run finishes; call it from a
+    thread, not the event loop.
+    """
+    def __init__(self, size: int = SANDBOX_WORKERS, max_runs: int = SANDBOX_MAX_RUNS, cpu_s: float = SANDBOX_CPU_S,
+                 wall_s: float = SANDBOX_WALL_S, rss_mb: float = SANDBOX_RSS_MB):
+        self.size = max(1, size)
+        self.max_runs = max_runs
+        self.cpu_s = cpu_s
+        self.wall_s = wall_s
+        self.rss_mb = rss_mb
+        self._ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+        self._respawn_ctx = mp.get_context("spawn")  # Replacements start after the API's threads do
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._ids = 0
+        self.runs = 0
+        self.recycled = 0
+        self.crashed = 0
+        self.timed_out = 0
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            # Workers must share our resource tracker: one they started themselves
+            # would unlink every shared block they attached when they die
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running()
+            for _ in range(self.size):
+                self._idle.put(self._spawn(self._ctx))
+
+    def _spawn(self, ctx=None) -> _Worker:
+        return _Worker(ctx or self._respawn_ctx, self.cpu_s, self.wall_s, self.rss_mb)
+
+    def run(self, header: dict, code: str) -> tuple:
+        """
+        Sends one OP_RUN (header without the source) and returns the worker's
+        (result header, arrays). A worker that dies or overruns is replaced and
+        the run comes back as {"result": {"error": ...}}.
+        """
+        import hashlib
+        self.start()
+        try:
+            worker = self._idle.get(timeout=self.wall_s + KILL_GRACE)
+        except queue.Empty:
+            return {"result": {"error": "Sandbox is busy, try again"}}, {}
+
+        keep, recycle = False, False
+        try:
+            worker.wait_ready()
+            with self._lock:
+                self._ids += 1
+                run_id = self._ids
+            code_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
+            message = {**header, "id": run_id, "code_hash": code_hash}
+            if code_hash not in worker.codes:
+                message["code"] = code
+            reply = self._exchange(worker, message)
+            if reply[0].get("need_code"):  # The worker dropped it from its slots
+                reply = self._exchange(worker, {**message, "code": code})
+            worker.codes[code_hash] = True
+            worker.codes.move_to_end(code_hash)
+            while len(worker.codes) > CODE_SLOTS:
+                worker.codes.popitem(last=False)
+
+            worker.runs += 1
+            self.runs += 1
+            keep = worker.runs < self.max_runs and reply[0].get("usage", {}).get("rss_mb", 0) < self.rss_mb
+            recycle = not keep
+            return reply
+        except TimeoutError:
+            self.timed_out += 1
+            return {"result": {"error": f"Timed out after {self.wall_s}s"}}, {}
+        except (EOFError, OSError, RuntimeError) as e:
+            self.crashed += 1
+            worker.process.join(0.5)
+            code = worker.process.exitcode
+            reason = f"signal {-code}" if code is not None and code < 0 else f"exit code {code}" if code is not None else e
+            return {"result": {"error": f"Sandbox worker died ({reason})"}}, {}
+        finally:
+            if keep:
+                self._idle.put(worker)
+            else:
+                if recycle:
+                    self.recycled += 1
+                    worker.stop()
+                else:
+                    worker.kill()
+                self._idle.put(self._spawn())
+
+    def _exchange(self, worker: _Worker, message: dict):
+        worker.conn.send_bytes(encode(OP_RUN, message))
+        if not worker.conn.poll(self.wall_s + KILL_GRACE):
+            worker.kill()  # Stuck somewhere SIGALRM can't reach (C code, blocked signals)
+            raise TimeoutError()
+        op, header, arrays = decode(worker.conn.recv_bytes())
+        return header, arrays
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.size,
+            "idle": self._idle.qsize(),
+            "runs": self.runs,
+            "recycled": self.recycled,
+            "crashed": self.crashed,
+            "timed_out": self.timed_out,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+sandbox_pool = SandboxPool()
+
+
+# --- execute_strategy, sandboxed ---
+# Same signatures and result shapes as execution_engine's, so callers can swap them.
+
+def execute_strategy(strategy_code: str, df, params: dict = None, with_trades: bool = False,
+                     costs: dict = None) -> dict:
+    return _run_frame(strategy_code, df, params, with_trades=with_trades, costs=costs)[0]
+
+def profile_strategy(strategy_code: str, df, params: dict = None, costs: dict = None) -> tuple:
+    """
+    (result, profile) as telemetry.profile_call, profiled inside the worker.
+    """
+    return _run_frame(strategy_code, df, params, profile=True, costs=costs)
+
+def execute_robustness(strategy_code: str, df, params: dict = None, costs: dict = None, **options) -> dict:
+    return _run_frame(strategy_code, df, params, costs=costs, robustness=options)[0]
+
+_infos = OrderedDict()  # code hash -> strategy_info, for sources that compiled
+_infos_lock = threading.Lock()
+
+def inspect_strategy(strategy_code: str) -> dict:
+    """
+    execution_engine.strategy_info, worked out in a worker once per source.
+    Ranges come back as (low, high) tuples. Raises ValueError when the code
+    doesn't load. Blocking: call it off the event loop.
+    """
+    import hashlib
+    code_hash = hashlib.sha256(strategy_code.encode("utf-8")).hexdigest()
+    with _infos_lock:
+        info = _infos.get(code_hash)
+        if info is not None:
+            _infos.move_to_end(code_hash)
+            return info
+
+    if SANDBOX_ENABLED:
+        reply, _ = sandbox_pool.run({"inspect": True}, strategy_code)
+        info = _absorb(reply, {})
+    else:
+        from execution_engine import strategy_info
+        info = strategy_info(strategy_code)
+    if "error" in info:
+        raise ValueError(info["error"])
+    info["ranges"] = {name: tuple(bounds) for name, bounds in info["ranges"].items()}
+
+    with _infos_lock:
+        _infos[code_hash] = info
+        while len(_infos) > CODE_SLOTS:
+            _infos.popitem(last=False)
+    return info
+
+def signal_matrix(strategy_code: str, df, param_grid: list, fingerprint: str = None):
+    """
+    execution_engine.signal_matrix in one worker, as int8 (len(param_grid), len(df)).
+    For strategies with a batched grid kernel (one pass for the whole grid);
+    arena.run_signal_matrix spreads the others over the arena pool. Raises
+    RuntimeError on strategy errors and limits.
+    """
+    if not SANDBOX_ENABLED:
+        from execution_engine import signal_matrix as run_matrix
+        return run_matrix(strategy_code, df, param_grid).astype("int8")
+    result = _run_frame(strategy_code, df, grid=param_grid, fingerprint=fingerprint)[0]
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result["signals"].reshape(len(param_grid), len(df))
+
+def execute_strategy_stream(strategy_code: str, ticker: str, period: str, interval: str, chunk_rows: int,
+                            params: dict = None, equity_points: int = 1000, costs: dict = None) -> dict:
+    """
+    Chunked backtest read by the worker itself straight off the market data
+    store (see market_data.iter_ohlcv), so nothing large crosses the pipe.
+    """
+    if not SANDBOX_ENABLED:
+        from market_data import iter_ohlcv
+        from execution_engine import execute_strategy_stream as run_stream
+        return run_stream(strategy_code, iter_ohlcv(ticker, period, interval, chunk_rows), params, equity_points, costs)
+    stream = {"ticker": ticker, "period": period, "interval": interval, "chunk_rows": chunk_rows,
+              "equity_points": equity_points}
+    reply, arrays = sandbox_pool.run({"stream": stream, "params": params, "costs": costs}, strategy_code)
+    return _absorb(reply, arrays)
+
+def _run_frame(strategy_code: str, df, params: dict = None, with_trades: bool = False, profile: bool = False,
+               costs: dict = None, robustness: dict = None, grid: list = None, fingerprint: str = None):
+    if not SANDBOX_ENABLED:
+        import execution_engine
+        from telemetry import profile_call
+        if robustness is not None:
+            return execution_engine.execute_robustness(strategy_code, df, params, costs, **robustness), None
+        if profile:
+            return profile_call(execution_engine.execute_strategy, strategy_code, df, params, costs=costs)
+        return execution_engine.execute_strategy(strategy_code, df, params, with_trades=with_trades, costs=costs), None
+
+    from arena import SharedOHLCV
+    from telemetry import span
+    with span("sandbox.publish"):
+        shared = SharedOHLCV(df, fingerprint)
+    try:
+        reply, arrays = sandbox_pool.run({"data": shared.handle(), "params": params, "with_trades": with_trades,
+                                          "profile": profile, "costs": costs, "robustness": robustness,
+                                          "grid": grid}, strategy_code)
+        return _absorb(reply, arrays), reply.get("profile")
+    finally:
+        shared.release()
+
+def _absorb(reply: dict, arrays: dict) -> dict:
+    from telemetry import merge_spans
+    merge_spans(reply.get("spans"))
+    return join_result(reply.get("result", {}), arrays)
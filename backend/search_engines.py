@@ -0,0 +1,229 @@
+import itertools
+import math
+
+import numpy as np
+
+# Search engines for the optimizer.
+# All engines share an ask/tell interface over an integer box:
+#     space = {"short_window": (5, 100), "long_window": (5, 100), ...}
+#     batch = engine.ask(8)               -> list of param dicts
+#     engine.tell(params, score)          -> higher score is better
+# Failed evaluations should be told with score=-inf.
+# ask() returns a whole generation so the caller can evaluate it in parallel.
+
+
+class SearchEngine:
+    name = "base"
+
+    def __init__(self, space: dict, seed: int = None):
+        self.space = space
+        self.names = list(space)
+        self.low = np.array([space[n][0] for n in self.names], dtype=float)
+        self.high = np.array([space[n][1] for n in self.names], dtype=float)
+        self.rng = np.random.default_rng(seed)
+        self.history = []  # [(params, score)]
+
+    @property
+    def exhausted(self) -> bool:
+        return False
+
+    def ask(self, n: int) -> list:
+        raise NotImplementedError("Search engine must implement ask")
+
+    def tell(self, params: dict, score: float):
+        self.history.append((params, score))
+
+    # Helpers: unit cube <-> integer params
+    def _to_params(self, unit: np.ndarray) -> dict:
+        values = self.low + np.clip(unit, 0, 1) * (self.high - self.low)
+        return {n: int(round(v)) for n, v in zip(self.names, values)}
+
+    def _to_unit(self, params: dict) -> np.ndarray:
+        values = np.array([params[n] for n in self.names], dtype=float)
+        span = np.where(self.high > self.low, self.high - self.low, 1.0)
+        return (values - self.low) / span
+
+
+class RandomSearch(SearchEngine):
+    name = "random"
+
+    def ask(self, n):
+        return [self._to_params(self.rng.random(len(self.names))) for _ in range(n)]
+
+
+class GridSearch(SearchEngine):
+    """
+    Evenly spaced levels per parameter, walked in order until exhausted.
+    """
+    name = "grid"
+
+    def __init__(self, space, seed=None, points_per_dim: int = 5):
+        super().__init__(space, seed)
+        axes = []
+        for n in self.names:
+            low, high = space[n]
+            levels = np.unique(np.round(np.linspace(low, high, points_per_dim)).astype(int))
+            axes.append(levels.tolist())
+        self._grid = itertools.product(*axes)
+        self._exhausted = False
+
+    @property
+    def exhausted(self):
+        return self._exhausted
+
+    def ask(self, n):
+        batch = []
+        for values in itertools.islice(self._grid, n):
+            batch.append(dict(zip(self.names, values)))
+        if len(batch) < n:
+            self._exhausted = True
+        return batch
+
+
+class CMAESSearch(SearchEngine):
+    """
+    Compact CMA-ES (rank-one + rank-mu covariance updates) in the unit cube.
+    ask(n) samples one generation; the distribution updates once every
+    sample in that generation has been told.
+    """
+    name = "cmaes"
+
+    def __init__(self, space, seed=None, sigma: float = 0.3):
+        super().__init__(space, seed)
+        d = len(self.names)
+        self.dim = d
+        self.mean = np.full(d, 0.5)
+        self.sigma = sigma
+        self.C = np.eye(d)
+        self.p_sigma = np.zeros(d)
+        self.p_c = np.zeros(d)
+        self.chi_n = math.sqrt(d) * (1 - 1 / (4 * d) + 1 / (21 * d * d))
+        self._generation = []  # [(unit_x, params)]
+        self._scores = []      # [(unit_x, score)]
+
+    def _weights(self, lam):
+        mu = max(1, lam // 2)
+        w = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+        w = w / w.sum()
+        return mu, w, 1.0 / np.sum(w ** 2)
+
+    def ask(self, n):
+        eigvals, B = np.linalg.eigh(self.C)
+        D = np.sqrt(np.maximum(eigvals, 1e-20))
+        self._generation = []
+        self._scores = []
+        batch = []
+        for _ in range(n):
+            z = self.rng.standard_normal(self.dim)
+            x = np.clip(self.mean + self.sigma * (B @ (D * z)), 0, 1)
+            params = self._to_params(x)
+            self._generation.append((x, params))
+            batch.append(params)
+        return batch
+
+    def tell(self, params, score):
+        super().tell(params, score)
+        for i, (x, p) in enumerate(self._generation):
+            if p == params:
+                self._scores.append((x, score))
+                self._generation.pop(i)
+                break
+        if not self._generation and len(self._scores) >= 2:
+            self._update()
+
+    def _update(self):
+        lam = len(self._scores)
+        mu, w, mu_eff = self._weights(lam)
+        d = self.dim
+
+        # Strategy parameters (Hansen's defaults)
+        c_sigma = (mu_eff + 2) / (d + mu_eff + 5)
+        d_sigma = 1 + 2 * max(0, math.sqrt((mu_eff - 1) / (d + 1)) - 1) + c_sigma
+        c_c = (4 + mu_eff / d) / (d + 4 + 2 * mu_eff / d)
+        c_1 = 2 / ((d + 1.3) ** 2 + mu_eff)
+        c_mu = min(1 - c_1, 2 * (mu_eff - 2 + 1 / mu_eff) / ((d + 2) ** 2 + mu_eff))
+
+        ranked = sorted(self._scores, key=lambda s: s[1], reverse=True)
+        xs = np.array([x for x, _ in ranked[:mu]])
+        old_mean = self.mean
+        self.mean = w @ xs
+        y = (self.mean - old_mean) / self.sigma
+
+        eigvals, B = np.linalg.eigh(self.C)
+        inv_sqrt = B @ np.diag(1 / np.sqrt(np.maximum(eigvals, 1e-20))) @ B.T
+        self.p_sigma = (1 - c_sigma) * self.p_sigma + math.sqrt(c_sigma * (2 - c_sigma) * mu_eff) * (inv_sqrt @ y)
+        h_sigma = float(np.linalg.norm(self.p_sigma) / self.chi_n < 1.4 + 2 / (d + 1))
+        self.p_c = (1 - c_c) * self.p_c + h_sigma * math.sqrt(c_c * (2 - c_c) * mu_eff) * y
+
+        steps = (xs - old_mean) / self.sigma
+        rank_mu = (steps.T * w) @ steps
+        self.C = (1 - c_1 - c_mu) * self.C + c_1 * np.outer(self.p_c, self.p_c) + c_mu * rank_mu
+        self.C = (self.C + self.C.T) / 2
+
+        self.sigma *= math.exp((c_sigma / d_sigma) * (np.linalg.norm(self.p_sigma) / self.chi_n - 1))
+        self.sigma = float(np.clip(self.sigma, 1e-3, 1.0))
+        self._scores = []
+
+
+class TPESearch(SearchEngine):
+    """
+    Tree-structured Parzen Estimator style Bayesian sampler.
+    After a random warm-up, splits the history into good/bad by the gamma
+    quantile, fits a Parzen (Gaussian KDE) density to each group and
+    proposes the candidates that maximise l(x) / g(x).
+    """
+    name = "tpe"
+
+    def __init__(self, space, seed=None, n_startup: int = 10, gamma: float = 0.25, n_candidates: int = 24):
+        super().__init__(space, seed)
+        self.n_startup = n_startup
+        self.gamma = gamma
+        self.n_candidates = n_candidates
+
+    def ask(self, n):
+        scored = [(p, s) for p, s in self.history if s is not None and np.isfinite(s)]
+        if len(scored) < self.n_startup:
+            return [self._to_params(self.rng.random(len(self.names))) for _ in range(n)]
+
+        ranked = sorted(scored, key=lambda ps: ps[1], reverse=True)
+        n_good = max(1, int(math.ceil(self.gamma * len(ranked))))
+        good = np.array([self._to_unit(p) for p, _ in ranked[:n_good]])
+        bad = np.array([self._to_unit(p) for p, _ in ranked[n_good:]]) if len(ranked) > n_good else self.rng.random((1, len(self.names)))
+
+        batch = []
+        for _ in range(n):
+            # Sample from l(x): pick a good point and jitter it by the bandwidth
+            bw_good = self._bandwidth(good)
+            centers = good[self.rng.integers(0, len(good), self.n_candidates)]
+            candidates = np.clip(centers + self.rng.standard_normal(centers.shape) * bw_good, 0, 1)
+            ratio = self._log_density(candidates, good, bw_good) - self._log_density(candidates, bad, self._bandwidth(bad))
+            batch.append(self._to_params(candidates[int(np.argmax(ratio))]))
+        return batch
+
+    @staticmethod
+    def _bandwidth(points):
+        # Scott's rule per dimension with a floor so a tight cluster still explores
+        n = max(len(points), 1)
+        std = points.std(axis=0) if len(points) > 1 else np.full(points.shape[1], 0.2)
+        return np.maximum(std * n ** (-1 / (points.shape[1] + 4)), 0.05)
+
+    @staticmethod
+    def _log_density(x, points, bw):
+        # Mean of product Gaussians, computed for all candidates at once
+        diff = (x[:, None, :] - points[None, :, :]) / bw
+        log_k = -0.5 * np.sum(diff ** 2, axis=2) - np.sum(np.log(bw))
+        m = log_k.max(axis=1, keepdims=True)
+        return (m + np.log(np.exp(log_k - m).mean(axis=1, keepdims=True))).ravel()
+
+
+ENGINES = {
+    RandomSearch.name: RandomSearch,
+    GridSearch.name: GridSearch,
+    CMAESSearch.name: CMAESSearch,
+    TPESearch.name: TPESearch,
+}
+
+def make_engine(name: str, space: dict, seed: int = None) -> SearchEngine:
+    if name not in ENGINES:
+        raise ValueError(f"Unknown search engine '{name}'. Choose from {sorted(ENGINES)}")
+    return ENGINES[name](space, seed=seed)
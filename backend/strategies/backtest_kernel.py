@@ -0,0 +1,326 @@
+import math
+import os
+
+import numpy as np
+
+# Single-pass backtest kernel.
+# One walk over the signal and close arrays gives everything run_backtest,
+# the streaming backtest and the optimizer need, without intermediate columns:
+#   position  = previous bar's signal (NaN: no position, no return)
+#   return    = position * (close / prev_close - 1) - cost * |position change|
+#   equity    = running product of (1 + return), skipping NaN returns
+#   metrics   = Sharpe, Sortino, max drawdown, Calmar, turnover, win rate,
+#               exposure, cost drag
+# cost is (fee + slippage) in bps per unit of position traded: going long
+# from flat pays it once, flipping from long to short pays it twice. It is
+# charged on the first bar the new position is held. A trade is a run of
+# bars holding the same non-zero position; it wins when its compounded
+# return, net of its entry and exit cost, is positive.
+# Everything the metrics need is carried in a small state row per signal
+# vector, so a run can be fed in chunks (the streaming backtest) or as a
+# (n_params, n_bars) batch (optimizer, walk-forward) and give the same
+# numbers as one call on the whole series.
+# With numba installed the loop is compiled (BACKTEST_JIT=0 turns that off);
+# otherwise the same kernel runs as whole-array NumPy. Both agree to the last
+# few bits (different summation order).
+
+FEE_BPS = float(os.getenv("BACKTEST_FEE_BPS", "0"))
+SLIPPAGE_BPS = float(os.getenv("BACKTEST_SLIPPAGE_BPS", "0"))
+PERIODS_PER_YEAR = 252   # Same annualization as the Sharpe ratio has always used
+
+try:
+    if os.getenv("BACKTEST_JIT", "1") != "1":
+        raise ImportError
+    import numba
+except ImportError:
+    numba = None
+
+KERNEL = "numba" if numba is not None else "numpy"
+
+# State row layout
+(SIGNAL, CLOSE, HELD, EQUITY, LAST_EQUITY, PEAK, MAX_DD, COUNT, MEAN, M2,
+ DOWN_SQ, TURNOVER, COSTS, EXPOSED, TRADES, WINS, TRADE_GROWTH, BARS) = range(18)
+N_FIELDS = 18
+
+
+def cost_rate(costs: dict = None) -> float:
+    """
+    Cost per unit of position traded, as a fraction. costs may override
+    {"fee_bps", "slippage_bps"}; missing keys use BACKTEST_FEE_BPS / BACKTEST_SLIPPAGE_BPS.
+    """
+    costs = costs or {}
+    fee = costs.get("fee_bps")
+    slippage = costs.get("slippage_bps")
+    return ((FEE_BPS if fee is None else float(fee)) + (SLIPPAGE_BPS if slippage is None else float(slippage))) / 1e4
+
+def cost_key(costs: dict = None) -> str:
+    # For cache keys: two runs with the same effective costs share results
+    return f"cost={cost_rate(costs):.10g}"
+
+
+def new_state(k: int = 1) -> np.ndarray:
+    """
+    (k, N_FIELDS) state for k signal vectors that haven't seen a bar yet.
+    """
+    state = np.zeros((k, N_FIELDS), dtype=np.float64)
+    state[:, [SIGNAL, CLOSE, LAST_EQUITY]] = np.nan
+    state[:, [EQUITY, PEAK, TRADE_GROWTH]] = 1.0
+    return state
+
+def update(state: np.ndarray, signals: np.ndarray, close: np.ndarray, cost: float = 0.0,
+           equity: bool = False):
+    """
+    Advances state over the next bars: signals (k, n), close (n,).
+    Returns the (k, n) equity curve (NaN where the return was NaN) when
+    equity=True, else None.
+    """
+    signals = np.ascontiguousarray(signals, dtype=np.float64)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    k, n = signals.shape
+    if n == 0:
+        return np.empty((k, 0)) if equity else None
+    if numba is not None:
+        out = np.empty((k, n) if equity else (0, 0))
+        _update_jit(state, signals, close, cost, out)
+        return out if equity else None
+    return _update_numpy(state, signals, close, cost, equity)
+
+def summarize(state: np.ndarray, cost: float = 0.0) -> dict:
+    """
+    Unrounded metric arrays, one value per state row. An open trade at the
+    end counts as closed there.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        count = state[:, COUNT]
+        std = np.where(count > 1, np.sqrt(state[:, M2] / (count - 1)), np.nan)
+        mean = np.where(count > 0, state[:, MEAN], np.nan)
+        downside = np.sqrt(state[:, DOWN_SQ] / count)
+        annual = math.sqrt(PERIODS_PER_YEAR)
+        cagr = np.where(state[:, EQUITY] > 0, state[:, EQUITY] ** (PERIODS_PER_YEAR / count), 0.0) - 1
+
+        open_trade = state[:, HELD] != 0
+        open_win = open_trade & (_trade_net(state[:, TRADE_GROWTH], state[:, HELD], cost) > 0)
+        trades = state[:, TRADES] + open_trade
+        return {
+            "sharpe_ratio": mean / std * annual,
+            "total_return_pct": (state[:, LAST_EQUITY] - 1) * 100,
+            "sortino_ratio": mean / downside * annual,
+            "max_drawdown_pct": state[:, MAX_DD] * 100,
+            "calmar_ratio": cagr / state[:, MAX_DD],
+            "annual_return_pct": cagr * 100,
+            "turnover": state[:, TURNOVER] / state[:, BARS] * PERIODS_PER_YEAR,
+            "trade_count": trades,  # "trades" is the trade list (with_trades)
+            "win_rate_pct": (state[:, WINS] + open_win) / trades * 100,
+            "exposure_pct": state[:, EXPOSED] / count * 100,
+            "costs_pct": state[:, COSTS] * 100,
+        }
+
+def report(state: np.ndarray, cost: float = 0.0, row: int = 0) -> dict:
+    """
+    summarize() for one row, rounded for a result dict.
+    """
+    return rounded({name: values[0] for name, values in summarize(state[row:row + 1], cost).items()})
+
+def rounded(metrics: dict) -> dict:
+    """
+    One row of summarize() for a result dict. Metrics are None when undefined
+    (never in the market, no drawdown, no trades...), since JSON has no NaN.
+    """
+    result = {}
+    for name, value in metrics.items():
+        value = float(value)
+        if name == "trade_count":
+            result[name] = int(value)
+        else:
+            result[name] = round(value, 4 if name == "turnover" else 2) if math.isfinite(value) else None
+    return result
+
+def backtest_batch(signals: np.ndarray, close: np.ndarray, costs: dict = None) -> dict:
+    """
+    summarize() for every row of a (n_params, n_bars) signal matrix, each a
+    fresh backtest on close.
+    """
+    signals = np.atleast_2d(np.asarray(signals, dtype=np.float64))
+    cost = cost_rate(costs)
+    state = new_state(len(signals))
+    update(state, signals, close, cost)
+    return summarize(state, cost)
+
+def strategy_returns(signals: np.ndarray, close: np.ndarray, cost: float = 0.0) -> np.ndarray:
+    """
+    Per-bar strategy returns of a fresh backtest, (k, n) for signals (k, n):
+    what update() compounds, with NaN where there is no return (the first bar).
+    """
+    signals = np.atleast_2d(np.asarray(signals, dtype=np.float64))
+    close = np.asarray(close, dtype=np.float64)
+    position = np.full(signals.shape, np.nan)
+    position[:, 1:] = signals[:, :-1]
+    held = np.where(np.isnan(position), 0.0, position)
+    change = np.abs(np.diff(held, axis=1, prepend=0.0))
+    market_return = np.full(close.shape, np.nan)
+    market_return[1:] = close[1:] / close[:-1] - 1
+    with np.errstate(invalid="ignore"):
+        return position * market_return - cost * change
+
+def warm():
+    # Compiles the kernel ahead of the first real run (numba caches it on disk)
+    state = new_state(1)
+    update(state, np.zeros((1, 3)), np.ones(3), 0.0, equity=True)
+
+
+def _trade_net(growth, held, cost):
+    return growth - 1 - 2 * cost * np.abs(held)
+
+
+# --- Compiled loop ---
+
+def _update_loop(state, signals, close, cost, equity_out):
+    k, n = signals.shape
+    keep_equity = equity_out.shape[0] > 0
+    for row in range(k):
+        s = state[row]
+        last_signal, last_close, held_prev = s[SIGNAL], s[CLOSE], s[HELD]
+        equity, last_equity, peak, max_dd = s[EQUITY], s[LAST_EQUITY], s[PEAK], s[MAX_DD]
+        count, mean, m2, down_sq = s[COUNT], s[MEAN], s[M2], s[DOWN_SQ]
+        turnover, costs, exposed = s[TURNOVER], s[COSTS], s[EXPOSED]
+        trades, wins, trade_growth = s[TRADES], s[WINS], s[TRADE_GROWTH]
+
+        for i in range(n):
+            position = last_signal
+            held = 0.0 if position != position else position
+            change = abs(held - held_prev)
+            gross = position * (close[i] / last_close - 1.0)
+            r = gross - cost * change
+            if held != held_prev:
+                if held_prev != 0:
+                    trades += 1
+                    if trade_growth - 1 - 2 * cost * abs(held_prev) > 0:
+                        wins += 1
+                trade_growth = 1.0
+            turnover += change
+
+            if r == r:
+                costs += cost * change
+                equity *= 1.0 + r
+                last_equity = equity
+                if equity > peak:
+                    peak = equity
+                drawdown = 1.0 - equity / peak
+                if drawdown > max_dd:
+                    max_dd = drawdown
+                count += 1
+                delta = r - mean
+                mean += delta / count
+                m2 += delta * (r - mean)
+                if r < 0:
+                    down_sq += r * r
+                if held != 0:
+                    exposed += 1
+                    trade_growth *= 1.0 + gross
+            else:
+                last_equity = np.nan
+            if keep_equity:
+                equity_out[row, i] = last_equity
+            last_signal, last_close, held_prev = signals[row, i], close[i], held
+
+        s[SIGNAL], s[CLOSE], s[HELD] = last_signal, last_close, held_prev
+        s[EQUITY], s[LAST_EQUITY], s[PEAK], s[MAX_DD] = equity, last_equity, peak, max_dd
+        s[COUNT], s[MEAN], s[M2], s[DOWN_SQ] = count, mean, m2, down_sq
+        s[TURNOVER], s[COSTS], s[EXPOSED] = turnover, costs, exposed
+        s[TRADES], s[WINS], s[TRADE_GROWTH] = trades, wins, trade_growth
+        s[BARS] += n
+
+_update_jit = numba.njit(cache=True, nogil=True)(_update_loop) if numba is not None else None
+
+
+# --- NumPy fallback ---
+
+def _update_numpy(state, signals, close, cost, equity):
+    k, n = signals.shape
+    position = np.empty((k, n))
+    position[:, 0] = state[:, SIGNAL]
+    position[:, 1:] = signals[:, :-1]
+    prev_close = np.empty(n)  # Every row runs on the same close
+    prev_close[0] = state[0, CLOSE]
+    prev_close[1:] = close[:-1]
+    held = np.where(np.isnan(position), 0.0, position)
+    prev_held = np.empty((k, n))
+    prev_held[:, 0] = state[:, HELD]
+    prev_held[:, 1:] = held[:, :-1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.abs(held - prev_held)
+        gross = position * (close / prev_close - 1)[None, :]
+        r = gross - cost * change
+        valid = ~np.isnan(r)
+
+        # Equity, seeded with the carried value so the product runs in the loop's order
+        factors = np.empty((k, n + 1))
+        factors[:, 0] = state[:, EQUITY]
+        factors[:, 1:] = np.where(valid, 1 + r, 1.0)
+        growth = np.cumprod(factors, axis=1)
+        peak = growth.copy()
+        peak[:, 0] = state[:, PEAK]
+        peak = np.maximum.accumulate(peak, axis=1, out=peak)[:, 1:]
+        growth = growth[:, 1:]
+        state[:, MAX_DD] = np.maximum(state[:, MAX_DD], (1 - growth / peak).max(axis=1))
+        state[:, PEAK] = peak[:, -1]
+        state[:, EQUITY] = growth[:, -1]
+        equity_path = np.where(valid, growth, np.nan)
+        state[:, LAST_EQUITY] = equity_path[:, -1]
+
+        # Mean and squared deviations, merged with the carried ones (Chan et al.)
+        count = valid.sum(axis=1)
+        filled = np.where(valid, r, 0.0)
+        mean = np.where(count > 0, filled.sum(axis=1) / count, 0.0)
+        m2 = (np.where(valid, r - mean[:, None], 0.0) ** 2).sum(axis=1)
+        total = state[:, COUNT] + count
+        delta = mean - state[:, MEAN]
+        merged = total > 0
+        state[:, MEAN] += np.where(merged, delta * count / total, 0.0)
+        state[:, M2] += m2 + np.where(merged, delta ** 2 * state[:, COUNT] * count / total, 0.0)
+        state[:, COUNT] = total
+
+        state[:, DOWN_SQ] += (np.minimum(filled, 0.0) ** 2).sum(axis=1)
+        state[:, TURNOVER] += change.sum(axis=1)
+        if cost:
+            state[:, COSTS] += cost * np.where(valid, change, 0.0).sum(axis=1)
+        state[:, EXPOSED] += (valid & (held != 0)).sum(axis=1)
+        _trades_numpy(state, held, np.where(valid & (held != 0), 1 + gross, 1.0), cost)
+
+    state[:, SIGNAL] = signals[:, -1]
+    state[:, CLOSE] = close[-1]
+    state[:, HELD] = held[:, -1]
+    state[:, BARS] += n
+    return equity_path if equity else None
+
+def _trades_numpy(state, held, factors, cost):
+    # Runs of equal position, flattened row by row: each run's compounded
+    # growth is one multiply.reduceat, so no per-bar Python loop
+    k, n = held.shape
+    starts = np.empty((k, n), dtype=bool)
+    starts[:, 0] = True
+    starts[:, 1:] = held[:, 1:] != held[:, :-1]
+    first = np.flatnonzero(starts)
+    growth = np.multiply.reduceat(factors.ravel(), first)
+    rows = first // n
+    values = held.ravel()[first]
+
+    # A run at the start of the chunk either continues the carried trade or closes it
+    carried = state[:, HELD]
+    continues = held[:, 0] == carried
+    at_start = first % n == 0
+    growth[at_start] *= np.where(continues, state[:, TRADE_GROWTH], 1.0)
+    closed_carried = (carried != 0) & ~continues
+    state[:, TRADES] += closed_carried
+    state[:, WINS] += closed_carried & (_trade_net(state[:, TRADE_GROWTH], carried, cost) > 0)
+
+    # Every run but the last of its row is closed within the chunk
+    last = np.empty(len(first), dtype=bool)
+    last[:-1] = rows[1:] != rows[:-1]
+    last[-1] = True
+    closed = ~last & (values != 0)
+    state[:, TRADES] += np.bincount(rows[closed], minlength=k)
+    won = closed & (_trade_net(growth, values, cost) > 0)
+    state[:, WINS] += np.bincount(rows[won], minlength=k)
+    state[:, TRADE_GROWTH] = np.where(values[last] != 0, growth[last], 1.0)
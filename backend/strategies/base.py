@@ -1,4 +1,9 @@
+import time
+import numpy as np
 import pandas as pd
+from telemetry import span, record_span
+from strategies.indicator_cache import bind
+from strategies import backtest_kernel as kernel
 
 class BaseStrategy:
     def __init__(self):
@@ -11,16 +16,62 @@ class BaseStrategy:
         """
         raise NotImplementedError("Strategy must implement generate_signal")
 
-    def run_backtest(self, df: pd.DataFrame):
+    def generate_signals(self, df: pd.DataFrame) -> pd.Series:
         """
-        Standard Vectorized Backtest.
-        Calculates daily returns based on the signal.
+        OPTIONAL fast path: return the signal for EVERY bar in one vectorized pass.
+        Row i must only use data up to and including row i (same contract as
+        generate_signal on df.iloc[:i+1]). run_backtest still applies shift(1),
+        so there is no lookahead.
+        """
+        raise NotImplementedError("Strategy does not implement generate_signals")
+
+    def has_vectorized_signals(self) -> bool:
+        # True when the child class overrides generate_signals
+        return type(self).generate_signals is not BaseStrategy.generate_signals
+
+    def init_state(self) -> dict:
+        """
+        Per-run scratch space for on_bar (streaming indicators, counters...).
+        Called once at the start of every backtest.
+        """
+        return {}
+
+    def on_bar(self, bar, state: dict) -> int:
+        """
+        OPTIONAL incremental path: called once per bar, in order, with the
+        current row (bar.Close, bar.High, bar.Index...) and the dict from
+        init_state. Return 1 (Buy), -1 (Sell), or 0 (Hold).
+        Use the O(1) indicators in strategies/indicators.py instead of
+        re-slicing history, so a run is linear in the number of bars.
+        """
+        raise NotImplementedError("Strategy does not implement on_bar")
+
+    def has_incremental_signals(self) -> bool:
+        # True when the child class overrides on_bar
+        return type(self).on_bar is not BaseStrategy.on_bar
+
+    def generate_signals_incremental(self, df: pd.DataFrame, state: dict = None, start: int = 0) -> pd.Series:
+        """
+        Linear path: feeds bars one at a time to on_bar.
+        state['bar_index'] holds the position of the current bar. Pass the
+        previous chunk's state and bar count to continue a run chunk by chunk.
+        """
+        state = self.init_state() if state is None else state
+        signals = []
+        for i, bar in enumerate(df.itertuples(name="Bar"), start):
+            state['bar_index'] = i
+            try:
+                sig = self.on_bar(bar, state)
+            except Exception:
+                sig = 0
+            signals.append(sig)
+        return pd.Series(signals, index=df.index)
+
+    def generate_signals_per_bar(self, df: pd.DataFrame) -> pd.Series:
+        """
+        Slow reference path: calls generate_signal on an expanding slice.
+        Safer for complex logic, but O(n^2) in the number of bars.
         """
-        # 1. Generate Signals
-        # We apply the signal logic to every row (rolling window style)
-        # Note: For speed in this Lite version, we apply it row-by-row or vectorized if possible.
-        # This simple loop is safer for complex logic but slower.
-        
         signals = []
         for i in range(len(df)):
             # Pass the dataframe up to the current point to prevent lookahead bias
@@ -30,26 +81,190 @@ class BaseStrategy:
             except Exception:
                 sig = 0
             signals.append(sig)
+        return pd.Series(signals, index=df.index)
+
+    def compute_signals(self, df: pd.DataFrame) -> pd.Series:
+        """
+        Fastest available path: whole-series > incremental on_bar >
+        generate_signal on an expanding slice.
+        """
+        if self.has_vectorized_signals():
+            signals = self.generate_signals(df)
+            return pd.Series(signals, index=df.index).fillna(0)
+        elif self.has_incremental_signals():
+            return self.generate_signals_incremental(df)
+        return self.generate_signals_per_bar(df)
+
+    def generate_signals_grid(self, df: pd.DataFrame, param_grid: list) -> np.ndarray:
+        """
+        OPTIONAL batched path for parameter sweeps: return a (len(param_grid), len(df))
+        matrix where row k equals generate_signals(df) for AlphaStrategy(**param_grid[k]).
+        Window-style strategies can build every row from shared cumulative sums.
+        """
+        raise NotImplementedError("Strategy does not implement generate_signals_grid")
+
+    def has_grid_signals(self) -> bool:
+        # True when the child class overrides generate_signals_grid
+        return type(self).generate_signals_grid is not BaseStrategy.generate_signals_grid
+
+    def lookback_bars(self):
+        """
+        OPTIONAL: how many bars of history one row of generate_signals depends
+        on (longest window plus warm-up). generate_signals on those bars plus
+        any later ones must give the later bars the same signals as the full
+        history does. Lets run_backtest_stream use the vectorized path.
+        """
+        return None
+
+    def run_backtest(self, df: pd.DataFrame, costs: dict = None):
+        """
+        Standard Vectorized Backtest.
+        Calculates daily returns based on the signal, net of trading costs
+        (see strategies/backtest_kernel.py), in a single pass.
+        """
+        # 1. Generate Signals
+        with span("backtest.signals"):
+            signals = self.compute_signals(df)
+        metrics_started = time.perf_counter()
             
         df['Signal'] = signals
         
-        # 2. Shift Signal by 1 day (we trade at Open of NEXT day based on Close of TODAY)
-        df['Position'] = df['Signal'].shift(1)
-        
-        # 3. Calculate Strategy Returns
-        # Market Return = (Close / PrevClose) - 1
-        df['Market_Return'] = df['Close'].pct_change()
-        df['Strategy_Return'] = df['Position'] * df['Market_Return']
-        
-        # 4. Cumulative Returns
-        df['Equity_Curve'] = (1 + df['Strategy_Return']).cumprod()
-        
-        # 5. Calculate Metrics
-        total_return = df['Equity_Curve'].iloc[-1] - 1
-        sharpe_ratio = df['Strategy_Return'].mean() / df['Strategy_Return'].std() * (252**0.5)
+        # 2. Position = yesterday's signal (we trade at Open of NEXT day based on
+        # Close of TODAY), returns, equity and metrics: one kernel pass
+        cost = kernel.cost_rate(costs)
+        state = kernel.new_state()
+        equity_curve = kernel.update(state, df['Signal'].to_numpy(dtype=np.float64)[None, :],
+                                     df['Close'].to_numpy(dtype=np.float64), cost, equity=True)[0]
         
+        results = kernel.report(state, cost)
+        results["equity_curve"] = np.where(np.isnan(equity_curve), 1.0, equity_curve).tolist()  # For the chart
+        record_span("backtest.metrics", time.perf_counter() - metrics_started)
+        return results
+
+    def run_backtest_stream(self, chunks, equity_points: int = 1000, costs: dict = None):
+        """
+        run_backtest over consecutive OHLCV chunks (e.g. OHLCVStore.iter_chunks),
+        in memory bounded by the chunk size instead of the history length.
+        Signals come from generate_signals with lookback_bars() of overlap
+        between chunks, or from on_bar with its state carried over.
+        Same metrics as run_backtest; equity_curve is
+        thinned to at most equity_points bars, listed in equity_bars.
+        """
+        lookback = self.lookback_bars() if self.has_vectorized_signals() else None
+        if lookback is None and not self.has_incremental_signals():
+            raise ValueError("Streaming needs on_bar(), or generate_signals() with lookback_bars()")
+
+        metrics = StreamingMetrics(equity_points, costs)
+        state, tail = None, None
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            with span("backtest.signals"):
+                if lookback is not None:
+                    # Re-feed the end of the previous chunk so windows see full history
+                    frame = chunk if tail is None else pd.concat([tail, chunk])
+                    bind(frame, cache=False)  # One-off frame: don't fill the shared indicator cache
+                    signals = self.compute_signals(frame).to_numpy(dtype=np.float64)[len(frame) - len(chunk):]
+                    tail = frame.iloc[max(0, len(frame) - lookback):].copy() if lookback else None
+                else:
+                    state = self.init_state() if state is None else state
+                    signals = self.generate_signals_incremental(chunk, state, metrics.n_bars).to_numpy(dtype=np.float64)
+            metrics_started = time.perf_counter()
+            metrics.update(signals, chunk['Close'].to_numpy(dtype=np.float64))
+            record_span("backtest.metrics", time.perf_counter() - metrics_started)
+        return metrics.result()
+
+
+class StreamingMetrics:
+    """
+    run_backtest step 2, one chunk at a time. The kernel state carries
+    everything across chunks (last signal and close, equity, drawdown,
+    return moments, the open trade), so the metrics equal one pass over the
+    whole series.
+    The equity curve keeps every stride-th bar; the stride doubles whenever
+    more than equity_points would be kept.
+    """
+    def __init__(self, equity_points: int = 1000, costs: dict = None):
+        self.equity_points = max(2, equity_points)
+        self.n_bars = 0
+        self.cost = kernel.cost_rate(costs)
+        self.state = kernel.new_state()
+        self.stride = 1
+        self.curve_bars = np.empty(0, dtype=np.int64)
+        self.curve_values = np.empty(0)
+        self.last_curve_value = 1.0
+
+    def update(self, signals: np.ndarray, close: np.ndarray):
+        n = len(close)
+        if n == 0:
+            return
+        equity = kernel.update(self.state, np.asarray(signals, dtype=np.float64)[None, :], close, self.cost, equity=True)[0]
+        self._keep_curve(np.where(np.isnan(equity), 1.0, equity))  # fillna(1), as the chart does
+        self.n_bars += n
+
+    def _keep_curve(self, values: np.ndarray):
+        first, n = self.n_bars, len(values)
+        while len(self.curve_bars) + _multiples(first, n, self.stride) > self.equity_points:
+            self.stride *= 2
+            keep = self.curve_bars % self.stride == 0
+            self.curve_bars, self.curve_values = self.curve_bars[keep], self.curve_values[keep]
+        offset = -first % self.stride
+        self.curve_bars = np.concatenate([self.curve_bars, np.arange(first + offset, first + n, self.stride)])
+        self.curve_values = np.concatenate([self.curve_values, values[offset::self.stride]])
+        self.last_curve_value = values[-1]
+
+    def result(self) -> dict:
+        if self.n_bars == 0:
+            raise ValueError("No bars to backtest")
+        bars, values = self.curve_bars.tolist(), self.curve_values.tolist()
+        if bars[-1] != self.n_bars - 1:
+            bars.append(self.n_bars - 1)
+            values.append(float(self.last_curve_value))
         return {
-            "sharpe_ratio": round(sharpe_ratio, 2),
-            "total_return_pct": round(total_return * 100, 2),
-            "equity_curve": df['Equity_Curve'].fillna(1).tolist() # For the chart
-        }
\ No newline at end of file
+            **kernel.report(self.state, self.cost),
+            "equity_curve": values,
+            "equity_bars": bars,
+            "n_bars": self.n_bars,
+        }
+
+def _multiples(first: int, n: int, stride: int) -> int:
+    # How many of first .. first + n - 1 are multiples of stride
+    return (first + n - 1) // stride - (first - 1) // stride
+
+
+def batch_metrics(signals: np.ndarray, close: np.ndarray, costs: dict = None) -> dict:
+    """
+    run_backtest step 2 for a whole (n_params, n_bars) signal matrix at once.
+    Returns unrounded arrays, one value per row: {"sharpe_ratio", "total_return_pct",
+    "max_drawdown_pct", ...} (see backtest_kernel.summarize).
+    """
+    return kernel.backtest_batch(signals, np.asarray(close, dtype=np.float64), costs)
+
+
+def trades_from_signals(signals, close, index) -> dict:
+    """
+    Trade events implied by a signal series: one per bar where the target
+    position changes, filled at that bar's Close (run_backtest holds the new
+    position from the next bar on). Positions start flat; NaN counts as flat.
+    Returns column arrays: bar_index, timestamp, action, price, position_before,
+    position_after, quantity.
+    """
+    position = np.nan_to_num(np.asarray(signals, dtype=np.float64), nan=0.0)
+    before = np.empty_like(position)
+    before[:1] = 0.0
+    before[1:] = position[:-1]
+    bars = np.flatnonzero(position != before)
+
+    timestamps = pd.DatetimeIndex(index[bars]) if len(bars) else pd.DatetimeIndex([])
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_convert("UTC").tz_localize(None)
+    after = position[bars]
+    return {
+        "bar_index": bars,
+        "timestamp": timestamps,
+        "action": np.where(after > before[bars], "BUY", "SELL"),
+        "price": np.asarray(close, dtype=np.float64)[bars],
+        "position_before": before[bars],
+        "position_after": after,
+        "quantity": np.abs(after - before[bars]),
+    }
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from strategies.indicators import RollingMean
 
 class AlphaStrategy(BaseStrategy):
     def __init__(self, short_window: int = 13, long_window: int = 33):
@@ -23,4 +24,23 @@ class AlphaStrategy(BaseStrategy):
         elif short_mavg < long_mavg:
             return -1 # SELL (Bearish Trend)
         else:
-            return 0
\ No newline at end of file
+            return 0
+
+    def init_state(self) -> dict:
+        return {
+            "short_mavg": RollingMean(self.short_window),
+            "long_mavg": RollingMean(self.long_window),
+        }
+
+    def on_bar(self, bar, state: dict) -> int:
+        # Incremental version of generate_signal (O(1) per bar)
+        short_mavg = state["short_mavg"].update(bar.Close)
+        long_mavg = state["long_mavg"].update(bar.Close)
+        if state["bar_index"] < self.long_window - 1:
+            return 0
+
+        if short_mavg > long_mavg:
+            return 1
+        elif short_mavg < long_mavg:
+            return -1
+        return 0
\ No newline at end of file
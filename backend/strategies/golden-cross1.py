@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from strategies.indicator_cache import indicators
 
 class AlphaStrategy(BaseStrategy):
     def __init__(self, short_window: int = 10, long_window: int = 30):
@@ -23,4 +24,41 @@ class AlphaStrategy(BaseStrategy):
         elif short_mavg < long_mavg:
             return -1 # SELL (Bearish Trend)
         else:
-            return 0
\ No newline at end of file
+            return 0
+
+    def generate_signals(self, df: pd.DataFrame) -> pd.Series:
+        # Vectorized version of generate_signal (one pass over the whole series).
+        # min_periods=1 mirrors tail(n).mean() when fewer than n bars exist.
+        # The averages come from the shared cache, so other strategies and
+        # parameter sets with the same windows reuse them.
+        ind = indicators(df)
+        short_mavg = ind.sma('Close', self.short_window, 1)
+        long_mavg = ind.sma('Close', self.long_window, 1)
+
+        signals = np.where(short_mavg > long_mavg, 1, np.where(short_mavg < long_mavg, -1, 0))
+        signals = pd.Series(signals, index=df.index)
+
+        # Same warm-up rule: no signal until we have 'long_window' bars
+        signals.iloc[:self.long_window - 1] = 0
+        return signals
+
+    def lookback_bars(self) -> int:
+        # Both windows plus the warm-up fit in the last 'long_window' bars
+        return max(self.short_window, self.long_window)
+
+    def generate_signals_grid(self, df: pd.DataFrame, param_grid: list) -> np.ndarray:
+        # Every (short_window, long_window) pair at once. Each distinct window's
+        # average is computed once per data set (shared cache), not per pair
+        # or per generation.
+        ind = indicators(df)
+        positions = np.arange(len(df))
+
+        shorts = [p.get('short_window', self.short_window) for p in param_grid]
+        longs = [p.get('long_window', self.long_window) for p in param_grid]
+        short_mavg = np.array([ind.sma('Close', w, 1) for w in shorts])
+        long_mavg = np.array([ind.sma('Close', w, 1) for w in longs])
+
+        signals = np.sign(short_mavg - long_mavg)
+        # Same warm-up rule: no signal until we have 'long_window' bars
+        signals[positions[None, :] < np.array(longs)[:, None] - 1] = 0
+        return signals
\ No newline at end of file
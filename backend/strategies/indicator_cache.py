@@ -0,0 +1,308 @@
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Shared indicator cache.
+# Strategies ask for indicators by name and parameters instead of rebuilding
+# them from df['Close']:
+#     ind = indicators(df)
+#     ind.sma("Close", 20), ind.rsi("Close", 14)
+#     ind.ema(("macd", "Close", 12, 26), 9)      # an indicator of an indicator
+# Every result is a read-only float64 array over the whole frame, memoized in
+# one LRU per process on (data key, name, params). The data key is the
+# fingerprint a runner bound to the frame (bind(); the arena and optimizer
+# bind the job's data hash), else a hash of the source column. So within a
+# battle or an optimization run each indicator is computed once per process,
+# however many strategies or candidates ask for it.
+# Indicators are built from other indicators through the same cache (rsi
+# reads the rolling means of gains and losses, which read diff), so derived
+# series reuse their inputs; the cache records those edges (dependencies()).
+# Frames are treated as immutable once an indicator has been read from them.
+
+MAX_BYTES = int(float(os.getenv("INDICATOR_CACHE_MB", "256")) * 1024 * 1024)
+
+REGISTRY = {}
+
+
+def register(name: str):
+    """
+    Decorator: fn(ind, source, *params) -> array of len(frame). source is a
+    column name or an indicator spec tuple; resolve it with ind.values(source).
+    """
+    def wrap(fn):
+        REGISTRY[name] = fn
+        return fn
+    return wrap
+
+
+class IndicatorCache:
+    """
+    Thread-safe LRU of indicator arrays, capped by total bytes.
+    """
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> read-only array
+        self._inputs = {}               # key -> keys it was computed from
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            values = self._entries.get(key)
+            if values is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return values
+
+    def put(self, key, values: np.ndarray, inputs=()):
+        if values.nbytes > self.max_bytes:
+            return  # Would evict everything else; the caller keeps its copy
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = values
+            self._inputs[key] = tuple(inputs)
+            self.nbytes += values.nbytes
+            while self.nbytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _evict(self, key):
+        self.nbytes -= self._entries.pop(key).nbytes
+        self._inputs.pop(key, None)
+
+    def dependencies(self, key) -> tuple:
+        """
+        Keys of the cached indicators this one was computed from.
+        """
+        with self._lock:
+            return self._inputs.get(key, ())
+
+    def drop(self, token: str):
+        """
+        Removes every indicator of the frames bound to token (a job releasing its data).
+        """
+        with self._lock:
+            for key in [k for k in self._entries if isinstance(k[0], tuple) and k[0][0] == token]:
+                self._evict(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "derived": sum(1 for inputs in self._inputs.values() if inputs),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._inputs.clear()
+            self.nbytes = 0
+
+indicator_cache = IndicatorCache()
+
+
+class FrameIndicators:
+    """
+    Indicator view of one frame. Use indicators(df) rather than building one,
+    so repeated lookups on the same frame share the column hashes.
+    """
+    def __init__(self, df: pd.DataFrame, token: str = None, cache: IndicatorCache = indicator_cache):
+        self._df = weakref.ref(df)
+        self.n = len(df)
+        self.token = token
+        self.cache = cache if cache is not None else _LocalCache()
+        self._hashes = {}       # column -> (buffer address, digest)
+        self._computing = []    # Stack of keys being computed, to record their inputs
+
+    def values(self, source) -> np.ndarray:
+        """
+        A column (name) or an indicator (spec tuple: (name, source, *params)).
+        """
+        if isinstance(source, tuple):
+            return self.get(*source)
+        df = self._df()
+        if df is None:
+            raise RuntimeError("The frame behind this indicator view is gone")
+        return df[source].to_numpy(dtype=np.float64)
+
+    def get(self, name: str, source="Close", *params) -> np.ndarray:
+        fn = REGISTRY.get(name)
+        if fn is None:
+            raise KeyError(f"Unknown indicator '{name}'. Available: {sorted(REGISTRY)}")
+        spec = _spec(name, source, params)
+        key = (self._data_key(spec[1]), self.n, spec)
+        if self._computing:
+            self._computing[-1][1].append(key)
+
+        values = self.cache.get(key)
+        if values is None:
+            self._computing.append((key, []))
+            try:
+                values = np.asarray(fn(self, spec[1], *spec[2:]), dtype=np.float64).reshape(self.n)
+            finally:
+                _, inputs = self._computing.pop()
+            values.flags.writeable = False
+            self.cache.put(key, values, inputs)
+        return values
+
+    def __getattr__(self, name):
+        # ind.sma("Close", 20) == ind.get("sma", "Close", 20)
+        if name.startswith("_") or name not in REGISTRY:
+            raise AttributeError(name)
+        return lambda source="Close", *params: self.get(name, source, *params)
+
+    def _data_key(self, source):
+        # The column an indicator (ultimately) reads, identified by the bound
+        # token or by a hash of its values
+        while isinstance(source, tuple):
+            source = source[1]
+        if self.token is not None:
+            return (self.token, source)
+        column = np.ascontiguousarray(self.values(source))
+        address = column.__array_interface__["data"][0]
+        cached = self._hashes.get(source)
+        if cached is None or cached[0] != address:
+            cached = (address, hashlib.sha1(column.data).hexdigest())  # Identity, not security: the fastest here
+            self._hashes[source] = cached
+        return cached[1]
+
+
+class _LocalCache:
+    # Per-view memo for frames bound with cache=False
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def put(self, key, values, inputs=()):
+        self._entries[key] = values
+
+
+_views = {}   # id(df) -> FrameIndicators, dropped when the frame is collected
+_views_lock = threading.Lock()
+
+def indicators(df: pd.DataFrame) -> FrameIndicators:
+    """
+    The indicator view of df (one per frame object).
+    """
+    with _views_lock:
+        view = _views.get(id(df))
+        if view is None or view._df() is not df:
+            view = _views[id(df)] = FrameIndicators(df)
+            weakref.finalize(df, _views.pop, id(df), None)
+        return view
+
+def bind(df: pd.DataFrame, token: str = None, cache: bool = True) -> FrameIndicators:
+    """
+    Runners call this with a fingerprint they already hold (the result-cache
+    data hash, a shared memory name) so lookups skip hashing the column.
+    cache=False keeps the frame's indicators to itself, e.g. for the
+    throwaway chunks of a streaming backtest.
+    """
+    with _views_lock:
+        view = _views[id(df)] = FrameIndicators(df, token, indicator_cache if cache else None)
+        weakref.finalize(df, _views.pop, id(df), None)
+        return view
+
+
+def _spec(name, source, params) -> tuple:
+    # Hashable and canonical: numpy scalars -> Python, 20.0 -> 20
+    def norm(value):
+        if isinstance(value, tuple):
+            return tuple(norm(v) for v in value)
+        if isinstance(value, (list, np.ndarray)):
+            return tuple(norm(v) for v in value)
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+    return (name, norm(source), *(norm(p) for p in params))
+
+def _rolling(ind, source, window, min_periods=None):
+    return pd.Series(ind.values(source)).rolling(int(window), min_periods=min_periods)
+
+
+# --- Built-in indicators ---
+# Same pandas operations the bundled strategies used inline, so cached and
+# inline results are identical to the last bit.
+
+@register("diff")
+def _diff(ind, source, periods=1):
+    return pd.Series(ind.values(source)).diff(periods).to_numpy()
+
+@register("gains")
+def _gains(ind, source):
+    delta = pd.Series(ind.values(("diff", source)))
+    return delta.where(delta > 0, 0).to_numpy()
+
+@register("losses")
+def _losses(ind, source):
+    delta = pd.Series(ind.values(("diff", source)))
+    return (-delta.where(delta < 0, 0)).to_numpy()
+
+@register("sma")
+def _sma(ind, source, window, min_periods=None):
+    return _rolling(ind, source, window, min_periods).mean().to_numpy()
+
+@register("rolling_sum")
+def _rolling_sum(ind, source, window, min_periods=None):
+    return _rolling(ind, source, window, min_periods).sum().to_numpy()
+
+@register("rolling_std")
+def _rolling_std(ind, source, window, ddof=1):
+    return _rolling(ind, source, window).std(ddof=ddof).to_numpy()
+
+@register("rolling_max")
+def _rolling_max(ind, source, window):
+    return _rolling(ind, source, window).max().to_numpy()
+
+@register("rolling_min")
+def _rolling_min(ind, source, window):
+    return _rolling(ind, source, window).min().to_numpy()
+
+@register("ema")
+def _ema(ind, source, span):
+    return pd.Series(ind.values(source)).ewm(span=span, adjust=False).mean().to_numpy()
+
+@register("zscore")
+def _zscore(ind, source, window):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (ind.values(source) - ind.sma(source, window)) / ind.rolling_std(source, window)
+
+@register("rsi")
+def _rsi(ind, source, period=14):
+    # Cutler's RSI (simple means of gains/losses over 'period' deltas)
+    gain = ind.sma(("gains", source), period)
+    loss = ind.sma(("losses", source), period)
+    # Count down-moves instead of testing loss == 0, so rolling float
+    # residue can't turn an all-gain window into a tiny non-zero loss
+    no_loss = ind.rolling_sum(("down_moves", source), period) == 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - (100 / (1 + gain / loss))
+    return np.where(no_loss, 100.0, rsi)
+
+@register("down_moves")
+def _down_moves(ind, source):
+    return (ind.values(("losses", source)) > 0).astype(np.float64)
+
+@register("macd")
+def _macd(ind, source, fast=12, slow=26):
+    return ind.ema(source, fast) - ind.ema(source, slow)
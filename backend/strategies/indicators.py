@@ -0,0 +1,219 @@
+import math
+
+# Streaming (incremental) indicators for the on_bar strategy path.
+# Every update() is O(1) and every indicator keeps a fixed-size ring buffer,
+# so memory per strategy instance is bounded no matter how many bars we feed.
+
+
+class RingBuffer:
+    """
+    Fixed-size window of the last N floats.
+    """
+    def __init__(self, size: int):
+        if size < 1:
+            raise ValueError("RingBuffer size must be >= 1")
+        self.size = size
+        self.values = [0.0] * size
+        self.count = 0   # How many slots are filled (<= size)
+        self.head = 0    # Next slot to write
+
+    def push(self, value: float):
+        """
+        Stores value and returns the one it pushed out (None while filling up).
+        """
+        evicted = self.values[self.head] if self.count == self.size else None
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+        return evicted
+
+    def is_full(self) -> bool:
+        return self.count == self.size
+
+
+class RollingSum:
+    """
+    Sum of the last N values. Mirrors series.tail(n).sum() on an expanding slice.
+    """
+    def __init__(self, window: int):
+        self.window = window
+        self.buffer = RingBuffer(window)
+        self.total = 0.0
+
+    def update(self, value: float) -> float:
+        evicted = self.buffer.push(value)
+        self.total += value
+        if evicted is not None:
+            self.total -= evicted
+            # Re-sum once per full lap to stop float drift on very long runs
+            # (amortized O(1): N work every N updates)
+            if self.buffer.head == 0:
+                self.total = math.fsum(self.buffer.values)
+        return self.total
+
+    @property
+    def count(self) -> int:
+        return self.buffer.count
+
+    @property
+    def value(self) -> float:
+        return self.total
+
+    @property
+    def ready(self) -> bool:
+        return self.buffer.is_full()
+
+
+class RollingMean(RollingSum):
+    """
+    Mean of the last N values. While fewer than N values have been seen it
+    averages what it has, exactly like series.tail(n).mean().
+    """
+    def update(self, value: float) -> float:
+        super().update(value)
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if self.count == 0:
+            return math.nan
+        return self.total / self.count
+
+
+class RollingStd:
+    """
+    Sample standard deviation (ddof=1, same as pandas) of the last N values.
+    """
+    def __init__(self, window: int):
+        self.window = window
+        self.sum = RollingSum(window)
+        self.sum_sq = RollingSum(window)
+
+    def update(self, value: float) -> float:
+        self.sum.update(value)
+        self.sum_sq.update(value * value)
+        return self.value
+
+    @property
+    def count(self) -> int:
+        return self.sum.count
+
+    @property
+    def value(self) -> float:
+        n = self.count
+        if n < 2:
+            return math.nan
+        mean = self.sum.total / n
+        # Clamp tiny negative values caused by cancellation
+        var = max((self.sum_sq.total - n * mean * mean) / (n - 1), 0.0)
+        return math.sqrt(var)
+
+    @property
+    def ready(self) -> bool:
+        return self.sum.ready
+
+
+class EMA:
+    """
+    Exponential moving average, alpha = 2 / (span + 1).
+    Seeded with the first value (same as pandas ewm(span, adjust=False)).
+    """
+    def __init__(self, span: int):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.value = math.nan
+        self.count = 0
+
+    def update(self, value: float) -> float:
+        if self.count == 0:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        self.count += 1
+        return self.value
+
+    @property
+    def ready(self) -> bool:
+        return self.count >= self.span
+
+
+class WilderRSI:
+    """
+    Classic Wilder RSI: seeded with a simple average of the first N changes,
+    then smoothed with avg = (avg * (N - 1) + x) / N.
+    """
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.changes = 0
+        self.value = math.nan
+
+    def update(self, close: float) -> float:
+        if self.prev_close is None:
+            self.prev_close = close
+            return self.value
+
+        delta = close - self.prev_close
+        self.prev_close = close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        self.changes += 1
+
+        if self.changes <= self.period:
+            # Warm-up: accumulate the simple average of the first N changes
+            self.avg_gain += gain / self.period
+            self.avg_loss += loss / self.period
+            if self.changes < self.period:
+                return self.value
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+
+        self.value = _rsi(self.avg_gain, self.avg_loss)
+        return self.value
+
+    @property
+    def ready(self) -> bool:
+        return self.changes >= self.period
+
+
+class CutlerRSI:
+    """
+    RSI from simple rolling means of gains/losses (Cutler's RSI).
+    This is what the per-bar rsi-bot1 computes with tail(period).mean().
+    """
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = None
+        self.gain = RollingMean(period)
+        self.loss = RollingMean(period)
+        self.down_moves = RollingSum(period)  # Exact zero test for the loss window
+        self.value = math.nan
+
+    def update(self, close: float) -> float:
+        # The first bar has no change; tail(period) treats it as a 0 move
+        delta = 0.0 if self.prev_close is None else close - self.prev_close
+        self.prev_close = close
+        self.gain.update(delta if delta > 0 else 0.0)
+        self.loss.update(-delta if delta < 0 else 0.0)
+        self.down_moves.update(1.0 if delta < 0 else 0.0)
+
+        if self.down_moves.value == 0:
+            self.value = 100.0
+        else:
+            self.value = _rsi(self.gain.value, self.loss.value)
+        return self.value
+
+    @property
+    def ready(self) -> bool:
+        return self.gain.ready
+
+
+def _rsi(avg_gain: float, avg_loss: float) -> float:
+    if avg_loss == 0:
+        return 100.0
+    rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
@@ -1,5 +1,7 @@
 import pandas as pd
 import numpy as np
+from strategies.indicators import CutlerRSI
+from strategies.indicator_cache import indicators
 
 class AlphaStrategy(BaseStrategy):
     def __init__(self, period: int = 14, buy_threshold: int = 30, sell_threshold: int = 70):
@@ -32,4 +34,53 @@ class AlphaStrategy(BaseStrategy):
         # 3. Hold previous position if between 30 and 70
         # Returning 0 in our BaseStrategy means "Close Position" usually, 
         # but for simplicity here we just return 0 (Flat).
-        return 0
\ No newline at end of file
+        return 0
+
+    def generate_signals(self, df: pd.DataFrame) -> pd.Series:
+        # Vectorized version of generate_signal (one pass over the whole series).
+        # The RSI curve comes from the shared indicator cache (same formula,
+        # including the no-down-move rule for loss == 0).
+        rsi = indicators(df).rsi('Close', self.period)
+
+        signals = np.where(rsi < self.buy_threshold, 1, np.where(rsi > self.sell_threshold, -1, 0))
+        signals = pd.Series(signals, index=df.index)
+
+        # Same warm-up rule: need 'period' + 1 bars before trading
+        signals.iloc[:self.period] = 0
+        return signals
+
+    def lookback_bars(self) -> int:
+        # 'period' deltas need 'period' + 1 closes
+        return self.period + 1
+
+    def init_state(self) -> dict:
+        return {"rsi": CutlerRSI(self.period)}
+
+    def on_bar(self, bar, state: dict) -> int:
+        # Incremental version of generate_signal (O(1) per bar)
+        rsi = state["rsi"].update(bar.Close)
+        if state["bar_index"] < self.period:
+            return 0
+
+        if rsi < self.buy_threshold:
+            return 1
+        elif rsi > self.sell_threshold:
+            return -1
+        return 0
+
+    def generate_signals_grid(self, df: pd.DataFrame, param_grid: list) -> np.ndarray:
+        # Every (period, buy_threshold, sell_threshold) at once. The RSI curve is
+        # computed once per distinct period and data set (shared cache), and
+        # its gains/losses once per data set.
+        ind = indicators(df)
+        positions = np.arange(len(df))
+
+        periods = np.array([p.get('period', self.period) for p in param_grid])
+        buys = np.array([p.get('buy_threshold', self.buy_threshold) for p in param_grid])[:, None]
+        sells = np.array([p.get('sell_threshold', self.sell_threshold) for p in param_grid])[:, None]
+        rsi = np.array([ind.rsi('Close', p) for p in periods])
+
+        signals = np.where(rsi < buys, 1, np.where(rsi > sells, -1, 0))
+        # Same warm-up rule: need 'period' + 1 bars before trading
+        signals[positions[None, :] < periods[:, None]] = 0
+        return signals
\ No newline at end of file
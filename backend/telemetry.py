@@ -0,0 +1,172 @@
+import contextvars
+import cProfile
+import base64
+import io
+import logging
+import marshal
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# Hot-path instrumentation.
+# span("stage") times a block, feeds a latency histogram and, when a trace is
+# being collected, appends {"stage", "seconds", labels...} to it so a request
+# (or a worker process) can hand its per-stage breakdown back to the caller.
+# render_prometheus() exposes everything in Prometheus text format for /metrics.
+
+logger = logging.getLogger("alpha.trace")
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for key, series in items:
+            base = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.label_names, key))
+            sep = "," if base else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}
+        self.collectors = []  # Callables returning [(name, type, help, {labels}, value)]
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(name, help_text, tuple(label_names), buckets)
+            return self.histograms[name]
+
+    def register_collector(self, fn):
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for hist in list(self.histograms.values()):
+            lines.extend(hist.render())
+        seen = set()
+        for collect in self.collectors:
+            try:
+                samples = collect()
+            except Exception:
+                continue  # A broken collector must never take /metrics down
+            for name, kind, help_text, labels, value in samples:
+                if name not in seen:
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    seen.add(name)
+                label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "alpha_stage_seconds", "Time spent in each instrumented hot-path stage", ("stage",))
+HTTP_SECONDS = registry.histogram(
+    "alpha_http_request_seconds", "End-to-end request latency per endpoint", ("method", "route", "status"))
+STRATEGY_SECONDS = registry.histogram(
+    "alpha_strategy_seconds", "Backtest latency per strategy", ("strategy",))
+
+
+# --- Spans ---
+
+_trace = contextvars.ContextVar("alpha_trace", default=None)
+
+@contextmanager
+def span(stage: str, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - start, **labels)
+
+def record_span(stage: str, seconds: float, **labels):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append({"stage": stage, "seconds": round(seconds, 6), **labels})
+
+@contextmanager
+def collect_trace():
+    """
+    Collects every span opened inside the block into a list (yielded).
+    """
+    spans = []
+    token = _trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _trace.reset(token)
+
+def merge_spans(spans: list):
+    """
+    Replays spans recorded in another process (e.g. an arena worker) into
+    this process's histograms and current trace.
+    """
+    for s in spans or []:
+        labels = {k: v for k, v in s.items() if k not in ("stage", "seconds")}
+        record_span(s["stage"], s["seconds"], **labels)
+
+def log_trace(name: str, spans: list, total: float):
+    if spans and logger.isEnabledFor(logging.INFO):
+        logger.info("%s took %.4fs: %s", name, total,
+                    ", ".join(f"{s['stage']}={s['seconds']:.4f}" for s in spans))
+
+
+# --- Profiling ---
+
+def profile_call(fn, *args, top: int = 25, **kwargs):
+    """
+    Runs fn under cProfile. Returns (result, profile) where profile has a text
+    summary and the raw pstats dump (base64) - save it as a .prof file and
+    open it with snakeviz, or convert it with flameprof/gprof2dot.
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, **kwargs)
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats("cumulative").print_stats(top)
+    profiler.create_stats()
+    dump = base64.b64encode(marshal.dumps(profiler.stats)).decode("ascii")
+    return result, {"summary": stream.getvalue(), "pstats_b64": dump, "format": "pstats"}
+
+
+def render_prometheus() -> str:
+    return registry.render()
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend uses flat imports (from strategies.base import ..., from execution_engine import ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
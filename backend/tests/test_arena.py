@@ -0,0 +1,31 @@
+import threading
+import time
+
+import arena
+from benchmarks.synthetic import make_ohlcv
+
+# A worker stuck where SIGALRM can't reach it is only ended by replacing the
+# pool; whoever was waiting on a cell must hear about it.
+
+STUCK = '''
+import signal, time
+class AlphaStrategy(BaseStrategy):
+    def generate_signals(self, df):
+        signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+        time.sleep(3600)
+'''
+
+
+def test_reset_fails_pending_cells():
+    arena.start_pool()
+    results, done = [], threading.Event()
+    try:
+        with arena.SharedOHLCV(make_ohlcv(100, "daily", seed=1)) as shared:
+            arena.submit_cell(shared.handle(), STUCK, {}, 1, lambda result: (results.append(result), done.set()))
+            time.sleep(2)  # Past the cell's own 1 s alarm
+            assert not done.is_set()
+            arena._reset_pool()
+            assert done.wait(5)
+    finally:
+        arena.shutdown_pool()
+    assert len(results) == 1 and "reset" in results[0]["error"]
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from execution_engine import load_strategy_class
+from strategies import backtest_kernel
+from strategies.base import batch_metrics
+from test_signals import CASES, GOLDEN_CROSS_PARAMS, _code, _frames, _signals
+
+# The single-pass kernel must give the pandas formula it replaced, and its
+# batched form the same metrics as one backtest per row.
+
+
+def _pandas_backtest(signals: pd.Series, close: pd.Series) -> dict:
+    # run_backtest before the single-pass kernel (no costs)
+    strategy_return = signals.shift(1) * close.pct_change()
+    equity = (1 + strategy_return).cumprod()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe_ratio = strategy_return.mean() / strategy_return.std() * (252 ** 0.5)
+    return {
+        "sharpe_ratio": sharpe_ratio,
+        "total_return_pct": (equity.iloc[-1] - 1) * 100,
+        "equity_curve": equity.fillna(1).to_numpy(),
+    }
+
+@pytest.mark.parametrize("name, params", CASES)
+def test_kernel_matches_pandas_formula(name, params):
+    strategy = load_strategy_class(_code(name))(**params)
+    for df in _frames():
+        result = strategy.run_backtest(df.copy(), {"fee_bps": 0, "slippage_bps": 0})
+        expected = _pandas_backtest(strategy.compute_signals(df.copy()), df["Close"])
+        if np.isfinite(expected["sharpe_ratio"]):
+            assert result["sharpe_ratio"] == round(expected["sharpe_ratio"], 2)
+        else:
+            assert result["sharpe_ratio"] is None  # JSON has no NaN
+        assert result["total_return_pct"] == round(expected["total_return_pct"], 2)
+        np.testing.assert_allclose(result["equity_curve"], expected["equity_curve"], rtol=1e-12)
+
+def test_batch_metrics_match_single_backtests():
+    strategy_class = load_strategy_class(_code("golden-cross1"))
+    df = _frames()[0]
+    signals = np.array([_signals(strategy_class(**p).compute_signals(df.copy())) for p in GOLDEN_CROSS_PARAMS])
+    costs = {"fee_bps": 5, "slippage_bps": 2}
+    metrics = batch_metrics(signals, df["Close"].to_numpy(dtype=np.float64), costs)
+    for k, params in enumerate(GOLDEN_CROSS_PARAMS):
+        single = strategy_class(**params).run_backtest(df.copy(), costs)
+        row = backtest_kernel.rounded({name: values[k] for name, values in metrics.items()})
+        for name, value in row.items():
+            assert single[name] == value, name
+
+def test_costs_reduce_returns_by_turnover():
+    strategy = load_strategy_class(_code("golden-cross1"))(short_window=3, long_window=8)
+    df = _frames()[0]
+    free = strategy.run_backtest(df.copy(), {"fee_bps": 0, "slippage_bps": 0})
+    costly = strategy.run_backtest(df.copy(), {"fee_bps": 10, "slippage_bps": 0})
+    assert costly["trade_count"] == free["trade_count"] > 0
+    assert costly["total_return_pct"] < free["total_return_pct"]
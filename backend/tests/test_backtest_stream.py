@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from execution_engine import load_strategy_class
+from market_data import MarketData, OHLCVStore
+from test_market_data import TOMORROW, RecordingProvider
+
+# run_backtest_stream over iter_ohlcv chunks must give run_backtest's metrics
+# on the whole frame, and its thinned equity curve must be points of the full one.
+
+HEADER = "from strategies.base import BaseStrategy\n"
+COSTS = {"fee_bps": 5, "slippage_bps": 2}
+
+
+def _strategy(name: str):
+    with open(f"strategies/{name}.py") as f:
+        return load_strategy_class(f.read().replace(HEADER, ""))()
+
+
+@pytest.mark.parametrize("name", ["golden-cross1", "rsi-bot1", "golden-cross-rl"])
+@pytest.mark.parametrize("chunk_rows", [37, 500, 5000])
+def test_stream_matches_run_backtest(tmp_path, name, chunk_rows):
+    data = MarketData(provider=RecordingProvider(2000), store=OHLCVStore(str(tmp_path)))
+    start = TOMORROW - timedelta(days=2000)
+    strategy = _strategy(name)
+
+    full = strategy.run_backtest(data.get_ohlcv("SPY", start=start, end=TOMORROW), COSTS)
+    streamed = _strategy(name).run_backtest_stream(
+        data.iter_ohlcv("SPY", start=start, end=TOMORROW, chunk_rows=chunk_rows), equity_points=100, costs=COSTS)
+
+    assert len(data.provider.calls) == 1  # The stream read the store, not the provider
+    assert streamed["n_bars"] == len(full["equity_curve"]) == 2000
+    for key, value in full.items():
+        if key != "equity_curve":
+            assert streamed[key] == value, key
+    assert len(streamed["equity_bars"]) <= 100
+    np.testing.assert_allclose(streamed["equity_curve"], np.asarray(full["equity_curve"])[streamed["equity_bars"]], rtol=1e-12)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_ohlcv
+from charts import Chart, battle_chart, downsample, lttb_indices, pack_binary, to_rows, unpack_binary
+
+# A binary buffer must decode to the chart that went in, and downsampling must
+# keep the points a reader would miss: both ends and every line's extremes.
+
+
+def _chart(n_bars: int = 1000, seed: int = 4) -> Chart:
+    df = make_ohlcv(n_bars, "daily", seed=seed)
+    rng = np.random.default_rng(seed)
+    cells = {
+        "up": {"equity_curve": np.cumprod(1 + rng.normal(0.001, 0.01, n_bars)).tolist()},
+        "short": {"equity_curve": np.cumprod(1 + rng.normal(0, 0.02, n_bars - 10)).tolist()},
+        "failed": {"error": "boom"},
+    }
+    return battle_chart(df, cells)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float64"])
+def test_binary_round_trip(dtype):
+    charts = {"SPY": _chart(), "QQQ": downsample(_chart(seed=5), 200)}
+    charts["QQQ"].index = charts["QQQ"].index.tz_localize("America/New_York")
+    payload = pack_binary(charts, dtype=dtype, meta={"period": "1y"})
+
+    decoded = unpack_binary(payload)
+    assert decoded["header"]["period"] == "1y" and decoded["header"]["dtype"] == dtype
+    for ticker, chart in charts.items():
+        entry = decoded["header"]["tickers"][ticker]
+        assert entry["dates"] % 8 == 0 and all(offset % 8 == 0 for offset in entry["series"].values())
+        assert (entry["n_points"], entry["n_source"]) == (len(chart.index), chart.n_source)
+
+        out = decoded["tickers"][ticker]
+        index = chart.index.tz_convert("UTC").tz_localize(None) if chart.index.tz is not None else chart.index
+        pd.testing.assert_index_equal(out["dates"], pd.DatetimeIndex(index), check_names=False, exact=False)
+        assert list(out["series"]) == ["Benchmark", "up", "short"]
+        for name, values in chart.series.items():
+            np.testing.assert_array_equal(out["series"][name], values.astype(dtype))
+    assert np.isnan(decoded["tickers"]["SPY"]["series"]["short"][-10:]).all()  # The short curve's padding
+
+    with pytest.raises(ValueError):
+        unpack_binary(b"XXXX" + payload[4:])
+
+def test_lttb_keeps_endpoints_and_extremes():
+    rng = np.random.default_rng(0)
+    ys = np.cumsum(rng.normal(size=(3, 5000)), axis=1)
+    ys[1, 2345] = 1e6   # One-bar spike
+    ys[2, :100] = np.nan  # Series that starts late
+    keep = lttb_indices(ys, 300)
+
+    assert keep[0] == 0 and keep[-1] == 4999
+    assert (np.diff(keep) > 0).all()
+    assert 300 <= len(keep) <= 300 + 2 * len(ys)
+    for row in ys:
+        assert np.nanargmin(row) in keep and np.nanargmax(row) in keep
+    assert 2345 in keep
+
+    np.testing.assert_array_equal(lttb_indices(ys, 6000), np.arange(5000))
+
+def test_downsample_keeps_the_source_length():
+    chart = _chart()
+    small = downsample(chart, 100)
+    assert len(small.index) < 120 and small.n_source == 1000
+    assert small.index[0] == chart.index[0] and small.index[-1] == chart.index[-1]
+    rows = to_rows(small)
+    assert rows[0]["Benchmark"] == 100.0
+    assert downsample(chart, None) is chart
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from execution_engine import load_strategy_class
+from test_signals import GOLDEN_CROSS_PARAMS, RSI_PARAMS, _code, _frames, _signals
+
+# on_bar, fed one bar at a time with its state carried along, must give the
+# per-bar reference's signals, bar for bar.
+
+
+@pytest.mark.parametrize("name, params", [("rsi-bot1", p) for p in RSI_PARAMS]
+                         + [("golden-cross-rl", p) for p in GOLDEN_CROSS_PARAMS])
+def test_on_bar_matches_per_bar(name, params):
+    strategy = load_strategy_class(_code(name))(**params)
+    assert strategy.has_incremental_signals()
+    for df in _frames():
+        expected = _signals(strategy.generate_signals_per_bar(df.copy()))
+        np.testing.assert_array_equal(_signals(strategy.generate_signals_incremental(df.copy())), expected)
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+import jobs
+from database import Base, make_engine
+from jobs import JobManager
+from models import Job, JobEvent
+
+# Jobs start highest priority first (first come, first served within a
+# priority), and whatever a stopped server left queued or running is run
+# again, from a clean progress stream, by the next one.
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = make_engine(f"sqlite:///{tmp_path / 'alpha.db'}")
+    Base.metadata.create_all(bind=engine, tables=[Job.__table__, JobEvent.__table__])
+    monkeypatch.setattr(jobs, "engine", engine)  # start() creates its tables here, not in the app's DB
+    return sessionmaker(bind=engine)
+
+async def _wait_for(manager, job_id, statuses=("succeeded", "failed", "cancelled")):
+    for _ in range(500):
+        job = await manager.get(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} is still {job['status']}")
+
+
+def test_jobs_start_by_priority(session_factory):
+    async def main():
+        manager = JobManager(session_factory, workers=1, kind_limits={})
+        gate, order = asyncio.Event(), []
+
+        async def blocker(payload, emit):
+            await gate.wait()
+        async def record(payload, emit):
+            order.append(payload["name"])
+            emit({"log": payload["name"]})
+            return payload["name"]
+        manager.register("block", blocker)
+        manager.register("record", record)
+
+        first = await manager.submit("block", {})
+        await _wait_for(manager, first, ("running",))
+        ids = [await manager.submit("record", {"name": name}, priority=priority)
+               for name, priority in [("low", 0), ("high", 5), ("mid", 1), ("low-2", 0), ("high-2", 5)]]
+        assert manager.queued() == 5
+        gate.set()
+        results = [await _wait_for(manager, job_id) for job_id in ids]
+        await manager.stop()
+        return order, results
+
+    order, results = asyncio.run(main())
+    assert order == ["high", "high-2", "mid", "low", "low-2"]
+    assert [r["result"] for r in results] == ["low", "high", "mid", "low-2", "high-2"]
+
+def test_unfinished_jobs_rerun_after_a_restart(session_factory):
+    async def before_restart():
+        manager = JobManager(session_factory, workers=1, kind_limits={})
+        async def hang(payload, emit):
+            for i in range(jobs.FLUSH_EVERY + 5):
+                emit({"log": f"step {i}"})
+            await asyncio.Event().wait()
+        manager.register("work", hang)
+        running = await manager.submit("work", {"n": 1})
+        await _wait_for(manager, running, ("running",))
+        queued = await manager.submit("work", {"n": 2}, priority=3)
+        await asyncio.sleep(0.05)  # Let the flush land
+        await manager.stop()
+        return running, queued
+
+    async def after_restart(running, queued):
+        manager = JobManager(session_factory, workers=1, kind_limits={})
+        seen = []
+        async def work(payload, emit):
+            seen.append(payload["n"])
+            emit({"log": "rerun"})
+            return payload["n"] * 10
+        manager.register("work", work)
+        await manager.start()
+        done = [await _wait_for(manager, job_id) for job_id in (running, queued)]
+        lines = [line async for line in manager.stream(running)]
+        await manager.stop()
+        return seen, done, lines
+
+    running, queued = asyncio.run(before_restart())
+    db = session_factory()
+    try:
+        statuses = {row.id: row.status for row in db.query(Job)}
+        assert statuses == {running: "running", queued: "queued"}
+        assert db.query(JobEvent).filter(JobEvent.job_id == running).count() >= jobs.FLUSH_EVERY
+    finally:
+        db.close()
+
+    seen, done, lines = asyncio.run(after_restart(running, queued))
+    assert seen == [2, 1]  # Priority still holds across the restart
+    assert [(job["status"], job["result"]) for job in done] == [("succeeded", 10), ("succeeded", 20)]
+    assert len(lines) == done[0]["n_events"] == 2  # The rerun's own lines, not the first attempt's
+    assert '"rerun"' in lines[0]
@@ -0,0 +1,83 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import mab_logic
+from database import Base, make_engine
+from mab_logic import StrategyAllocator, monte_carlo_allocation
+from models import BanditArm, Strategy
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+# The Monte Carlo allocation is a seeded expectation of the Thompson weights,
+# and the persisted arms take any number of rewards in one batch.
+
+
+def test_allocation_is_seeded_and_blended():
+    alpha, beta = np.array([30.0, 10.0, 2.0]), np.array([10.0, 30.0, 2.0])
+    weights, regret = monte_carlo_allocation(alpha, beta, fairness_score=0, n_draws=4000, seed=7)
+    again, _ = monte_carlo_allocation(alpha, beta, fairness_score=0, n_draws=4000, seed=7)
+
+    np.testing.assert_array_equal(weights, again)
+    assert weights.sum() == pytest.approx(1.0)
+    assert weights[0] > weights[2] > weights[1]  # The uncertain arm still beats the known loser
+    assert 0 < regret < 100
+
+    fair, fair_regret = monte_carlo_allocation(alpha, beta, fairness_score=100, n_draws=4000, seed=7)
+    np.testing.assert_allclose(fair, 1 / 3)
+    assert fair_regret > regret
+    half, _ = monte_carlo_allocation(alpha, beta, fairness_score=50, n_draws=4000, seed=7)
+    np.testing.assert_allclose(half, (weights + fair) / 2)
+
+def test_allocation_converges_to_the_exact_expectation():
+    # Identical arms: every draw splits evenly, whatever the chunking
+    weights, _ = monte_carlo_allocation(np.full(4, 3.0), np.full(4, 3.0), 0, n_draws=20000, seed=1)
+    np.testing.assert_allclose(weights, 0.25, atol=0.005)
+
+def test_chunked_draws_match_one_pass(monkeypatch):
+    alpha, beta = np.array([5.0, 2.0, 9.0]), np.array([3.0, 6.0, 1.0])
+    whole = monte_carlo_allocation(alpha, beta, 20, n_draws=999, seed=3)
+    monkeypatch.setattr(mab_logic, "MAX_CHUNK", 3 * 100)  # 100 draws at a time
+    assert monte_carlo_allocation(alpha, beta, 20, n_draws=999, seed=3) == (pytest.approx(whole[0]), pytest.approx(whole[1]))
+    assert monte_carlo_allocation([], [], 50) == (pytest.approx(np.zeros(0)), 0.0)
+
+
+@pytest.fixture
+def allocator(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'alpha.db'}")
+    # Hold every statement to the strictest SQLite build's parameter limit
+    event.listen(engine, "connect", lambda connection, record: connection.setlimit(
+        sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999))
+    Base.metadata.create_all(bind=engine, tables=[Strategy.__table__, BanditArm.__table__])
+    allocator = StrategyAllocator(sessionmaker(bind=engine))
+    allocator._table_ready = True  # Tables are on the scratch engine, not the app's
+    return allocator
+
+def test_update_batch_accumulates_past_the_statement_limit(allocator):
+    n_arms = 1000  # 5000 values: several statements' worth
+    assert allocator.update_batch([(sid, 1.0) for sid in range(n_arms)] + [(0, 0.0), (1, 0.25)]) == n_arms
+    assert allocator.update_batch([(0, 1.0)]) == 1
+
+    db = allocator.session_factory()
+    try:
+        arms = {arm.strategy_id: arm for arm in db.query(BanditArm).all()}
+    finally:
+        db.close()
+    assert len(arms) == n_arms
+    assert (arms[0].alpha, arms[0].beta, arms[0].pulls) == (3.0, 2.0, 3)
+    assert (arms[1].alpha, arms[1].beta, arms[1].pulls) == (2.25, 1.75, 2)
+    assert (arms[n_arms - 1].alpha, arms[n_arms - 1].beta, arms[n_arms - 1].pulls) == (2.0, 1.0, 1)
+
+def test_allocate_favours_the_winner(allocator):
+    db = allocator.session_factory()
+    db.add_all([Strategy(name=name, code="") for name in ("winner", "loser", "new")])
+    db.commit()
+    ids = [s.id for s in db.query(Strategy).order_by(Strategy.id)]
+    db.close()
+    allocator.update_batch([(ids[0], 1.0)] * 20 + [(ids[1], 0.0)] * 20)
+
+    allocation = allocator.allocate(fairness_score=0, n_draws=2000)
+    assert allocation["names"] == ["winner", "loser", "new"]
+    assert allocation["weights"][0] > allocation["weights"][2] > allocation["weights"][1]
+    np.testing.assert_allclose(allocation["pulls"], [20, 20, 0])
@@ -0,0 +1,86 @@
+import os
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import market_data
+from benchmarks.synthetic import make_ohlcv
+from market_data import MarketData, MarketDataProvider, OHLCVStore
+
+# The store only ever fetches the ranges it lacks, and appends them as new
+# segments instead of rewriting the history.
+
+TODAY = date.today()
+TOMORROW = TODAY + timedelta(days=1)
+
+
+class RecordingProvider(MarketDataProvider):
+    # Daily bars up to and including today; remembers every range asked for
+    def __init__(self, n_bars=800):
+        self.df = make_ohlcv(n_bars, "daily", seed=21)
+        self.df.index = pd.date_range(end=pd.Timestamp(TODAY), periods=n_bars, freq="D", name="Date")
+        self.calls = []
+
+    def fetch(self, ticker, start, end, interval="1d"):
+        self.calls.append((start, end))
+        return self.df.loc[market_data._slice_mask(self.df.index, start, end)].copy()
+
+    def expected(self, start, end):
+        return self.df.loc[market_data._slice_mask(self.df.index, start, end)]
+
+
+@pytest.fixture
+def data(tmp_path):
+    return MarketData(provider=RecordingProvider(), store=OHLCVStore(str(tmp_path)))
+
+def _segments(data):
+    return set(name for name in os.listdir(data.store._dir("SPY", "1d")) if name.startswith("seg-"))
+
+
+def test_repeated_requests_fetch_once(data):
+    start = TODAY - timedelta(days=300)
+    first = data.get_ohlcv("SPY", start=start, end=TOMORROW)
+    data.clear_memory()
+    again = data.get_ohlcv("SPY", start=start, end=TOMORROW)
+    streamed = pd.concat(data.iter_ohlcv("SPY", start=start, end=TOMORROW, chunk_rows=64))
+
+    assert data.provider.calls == [(start, TOMORROW)]
+    pd.testing.assert_frame_equal(first, data.provider.expected(start, TOMORROW), check_freq=False)
+    pd.testing.assert_frame_equal(again, first)
+    pd.testing.assert_frame_equal(streamed, first)
+
+def test_top_ups_append_only_missing_rows(data, monkeypatch):
+    start = TODAY - timedelta(days=300)
+    data.get_ohlcv("SPY", start=start, end=TOMORROW)
+    before = _segments(data)
+
+    # An earlier start fetches just the head and adds a segment in front
+    earlier = TODAY - timedelta(days=500)
+    head = data.get_ohlcv("SPY", start=earlier, end=TOMORROW)
+    assert data.provider.calls[-1] == (earlier, start)
+    assert len(_segments(data) - before) == 1
+    pd.testing.assert_frame_equal(head, data.provider.expected(earlier, TOMORROW), check_freq=False)
+
+    # A stale open bar is refetched on its own, replacing only the open segment
+    monkeypatch.setattr(market_data, "OPEN_BAR_TTL_S", -1)
+    closed = _segments(data) - {data.store._read_meta("SPY", "1d")["open"]}
+    data.clear_memory()
+    refreshed = data.get_ohlcv("SPY", start=earlier, end=TOMORROW)
+    assert data.provider.calls[-1] == (TODAY, TOMORROW)
+    assert closed <= _segments(data)
+    pd.testing.assert_frame_equal(refreshed, head)
+
+def test_segments_merge_past_the_limit(data, monkeypatch):
+    monkeypatch.setattr(market_data, "MAX_SEGMENTS", 2)
+    for days in (100, 200, 300, 400):
+        data.get_ohlcv("SPY", start=TODAY - timedelta(days=days), end=TOMORROW)
+
+    meta = data.store._read_meta("SPY", "1d")
+    assert len(meta["segments"]) <= 3  # At most MAX_SEGMENTS closed, plus the open one
+    assert _segments(data) == set(meta["segments"])
+    start = TODAY - timedelta(days=400)
+    pd.testing.assert_frame_equal(data.store.read("SPY", "1d", start, TOMORROW),
+                                  data.provider.expected(start, TOMORROW), check_freq=False)
+    chunks = list(data.store.iter_chunks("SPY", "1d", start, TOMORROW, chunk_rows=150))
+    assert [len(c) for c in chunks] == [150, 150, 101]  # 400 days plus today
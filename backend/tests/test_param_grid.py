@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from execution_engine import load_strategy_class
+from test_signals import GOLDEN_CROSS_PARAMS, RSI_PARAMS, _code, _frames, _signals
+
+# Each row of generate_signals_grid must be that parameter set's
+# generate_signals, including windows longer than the data and tied averages.
+
+
+@pytest.mark.parametrize("name, grid", [("golden-cross1", GOLDEN_CROSS_PARAMS), ("rsi-bot1", RSI_PARAMS)])
+def test_grid_rows_match_generate_signals(name, grid):
+    strategy_class = load_strategy_class(_code(name))
+    assert strategy_class().has_grid_signals()
+    for df in _frames():
+        rows = np.asarray(strategy_class().generate_signals_grid(df.copy(), grid), dtype=np.float64)
+        assert rows.shape == (len(grid), len(df))
+        for row, params in zip(rows, grid):
+            np.testing.assert_array_equal(np.nan_to_num(row), _signals(strategy_class(**params).generate_signals(df.copy())))
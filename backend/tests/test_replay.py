@@ -0,0 +1,72 @@
+import asyncio
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import market_data
+import replay
+from execution_engine import load_strategy_class
+from market_data import MarketData, OHLCVStore
+from test_market_data import TOMORROW, RecordingProvider
+
+# A replay of recorded bars must trade exactly what the backtest's
+# compute_signals says, whichever incremental path each strategy takes.
+
+HEADER = "from strategies.base import BaseStrategy\n"
+PER_BAR = '''
+class AlphaStrategy(BaseStrategy):
+    def generate_signal(self, df):
+        total = 0
+        for value in df['Close'].tail(10):
+            total += value
+        return 1 if df['Close'].iloc[-1] > total / 10 else -1
+'''  # The loop keeps the compiler from translating it
+
+
+def _code(name: str) -> str:
+    with open(f"strategies/{name}.py") as f:
+        return f.read().replace(HEADER, "")
+
+def _events(strategies, monkeypatch, tmp_path):
+    monkeypatch.setattr(market_data, "_default", MarketData(provider=RecordingProvider(400), store=OHLCVStore(str(tmp_path))))
+    async def collect():
+        return [event async for event in replay.replay(strategies, "SPY", "1y", "1d", speed=0)]
+    return asyncio.run(collect())
+
+
+def test_replay_signals_match_compute_signals(monkeypatch, tmp_path):
+    strategies = [
+        {"name": "window", "code": _code("golden-cross1"), "params": {"short_window": 5, "long_window": 20}},
+        {"name": "on_bar", "code": _code("rsi-bot1")},
+        {"name": "generate_signal", "code": PER_BAR},
+    ]
+    events = _events(strategies, monkeypatch, tmp_path)
+    assert not [e for e in events if e["event"] == "error"]
+    assert events[0]["strategies"] == {s["name"]: s["name"] for s in strategies}
+
+    df = market_data.get_market_data().get_ohlcv("SPY", "1y", "1d")
+    summary = events[-1]
+    assert summary["event"] == "summary" and summary["bars"] == len(df) > replay.BATCH_BARS
+    for spec in strategies:
+        # The position after each bar, rebuilt from the fills
+        position = np.zeros(len(df))
+        for fill in (e for e in events if e["event"] == "fill" and e["strategy"] == spec["name"]):
+            position[fill["bar"]:] = fill["position_after"]
+        strategy = load_strategy_class(spec["code"])(**(spec.get("params") or {}))
+        expected = pd.Series(strategy.compute_signals(df.copy())).fillna(0).to_numpy(dtype=np.float64)
+        np.testing.assert_array_equal(position, expected)
+
+        stats = summary["strategies"][spec["name"]]
+        assert stats["decisions"] == len(df)
+        assert stats["latency_ms"]["p50"] <= stats["latency_ms"]["p90"] <= stats["latency_ms"]["p99"]
+        assert stats["safe_for"]
+
+def test_replay_reports_a_strategy_that_fails_to_load(monkeypatch, tmp_path):
+    broken = "class AlphaStrategy(BaseStrategy):\n    def __init__(self):\n        raise ValueError('nope')\n"
+    events = _events([{"name": "broken", "code": broken}, {"name": "on_bar", "code": _code("rsi-bot1")}],
+                     monkeypatch, tmp_path)
+    assert {"event": "error", "strategy": "broken", "error": "nope"} in events
+    summary = events[-1]["strategies"]
+    assert summary["broken"]["error"] == "nope" and summary["broken"]["decisions"] == 0
+    assert summary["on_bar"]["decisions"] > 0
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+import robustness
+from benchmarks.synthetic import make_ohlcv
+from strategies import backtest_kernel as kernel
+
+# The resamples are seeded: one seed is one report, and the distributions
+# behave as the resampling promises.
+
+NO_COSTS = {"fee_bps": 0, "slippage_bps": 0}
+
+
+def _close(n_bars: int = 500, seed: int = 2) -> np.ndarray:
+    return make_ohlcv(n_bars, "daily", seed=seed)["Close"].to_numpy()
+
+def _crossover(close: np.ndarray) -> np.ndarray:
+    fast = np.convolve(close, np.ones(5) / 5)[:len(close)]
+    slow = np.convolve(close, np.ones(20) / 20)[:len(close)]
+    return np.where(fast > slow, 1.0, -1.0)
+
+
+def test_analyze_is_seeded():
+    close = _close()
+    signals = _crossover(close)
+    report = robustness.analyze(signals, close, n_samples=300, seed=11)
+    assert robustness.analyze(signals, close, n_samples=300, seed=11) == report
+    other = robustness.analyze(signals, close, n_samples=300, seed=12)
+    assert other["bootstrap"] != report["bootstrap"]
+    assert other["sharpe_ratio"] == report["sharpe_ratio"]  # The real path doesn't depend on the seed
+
+    scores = robustness.objective_scores(np.stack([signals, -signals]), close, "skill", n_samples=100, seed=5)
+    np.testing.assert_array_equal(scores, robustness.objective_scores(
+        np.stack([signals, -signals]), close, "skill", n_samples=100, seed=5))
+
+def test_block_indices_are_wrapped_runs():
+    indices = robustness.block_indices(np.random.default_rng(0), 50, 97, 10)
+    assert indices.shape == (50, 97)
+    assert indices.min() >= 0 and indices.max() < 97
+    steps = np.diff(indices, axis=1) % 97
+    breaks = np.arange(1, 97) % 10 == 0  # A new block may start anywhere
+    assert (steps[:, ~breaks] == 1).all()
+
+def test_bootstrap_centres_on_the_real_path():
+    close = _close(2000)
+    signals = _crossover(close)
+    report = robustness.analyze(signals, close, NO_COSTS, n_samples=2000, seed=3)
+    boot = report["bootstrap"]["sharpe"]
+    assert boot["p5"] <= boot["p25"] <= boot["p50"] <= boot["p75"] <= boot["p95"]
+    assert boot["p5"] < report["sharpe_ratio"] < boot["p95"]
+    assert report["robust_sharpe"] == boot["p5"]
+    assert sum(boot["histogram"]["counts"]) == 2000
+
+    # Identity resamples reproduce the real path's metrics
+    returns = kernel.strategy_returns(signals, close)[0, 1:]
+    same = robustness.bootstrap(returns, np.tile(np.arange(len(returns)), (3, 1)))
+    np.testing.assert_allclose(same["terminal_equity"], np.prod(1 + returns))
+
+def test_random_entry_null_distribution():
+    close = _close(1000)
+    # Always long: every shift is the same series, so nothing beats it
+    flat = robustness.analyze(np.ones(len(close)), close, NO_COSTS, n_samples=200, seed=1)
+    assert flat["random_entry"]["sharpe"]["std"] == pytest.approx(0, abs=1e-9)
+    assert flat["prob_skill"] == 0
+
+    # Trading tomorrow's move today: no random timing comes close
+    ahead = np.sign(np.append(np.diff(close), 0.0))
+    assert robustness.analyze(ahead, close, NO_COSTS, n_samples=200, seed=1)["prob_skill"] == 1
+
+    # A shifted series scores what the kernel says it returns
+    offsets = np.array([1, 17, 300])
+    sharpe = robustness.random_entry_sharpe(ahead, close, 0.0, offsets)
+    for offset, value in zip(offsets, sharpe):
+        returns = kernel.strategy_returns(np.roll(ahead, offset), close)[0, 1:]
+        assert value == pytest.approx(returns.mean() / returns.std(ddof=1) * np.sqrt(kernel.PERIODS_PER_YEAR))
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_ohlcv
+from execution_engine import load_strategy_class
+
+# The vectorized generate_signals of the bundled strategies must give the
+# per-bar reference's signals, bar for bar, on edge-case parameters.
+# The strategies, frames and parameter sets here are shared by the tests of
+# the other signal paths (test_incremental, test_param_grid, ...).
+
+STRATEGIES_DIR = "strategies"
+HEADER = "from strategies.base import BaseStrategy\n"
+
+
+def _code(name: str) -> str:
+    with open(f"{STRATEGIES_DIR}/{name}.py") as f:
+        return f.read().replace(HEADER, "")
+
+def _frames() -> list:
+    # A seeded random walk, and one with a flat stretch (tied averages, zero deltas)
+    walk = make_ohlcv(300, "daily", seed=11)
+    flat = make_ohlcv(300, "daily", seed=12)
+    flat.iloc[100:140, flat.columns.get_loc("Close")] = 100.0
+    return [walk, flat]
+
+def _signals(series) -> np.ndarray:
+    return pd.Series(series).fillna(0).to_numpy(dtype=np.float64)
+
+
+GOLDEN_CROSS_PARAMS = [
+    {},
+    {"short_window": 1, "long_window": 2},
+    {"short_window": 20, "long_window": 20},    # Tied averages: always flat
+    {"short_window": 50, "long_window": 10},    # Inverted windows
+    {"short_window": 5, "long_window": 400},    # Longer than the data
+]
+RSI_PARAMS = [
+    {},
+    {"period": 1},
+    {"period": 2, "buy_threshold": 50, "sell_threshold": 50},
+    {"period": 30, "buy_threshold": 0, "sell_threshold": 100},
+    {"period": 400},
+]
+CASES = [("golden-cross1", p) for p in GOLDEN_CROSS_PARAMS] + [("rsi-bot1", p) for p in RSI_PARAMS]
+
+
+@pytest.mark.parametrize("name, params", CASES)
+def test_generate_signals_matches_per_bar(name, params):
+    strategy = load_strategy_class(_code(name))(**params)
+    for df in _frames():
+        expected = _signals(strategy.generate_signals_per_bar(df.copy()))
+        np.testing.assert_array_equal(_signals(strategy.generate_signals(df.copy())), expected)
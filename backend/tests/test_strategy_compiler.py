@@ -0,0 +1,43 @@
+import re
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_ohlcv
+from execution_engine import load_strategy_class
+from test_signals import CASES, _code, _frames, _signals
+
+# A strategy with only generate_signal, translated to generate_signals by
+# the compiler, must give the per-bar loop's signals; code it can't
+# translate keeps the per-bar path.
+
+
+def _per_bar_only(code: str) -> str:
+    # The same strategy with only generate_signal (what the generator usually writes)
+    cut = re.search(r"\n    def (generate_signals|init_state|on_bar|lookback_bars|generate_signals_grid)\b", code)
+    return code[:cut.start()] + "\n" if cut else code
+
+
+@pytest.mark.parametrize("name, params", CASES)
+def test_translated_signals_match_per_bar(name, params):
+    strategy = load_strategy_class(_per_bar_only(_code(name)))(**params)
+    assert strategy.signals_translated()
+    # Longer than the compiler's own sample check, so the translation is used
+    for df in _frames() + [make_ohlcv(600, "daily", seed=13)]:
+        expected = _signals(strategy.generate_signals_per_bar(df.copy()))
+        np.testing.assert_array_equal(_signals(strategy.generate_signals(df.copy())), expected)
+
+def test_untranslatable_code_keeps_per_bar_path():
+    code = '''
+class AlphaStrategy(BaseStrategy):
+    def generate_signal(self, df):
+        total = 0
+        for value in df['Close'].tail(3):
+            total += value
+        return 1 if df['Close'].iloc[-1] > total / 3 else -1
+'''
+    strategy = load_strategy_class(code)()
+    assert not strategy.signals_translated()
+    df = _frames()[0]
+    np.testing.assert_array_equal(_signals(strategy.compute_signals(df.copy())),
+                                  _signals(strategy.generate_signals_per_bar(df.copy())))
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import trade_ledger
+from benchmarks.synthetic import make_ohlcv
+from database import make_engine
+from models import Trade
+from strategies.base import trades_from_signals
+
+# Keyset pages must walk the ledger in (timestamp, id) order with nothing
+# skipped or repeated, also where runs share timestamps.
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    engine = make_engine(f"sqlite:///{tmp_path / 'alpha.db'}")
+    Trade.__table__.create(bind=engine)
+    monkeypatch.setattr(trade_ledger, "engine", engine)
+    monkeypatch.setattr(trade_ledger, "_table_ready", True)  # The table is on the scratch engine
+    monkeypatch.setattr(trade_ledger, "BATCH_SIZE", 64)
+    return trade_ledger
+
+def _trades(seed: int) -> dict:
+    df = make_ohlcv(1000, "daily", seed=0)
+    signals = np.random.default_rng(seed).choice([-1.0, 0.0, 1.0], size=len(df))
+    return trades_from_signals(signals, df["Close"].to_numpy(), df.index)
+
+
+def test_keyset_pages_cover_the_ledger_once(ledger):
+    runs = [ledger.record_trades(_trades(seed), strategy_id=seed, symbol="SPY")["run_id"] for seed in (1, 2)]
+    everything = ledger.query_trades(limit=ledger.MAX_PAGE)
+    assert everything["next_cursor"] is None
+    n = len(everything["items"])
+    assert n == sum(len(_trades(seed)["bar_index"]) for seed in (1, 2)) > 2 * 64  # Several batches each
+    assert [(r["timestamp"], r["id"]) for r in everything["items"]] == sorted(
+        (r["timestamp"], r["id"]) for r in everything["items"])
+
+    pages, cursor = [], None
+    while True:
+        page = ledger.query_trades(cursor=cursor, limit=97)
+        pages.append(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert all(len(items) == 97 for items in pages[:-1]) and 0 < len(pages[-1]) <= 97
+    assert [r["id"] for items in pages for r in items] == [r["id"] for r in everything["items"]]
+
+    # Filters and cursors combine
+    sells, cursor = [], None
+    while True:
+        page = ledger.query_trades(run_id=runs[1], action="sell", cursor=cursor, limit=50)
+        sells += page["items"]
+        if (cursor := page["next_cursor"]) is None:
+            break
+    expected = [r for r in everything["items"] if r["run_id"] == runs[1] and r["action"] == "SELL"]
+    assert sells == expected and sells
+
+def test_runs_and_deletes(ledger):
+    first = ledger.record_trades(_trades(1), strategy_id=1, symbol="SPY")
+    second = ledger.record_trades(_trades(2), strategy_id=2, symbol="QQQ")
+    runs = ledger.list_runs()
+    assert [r["run_id"] for r in runs] == [second["run_id"], first["run_id"]]  # Newest first
+    assert runs[1]["n_trades"] == first["n_trades"]
+    assert ledger.list_runs(symbol="QQQ")[0]["strategy_id"] == 2
+
+    assert ledger.delete_trades(run_id=first["run_id"]) == first["n_trades"]
+    assert [r["run_id"] for r in ledger.list_runs()] == [second["run_id"]]
+    assert ledger.record_trades(_trades(1) | {"bar_index": np.array([], dtype=np.int64)})["n_trades"] == 0
+
+def test_rejects_a_bad_cursor(ledger):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        ledger.query_trades(cursor="yesterday")
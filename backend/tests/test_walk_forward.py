@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+import walk_forward
+from benchmarks.synthetic import make_ohlcv
+from execution_engine import load_strategy_class
+from strategies.base import batch_metrics
+from walk_forward import make_folds, stability
+
+# Stability only counts what a fold's winner did on bars its search never
+# saw: every test window lies after its train window, and the scores that
+# feed positive_folds are a fresh backtest on that window alone.
+
+HEADER = "from strategies.base import BaseStrategy\n"
+
+
+def _code(name: str) -> str:
+    with open(f"strategies/{name}.py") as f:
+        return f.read().replace(HEADER, "")
+
+
+@pytest.mark.parametrize("mode", ["rolling", "anchored"])
+def test_test_windows_follow_their_train_windows(mode):
+    folds = make_folds(1000, 5, mode)
+    assert folds[-1][3] == 1000
+    for k, (train_start, train_stop, test_start, test_stop) in enumerate(folds):
+        assert train_start < train_stop == test_start < test_stop
+        assert train_start == 0 if mode == "anchored" else train_stop - train_start == folds[0][1]
+        if k:
+            assert test_start == folds[k - 1][3]  # Consecutive, never overlapping
+
+def test_stability_ignores_in_sample_scores():
+    folds = [{"params": {"n": 10}, "is_sharpe": 3.0, "oos_sharpe": oos} for oos in (-0.5, -1.0, 0.2, None)]
+    result = stability(folds, {"n": (5, 50)})
+    assert result["positive_folds"] == 0.25  # In-sample was positive everywhere
+    assert result["param_dispersion"] == 0 and result["score"] == 0.25
+    assert result["oos_sharpe_mean"] == pytest.approx(-0.43)
+    assert result["efficiency"] == pytest.approx(round(-1.3 / 3 / 3.0, 2))
+
+def test_fold_scores_are_out_of_sample():
+    df = make_ohlcv(1500, "daily", seed=9)
+    code = _code("golden-cross1")
+
+    async def collect():
+        return [json.loads(line) async for line in walk_forward.walk_forward(
+            code, df, n_folds=4, engine="grid", max_evals=12, costs={"fee_bps": 5, "slippage_bps": 0})]
+    packets = asyncio.run(collect())
+    folds = [p for p in packets if "fold" in p]
+    summary = packets[-1]["summary"]
+    assert len(folds) == 4
+
+    close = df["Close"].to_numpy(dtype=np.float64)
+    for packet, (train_start, train_stop, test_start, test_stop) in zip(folds, make_folds(len(df), 4)):
+        assert packet["test"][0] > packet["train"][1]
+        # A fresh backtest of the winner on the test window alone, warm indicators from the full series
+        signals = load_strategy_class(code)(**packet["params"]).compute_signals(df.copy())
+        signals = np.nan_to_num(np.asarray(signals, dtype=np.float64))[None, test_start:test_stop]
+        oos = batch_metrics(signals, close[test_start:test_stop], {"fee_bps": 5, "slippage_bps": 0})
+        assert packet["oos_sharpe"] == walk_forward._round(oos["sharpe_ratio"][0])
+
+    assert summary["stability"] == stability(folds, dict(walk_forward.inspect_strategy(code)["ranges"]))
+    assert summary["stability"]["positive_folds"] == np.mean([f["oos_sharpe"] > 0 for f in folds])
+    assert summary["recommended_params"] == folds[-1]["params"]
@@ -0,0 +1,146 @@
+import os
+import uuid
+from datetime import datetime
+
+from sqlalchemy import insert, select, func, and_, or_
+
+from database import engine, ensure_schema
+from models import Trade
+
+# Trade ledger.
+# Backtests derive their trade events from position changes
+# (strategies.base.trades_from_signals); this module writes them to the
+# trades table in bulk (executemany, BATCH_SIZE rows per transaction) and
+# reads them back with keyset pagination, so neither side slows down as the
+# ledger grows into millions of rows.
+
+BATCH_SIZE = int(os.getenv("TRADE_BATCH_SIZE", "5000"))
+MAX_PAGE = 5000
+
+_table_ready = False
+
+def _ensure_table():
+    global _table_ready
+    if not _table_ready:
+        ensure_schema(Trade.__table__)  # Older DBs have a trades table without the new columns/indexes
+        _table_ready = True
+
+
+def record_trades(trades: dict, strategy_id: int = None, symbol: str = None, run_id: str = None) -> dict:
+    """
+    trades: the column dict from trades_from_signals.
+    Returns {"run_id", "n_trades"}.
+    """
+    _ensure_table()
+    run_id = run_id or uuid.uuid4().hex
+    n = len(trades["bar_index"])
+    if n == 0:
+        return {"run_id": run_id, "n_trades": 0}
+
+    # Plain Python columns once, instead of per-row numpy scalar conversions
+    timestamps = list(trades["timestamp"].to_pydatetime())
+    bar_index = trades["bar_index"].tolist()
+    action = trades["action"].tolist()
+    price = trades["price"].tolist()
+    before = trades["position_before"].tolist()
+    after = trades["position_after"].tolist()
+    quantity = trades["quantity"].tolist()
+
+    stmt = insert(Trade.__table__)
+    for start in range(0, n, BATCH_SIZE):
+        stop = min(start + BATCH_SIZE, n)
+        rows = [{
+            "strategy_id": strategy_id,
+            "symbol": symbol,
+            "run_id": run_id,
+            "timestamp": timestamps[i],
+            "bar_index": bar_index[i],
+            "action": action[i],
+            "price": price[i],
+            "position_before": before[i],
+            "position_after": after[i],
+            "quantity": quantity[i],
+        } for i in range(start, stop)]
+        with engine.begin() as conn:  # One transaction per batch
+            conn.execute(stmt, rows)
+    return {"run_id": run_id, "n_trades": n}
+
+
+def query_trades(strategy_id: int = None, symbol: str = None, run_id: str = None, action: str = None,
+                 start: datetime = None, end: datetime = None, cursor: str = None, limit: int = 500) -> dict:
+    """
+    Trades ordered by (timestamp, id). cursor is the next_cursor of the
+    previous page ("<iso timestamp>|<id>"), so every page is an index seek
+    rather than an OFFSET scan. Returns {"items", "next_cursor"}.
+    """
+    _ensure_table()
+    t = Trade.__table__
+    limit = max(1, min(limit, MAX_PAGE))
+    conditions = _filters(t, strategy_id, symbol, run_id, action, start, end)
+    if cursor:
+        after_ts, after_id = _parse_cursor(cursor)
+        conditions.append(or_(t.c.timestamp > after_ts, and_(t.c.timestamp == after_ts, t.c.id > after_id)))
+
+    query = (select(t.c.id, t.c.strategy_id, t.c.symbol, t.c.run_id, t.c.timestamp, t.c.bar_index, t.c.action,
+                    t.c.price, t.c.quantity, t.c.position_before, t.c.position_after)
+             .where(*conditions).order_by(t.c.timestamp, t.c.id).limit(limit + 1))
+    with engine.connect() as conn:
+        rows = [dict(r._mapping) for r in conn.execute(query)]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = f"{last['timestamp'].isoformat()}|{last['id']}"
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+def list_runs(strategy_id: int = None, symbol: str = None, limit: int = 50, offset: int = 0) -> list:
+    """
+    One row per backtest run: trade count, first/last fill, turnover (sum of quantity).
+    """
+    _ensure_table()
+    t = Trade.__table__
+    query = (select(t.c.run_id, t.c.strategy_id, t.c.symbol,
+                    func.count().label("n_trades"),
+                    func.min(t.c.timestamp).label("first_trade"),
+                    func.max(t.c.timestamp).label("last_trade"),
+                    func.sum(t.c.quantity).label("turnover"))
+             .where(*_filters(t, strategy_id, symbol, None, None, None, None))
+             .group_by(t.c.run_id, t.c.strategy_id, t.c.symbol)
+             .order_by(func.max(t.c.id).desc())
+             .limit(limit).offset(offset))
+    with engine.connect() as conn:
+        return [dict(r._mapping) for r in conn.execute(query)]
+
+
+def delete_trades(run_id: str = None, strategy_id: int = None) -> int:
+    _ensure_table()
+    t = Trade.__table__
+    conditions = _filters(t, strategy_id, None, run_id, None, None, None)
+    with engine.begin() as conn:
+        return conn.execute(t.delete().where(*conditions)).rowcount
+
+
+def _filters(t, strategy_id, symbol, run_id, action, start, end) -> list:
+    conditions = []
+    if strategy_id is not None:
+        conditions.append(t.c.strategy_id == strategy_id)
+    if symbol:
+        conditions.append(t.c.symbol == symbol)
+    if run_id:
+        conditions.append(t.c.run_id == run_id)
+    if action:
+        conditions.append(t.c.action == action.upper())
+    if start is not None:
+        conditions.append(t.c.timestamp >= start)
+    if end is not None:
+        conditions.append(t.c.timestamp <= end)
+    return conditions
+
+def _parse_cursor(cursor: str):
+    try:
+        ts, row_id = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        raise ValueError(f"Invalid cursor '{cursor}'")
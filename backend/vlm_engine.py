@@ -1,70 +1,358 @@
 import fitz  # PyMuPDF
-import google.generativeai as genai
+import hashlib
+import json
+import logging
+import multiprocessing as mp
 import os
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 
+from database import SessionLocal, engine, Base
+from models import IngestCache
+
 # Load environment variables
 load_dotenv()
 
-# Check for API Key
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY not found in .env file")
+# Paper ingestion pipeline:
+#   PDF bytes -> page text (parallel over page ranges) -> prompt -> model -> code
+# Both expensive steps are cached by content hash, so re-uploading the same
+# paper is two indexed lookups. The model is pluggable (VLM_BACKEND=gemini|stub);
+# the stub is deterministic and needs no network, for offline runs and tests.
 
-genai.configure(api_key=api_key)
+VLM_BACKEND = os.getenv("VLM_BACKEND", "gemini")
+PDF_WORKERS = int(os.getenv("VLM_PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARALLEL_MIN_PAGES = 16   # Below this, process start-up costs more than it saves
+MAX_PROMPT_CHARS = 30000
+PROMPT_VERSION = 1        # Bump when the prompt changes so cached code is regenerated
 
-def extract_code_from_pdf(pdf_bytes: bytes) -> str:
+logger = logging.getLogger("alpha.vlm")
+
+
+# --- 1. PDF -> text ---
+
+def _extract_range(pdf_bytes: bytes, start: int, stop: int) -> list:
+    # Runs in a worker process; every worker opens its own document
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     try:
-        # 1. Read PDF
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        text_content = ""
-        for page in doc:
-            text_content += page.get_text()
-        
-        if not text_content:
-            return "# ERROR: Could not extract text from this PDF."
-
-        # 2. Configure Model with Safety Settings disabled (to prevent blocking)
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        # Unsafe content is rare in finance papers, but default filters are strict.
-        safety_settings = [
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-        ]
-
-        prompt = f"""
-        You are a Quantitative Financial Engineer. 
+        return [doc[i].get_text() for i in range(start, stop)]
+    finally:
+        doc.close()
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def _get_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # Spawned, not forked: the pool starts on the first long paper, inside
+            # the threaded API process, and this module stays out of startup
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=mp.get_context("spawn"))
+        return _pdf_pool
+
+def extract_pages(pdf_bytes: bytes) -> list:
+    """
+    Text of every page, in order. Long documents are split into one page
+    range per worker process (PyMuPDF documents can't be shared across threads).
+    """
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    n_pages = doc.page_count
+    if n_pages < PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+        try:
+            return [page.get_text() for page in doc]
+        finally:
+            doc.close()
+    doc.close()
+
+    step = -(-n_pages // PDF_WORKERS)
+    pool = _get_pdf_pool()
+    futures = [pool.submit(_extract_range, pdf_bytes, start, min(start + step, n_pages))
+               for start in range(0, n_pages, step)]
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+# --- 2. Prompt ---
+
+def build_prompt(text_content: str) -> str:
+    return f"""
+        You are a Quantitative Financial Engineer.
         Analyze the following academic paper text and extract the core trading logic.
-        
+
         Output a SINGLE Python class named 'AlphaStrategy' that inherits from 'BaseStrategy'.
         The class must have:
         1. `__init__`: Define parameters (lookback_period, z_score_threshold, etc.).
         2. `generate_signal(df)`: A method that takes a Pandas DataFrame (with 'Close', 'High', 'Low') and returns a signal (1 for Buy, -1 for Sell, 0 for Hold).
-        
+
         Strict Rules:
         - Output ONLY valid Python code. No Markdown ticks (```), no explanations.
         - Use 'pandas' and 'numpy'.
         - Assume 'BaseStrategy' exists.
-        
+
         PAPER TEXT:
-        {text_content[:30000]} 
+        {text_content[:MAX_PROMPT_CHARS]}
         """
-        
-        response = model.generate_content(prompt, safety_settings=safety_settings)
-        
+
+
+# --- 3. Model backends ---
+
+class ModelBlocked(Exception):
+    pass
+
+class ModelBackend:
+    name = "base"
+    model = ""
+
+    def generate(self, prompt: str) -> str:
+        """
+        Returns the raw model reply. Raise ModelBlocked if the model refused.
+        """
+        raise NotImplementedError
+
+class GeminiBackend(ModelBackend):
+    name = "gemini"
+
+    # Unsafe content is rare in finance papers, but default filters are strict.
+    safety_settings = [
+        {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+        {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+        {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+        {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+    ]
+
+    def __init__(self, model: str = None):
+        self.model = model or os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            # Check for API Key (only when the model is actually needed)
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY not found in .env file (or set VLM_BACKEND=stub to run offline)")
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            self._client = genai.GenerativeModel(self.model)
+        return self._client
+
+    def generate(self, prompt: str) -> str:
+        response = self._get_client().generate_content(prompt, safety_settings=self.safety_settings)
         # Check if response was blocked
         if not response.parts:
-            print("Gemini blocked the response:", response.prompt_feedback)
-            return "# ERROR: AI Blocked the response due to safety filters."
+            logger.warning("Gemini blocked the response: %s", response.prompt_feedback)
+            raise ModelBlocked(str(response.prompt_feedback))
+        return response.text
+
+class StubBackend(ModelBackend):
+    """
+    Deterministic offline "model": picks an RSI or moving-average template from
+    keywords in the prompt and derives its parameters from the prompt hash.
+    Same paper in, same code out.
+    """
+    name = "stub"
+    model = "template-v1"
+
+    def generate(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        text = prompt.lower()
+        if "rsi" in text or "relative strength" in text:
+            period = 7 + digest[0] % 15
+            buy = 20 + digest[1] % 15
+            sell = 65 + digest[2] % 15
+            return _RSI_TEMPLATE.format(period=period, buy=buy, sell=sell)
+        short = 5 + digest[0] % 20
+        long = short + 10 + digest[1] % 60
+        return _MA_TEMPLATE.format(short=short, long=long)
+
+_MA_TEMPLATE = '''import pandas as pd
+import numpy as np
+
+class AlphaStrategy(BaseStrategy):
+    def __init__(self, short_window={short}, long_window={long}):
+        super().__init__()
+        self.short_window = short_window
+        self.long_window = long_window
+
+    def generate_signal(self, df):
+        if len(df) < self.long_window:
+            return 0
+        short_ma = df['Close'].tail(self.short_window).mean()
+        long_ma = df['Close'].tail(self.long_window).mean()
+        if short_ma > long_ma:
+            return 1
+        elif short_ma < long_ma:
+            return -1
+        return 0
+'''
+
+_RSI_TEMPLATE = '''import pandas as pd
+import numpy as np
+
+class AlphaStrategy(BaseStrategy):
+    def __init__(self, period={period}, buy_threshold={buy}, sell_threshold={sell}):
+        super().__init__()
+        self.period = period
+        self.buy_threshold = buy_threshold
+        self.sell_threshold = sell_threshold
+
+    def generate_signal(self, df):
+        if len(df) <= self.period:
+            return 0
+        delta = df['Close'].diff().tail(self.period)
+        gain = delta.where(delta > 0, 0).mean()
+        loss = -delta.where(delta < 0, 0).mean()
+        if loss == 0:
+            return -1
+        rsi = 100 - (100 / (1 + gain / loss))
+        if rsi < self.buy_threshold:
+            return 1
+        elif rsi > self.sell_threshold:
+            return -1
+        return 0
+'''
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "stub": StubBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def register_backend(name: str, factory):
+    BACKENDS[name] = factory
+
+def get_backend(name: str = None) -> ModelBackend:
+    name = name or VLM_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown VLM backend '{name}'. Choose from {sorted(BACKENDS)}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
+
+
+# --- 4. Content-hash cache ---
+
+class IngestStore:
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._table_ready = False
+
+    def _ensure_table(self):
+        if not self._table_ready:
+            Base.metadata.create_all(bind=engine, tables=[IngestCache.__table__])
+            self._table_ready = True
+
+    def get(self, key: str):
+        """
+        Returns (value, meta) or None.
+        """
+        self._ensure_table()
+        db = self.session_factory()
+        try:
+            row = db.query(IngestCache).filter(IngestCache.key == key).first()
+            if row is None:
+                return None
+            row.hits = (row.hits or 0) + 1
+            db.commit()
+            return zlib.decompress(row.value).decode("utf-8"), json.loads(row.meta or "{}")
+        finally:
+            db.close()
+
+    def put(self, key: str, kind: str, value: str, meta: dict = None):
+        self._ensure_table()
+        db = self.session_factory()
+        try:
+            row = db.query(IngestCache).filter(IngestCache.key == key).first()
+            if row is None:
+                row = IngestCache(key=key, kind=kind)
+                db.add(row)
+            row.value = zlib.compress(value.encode("utf-8"))
+            row.meta = json.dumps(meta or {})
+            db.commit()
+        except Exception:
+            db.rollback()  # Same paper uploaded twice at once; the other write wins
+        finally:
+            db.close()
+
+ingest_store = IngestStore()
+
+def _sha256(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+# --- Pipeline ---
+
+def ingest_pdf(pdf_bytes: bytes, backend: ModelBackend = None, progress=None, use_cache: bool = True) -> dict:
+    """
+    Blocking; run it in a worker thread. progress(packet) is called with
+    {"log": ...} dicts as each stage finishes.
+    Returns {"code", "pdf_hash", "n_pages", "text_cached", "code_cached", "backend"}.
+    Errors come back as code comments (so they show up in the editor), never raised.
+    """
+    emit = progress or (lambda packet: None)
+    result = {"pdf_hash": _sha256(pdf_bytes), "n_pages": 0, "text_cached": False, "code_cached": False}
+    try:
+        backend = backend or get_backend()
+        result["backend"] = backend.name
+
+        # 1. Read PDF (cached by the bytes' hash)
+        text_key = "text:" + result["pdf_hash"]
+        cached = ingest_store.get(text_key) if use_cache else None
+        if cached:
+            text_content, meta = cached
+            result["n_pages"] = meta.get("n_pages", 0)
+            result["text_cached"] = True
+            emit({"log": f"Text cache hit ({result['n_pages']} pages)"})
+        else:
+            emit({"log": "Extracting text..."})
+            pages = extract_pages(pdf_bytes)
+            text_content = "".join(pages)
+            result["n_pages"] = len(pages)
+            if text_content:
+                ingest_store.put(text_key, "text", text_content, {"n_pages": len(pages)})
+            emit({"log": f"Extracted {len(pages)} pages ({len(text_content)} chars)"})
+
+        if not text_content:
+            result["code"] = "# ERROR: Could not extract text from this PDF."
+            return result
+
+        # 2. Generate code (cached by text + backend + model + prompt version)
+        prompt = build_prompt(text_content)
+        code_key = "code:" + _sha256(f"{_sha256(prompt)}|{backend.name}|{backend.model}|{PROMPT_VERSION}")
+        cached = ingest_store.get(code_key) if use_cache else None
+        if cached:
+            result["code"] = cached[0]
+            result["code_cached"] = True
+            emit({"log": "Code cache hit"})
+            return result
+
+        emit({"log": f"Generating strategy with {backend.name} {backend.model}..."})
+        try:
+            reply = backend.generate(prompt)
+        except ModelBlocked:
+            result["code"] = "# ERROR: AI Blocked the response due to safety filters."
+            return result
 
         # Clean up markdown
-        code = response.text.replace("```python", "").replace("```", "").strip()
-        return code
+        code = reply.replace("```python", "").replace("```", "").strip()
+        ingest_store.put(code_key, "code", code, {"backend": backend.name, "model": backend.model})
+        result["code"] = code
+        emit({"log": "Strategy generated"})
+        return result
 
     except Exception as e:
-        print(f"VLM Engine Error: {str(e)}")
+        logger.exception("VLM engine error")
         # Return the error as a comment so it shows up in the editor
-        return f"# CRITICAL ERROR IN VLM ENGINE:\n# {str(e)}"
\ No newline at end of file
+        result["code"] = f"# CRITICAL ERROR IN VLM ENGINE:\n# {str(e)}"
+        return result
+
+def extract_code_from_pdf(pdf_bytes: bytes) -> str:
+    return ingest_pdf(pdf_bytes)["code"]
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from arena import run_signal_matrix, MAX_WORKERS, DEFAULT_TIMEOUT
+from sandbox import inspect_strategy, signal_matrix
+from search_engines import make_engine
+from result_cache import frame_fingerprint
+from robustness import OBJECTIVES, objective_scores
+from strategies.base import batch_metrics
+from strategies.indicator_cache import bind, indicator_cache
+from telemetry import span, record_span
+
+# Walk-forward optimization.
+# The history is cut into folds; each fold tunes on its train window and is
+# scored on the test window right after it, which the search never saw.
+#   rolling:  fixed-length train window sliding forward with the test window
+#   anchored: train always starts at the first bar and grows
+# A strategy's signal at bar i only depends on bars <= i, so every candidate's
+# signals are generated ONCE over the full series (SignalBank) and each fold
+# just slices them: indicators are warm at the start of every window and
+# nothing is recomputed per fold. Folds search in lockstep, so one generation
+# of every fold is a single batch (grid kernel in the sandbox, or the arena pool).
+
+MODES = ("rolling", "anchored")
+MIN_TRAIN_BARS = 30
+MIN_TEST_BARS = 5
+
+
+def make_folds(n_bars: int, n_folds: int = 5, mode: str = "rolling",
+               train_bars: int = None, test_bars: int = None) -> list:
+    """
+    [(train_start, train_stop, test_start, test_stop)], stop exclusive. The
+    test windows are consecutive and end at the last bar. By default each test
+    window is n_bars / (n_folds + 2) bars and the first train window starts at
+    bar 0 (rolling windows keep that length).
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown walk-forward mode '{mode}'. Choose from {list(MODES)}")
+    if n_folds < 1:
+        raise ValueError("n_folds must be >= 1")
+    test_bars = test_bars or n_bars // (n_folds + 2)
+    first_test = n_bars - n_folds * test_bars
+    train_bars = min(train_bars or first_test, first_test)
+    if test_bars < MIN_TEST_BARS or train_bars < MIN_TRAIN_BARS:
+        raise ValueError(f"{n_bars} bars are too few for {n_folds} folds "
+                         f"(need {MIN_TRAIN_BARS}+ train and {MIN_TEST_BARS}+ test bars per fold)")
+
+    folds = []
+    for k in range(n_folds):
+        test_start = first_test + k * test_bars
+        train_start = 0 if mode == "anchored" else test_start - train_bars
+        folds.append((train_start, test_start, test_start, test_start + test_bars))
+    return folds
+
+
+class SignalBank:
+    """
+    Full-series signal row per parameter set, shared by every fold. Rows are
+    int8 (signals are -1/0/1), so a 1M-bar row costs 1 MB. The frame is bound
+    to its fingerprint, so candidates share indicators across generations.
+    """
+    def __init__(self, strategy_code: str, df: pd.DataFrame, grid_kernel: bool, timeout: float = None):
+        self.strategy_code = strategy_code
+        self.df = df
+        self.timeout = timeout
+        self.grid_kernel = grid_kernel  # strategy_info's "grid"
+        self.rows = {}
+        self.fingerprint = frame_fingerprint(df)
+        bind(df, self.fingerprint)
+        self.computed = 0   # Rows actually generated (the rest were shared)
+        self.requested = 0
+
+    @staticmethod
+    def key(params: dict) -> tuple:
+        return tuple(sorted(params.items()))
+
+    def fill(self, candidates: list):
+        """
+        Generates every missing row in one batch. Blocking; raises on strategy errors.
+        """
+        self.requested += len(candidates)
+        missing = list({self.key(p): p for p in candidates if self.key(p) not in self.rows}.values())
+        if not missing:
+            return
+        if self.grid_kernel:
+            signals = signal_matrix(self.strategy_code, self.df, missing, self.fingerprint)
+        else:
+            signals = run_signal_matrix(self.df, self.strategy_code, missing, self.timeout or DEFAULT_TIMEOUT,
+                                        self.fingerprint)
+        for params, row in zip(missing, signals):
+            self.rows[self.key(params)] = row
+        self.computed += len(missing)
+
+    def release(self):
+        indicator_cache.drop(self.fingerprint)
+
+    def matrix(self, candidates: list, start: int, stop: int) -> np.ndarray:
+        return np.array([self.rows[self.key(p)][start:stop] for p in candidates], dtype=np.float64)
+
+
+def score(bank: SignalBank, close: np.ndarray, candidates: list, start: int, stop: int, costs: dict = None) -> dict:
+    """
+    batch_metrics for candidates on bars [start, stop): a fresh backtest on
+    that window (flat on its first bar) with warm indicators.
+    """
+    return batch_metrics(bank.matrix(candidates, start, stop), close[start:stop], costs)
+
+
+def stability(folds: list, ranges: dict) -> dict:
+    """
+    param_dispersion: mean over parameters of the std of the fold winners,
+        as a fraction of the search range (0 = every fold picked the same value).
+    positive_folds: share of folds whose winner had a positive Sharpe on its
+        own test window (only ever out-of-sample: a fold's winner is never
+        scored on bars its train window covered).
+    score: positive_folds * (1 - param_dispersion), 1 = never moved and never lost.
+    efficiency: mean out-of-sample over mean in-sample Sharpe (walk-forward efficiency).
+    """
+    dispersion = []
+    for name, (low, high) in ranges.items():
+        values = np.array([f["params"][name] for f in folds], dtype=np.float64)
+        dispersion.append(values.std() / (high - low) if high > low else 0.0)
+    param_dispersion = float(np.mean(dispersion)) if dispersion else 0.0
+
+    oos = np.array([_nan(f["oos_sharpe"]) for f in folds])
+    ins = np.array([_nan(f["is_sharpe"]) for f in folds])
+    positive = float(np.mean(oos > 0)) if len(oos) else 0.0
+    is_mean = np.nanmean(ins) if np.isfinite(ins).any() else math.nan
+    oos_mean = np.nanmean(oos) if np.isfinite(oos).any() else math.nan
+    return {
+        "score": round(positive * (1 - param_dispersion), 3),
+        "param_dispersion": round(param_dispersion, 3),
+        "positive_folds": round(positive, 3),
+        "oos_sharpe_mean": _round(oos_mean),
+        "oos_sharpe_std": _round(np.nanstd(oos)) if np.isfinite(oos).any() else None,
+        "is_sharpe_mean": _round(is_mean),
+        "efficiency": _round(oos_mean / is_mean) if is_mean > 0 else None,
+    }
+
+
+async def walk_forward(strategy_code: str, df: pd.DataFrame, n_folds: int = 5, mode: str = "rolling",
+                       train_bars: int = None, test_bars: int = None, engine: str = "random",
+                       max_evals: int = 50, population: int = None, seed: int = 0, objective: str = "sharpe",
+                       costs: dict = None):
+    """
+    Streams NDJSON: {"log"} progress lines, one {"fold": ...} packet per fold
+    with its train/test dates, winning parameters and in- and out-of-sample
+    metrics, then {"summary": ...} with the recommended parameters (the last
+    fold's winner, i.e. tuned on the most recent data) and their stability.
+    max_evals is the search budget per fold. objective is what the train
+    windows maximize: "sharpe", "robust_sharpe" or "skill" (see robustness.py).
+    costs: {"fee_bps", "slippage_bps"} overrides for every window's backtest.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}'. Choose from {list(OBJECTIVES)}")
+        with span("optimizer.detect"):
+            info = await loop.run_in_executor(None, inspect_strategy, strategy_code)
+        params, ranges = dict(info["params"]), dict(info["ranges"])
+        folds = make_folds(len(df), n_folds, mode, train_bars, test_bars)
+        # Same seed for every fold: random/grid folds then propose the same
+        # candidates and share their signal rows outright
+        searchers = [make_engine(engine, ranges, seed=seed) for _ in folds]
+    except Exception as e:
+        yield json.dumps({"log": f"Error: {e}"}) + "\n"
+        return
+    if not ranges:
+        yield json.dumps({"log": "Nothing to tune."}) + "\n"
+        return
+
+    close = df["Close"].to_numpy(dtype=np.float64)
+    dates = df.index
+    bank = SignalBank(strategy_code, df, info["grid"])
+    try:
+        if not population:
+            if searchers[0].name in ("random", "grid"):
+                population = max_evals
+            else:
+                population = max(MAX_WORKERS, 4 + int(3 * math.log(len(ranges))))
+        yield json.dumps({"log": f"WALK-FORWARD: {len(folds)} {mode} folds | ENGINE: {engine} | "
+                                 f"BUDGET: {max_evals} evals per fold | OBJECTIVE: {objective}"}) + "\n"
+
+        # 1. Search every fold's train window, one generation at a time
+        best = [{"score": -math.inf, "params": params.copy()} for _ in folds]
+        evals = 0
+        while evals < max_evals and not all(s.exhausted for s in searchers):
+            size = min(population, max_evals - evals)
+            if evals == 0:
+                batches = [[params.copy()] + s.ask(size - 1) for s in searchers]  # Defaults as the baseline
+            else:
+                batches = [s.ask(size) for s in searchers]
+            generation_started = time.monotonic()
+            try:
+                await loop.run_in_executor(None, bank.fill, [p for batch in batches for p in batch])
+            except Exception as e:
+                yield json.dumps({"log": f"Error: {e}"}) + "\n"
+                return
+
+            for k, (searcher, batch, (train_start, train_stop, _, _)) in enumerate(zip(searchers, batches, folds)):
+                if not batch:
+                    continue
+                if objective == "sharpe":
+                    values = score(bank, close, batch, train_start, train_stop, costs)["sharpe_ratio"]
+                else:
+                    values = objective_scores(bank.matrix(batch, train_start, train_stop), close[train_start:train_stop],
+                                              objective, costs, seed=seed)
+                for candidate, value in zip(batch, values):
+                    value = float(value) if np.isfinite(value) else -math.inf
+                    searcher.tell(candidate, value)
+                    if value > best[k]["score"]:
+                        best[k] = {"score": value, "params": candidate.copy()}
+            evals += size
+            record_span("optimizer.generation", time.monotonic() - generation_started)
+            yield json.dumps({"log": f"Searched {evals}/{max_evals} per fold "
+                                     f"({bank.computed} signal rows for {bank.requested} evaluations)"}) + "\n"
+
+        # 2. Score each fold's winner on its unseen test window
+        results = []
+        for k, (train_start, train_stop, test_start, test_stop) in enumerate(folds):
+            chosen = best[k]["params"]
+            oos = score(bank, close, [chosen], test_start, test_stop, costs)
+            packet = {
+                "fold": k,
+                "train": [_date(dates[train_start]), _date(dates[train_stop - 1])],
+                "test": [_date(dates[test_start]), _date(dates[test_stop - 1])],
+                "params": chosen,
+                "is_sharpe": _round(score(bank, close, [chosen], train_start, train_stop, costs)["sharpe_ratio"][0]),
+                "oos_sharpe": _round(oos["sharpe_ratio"][0]),
+                "oos_return_pct": _round(oos["total_return_pct"][0]),
+                "oos_max_drawdown_pct": _round(oos["max_drawdown_pct"][0]),
+            }
+            if objective != "sharpe":
+                packet["is_" + objective] = _round(best[k]["score"])
+            results.append(packet)
+            yield json.dumps({**packet, "log": f"Fold {k}: {chosen} -> IS Sharpe {packet['is_sharpe']} | "
+                                               f"OOS Sharpe {packet['oos_sharpe']}"}) + "\n"
+
+        # 3. Recommended parameters: the last fold's winner. Its train window covers
+        # every earlier test window, so its only out-of-sample score is the last one
+        summary = {
+            "recommended_params": results[-1]["params"],
+            "recommended_oos_sharpe": results[-1]["oos_sharpe"],
+            "stability": stability(results, ranges),
+            "signal_rows": bank.computed,
+            "evaluations": bank.requested,
+        }
+        yield json.dumps({"summary": summary, "log": f"--- WALK-FORWARD COMPLETE --- stability {summary['stability']['score']}"}) + "\n"
+    finally:
+        bank.release()  # Also when the search fails or the client goes away
+
+
+def _nan(value):
+    return math.nan if value is None else value
+
+def _round(value, digits: int = 2):
+    # JSON has no NaN/inf
+    value = float(value)
+    return round(value, digits) if math.isfinite(value) else None
+
+def _date(ts) -> str:
+    return pd.Timestamp(ts).isoformat()
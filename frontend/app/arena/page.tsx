@@ -35,7 +35,8 @@ export default function Arena() {
     try {
         const res = await axios.post("http://localhost:8000/api/run_battle", {
             strategy_ids: selectedIds,
-            ticker: "AAPL" 
+            ticker: "AAPL",
+            learn: true
         });
         setChartData(res.data);
     } catch (err) {
@@ -13,12 +13,13 @@ const equityData = Array.from({ length: 30 }, (_, i) => ({
 }));
 
 export default function Dashboard() {
-  const [strategies, setStrategies] = useState<any[]>([]);
+  const [strategyCount, setStrategyCount] = useState(0);
 
-  // Fetch strategy count for the "Active Bots" card
+  // Fetch strategy count for the "Active Bots" card (the list is paged, so
+  // read the total from X-Total-Count instead of counting one page)
   useEffect(() => {
-    axios.get("http://localhost:8000/api/strategies")
-      .then(res => setStrategies(res.data))
+    axios.get("http://localhost:8000/api/strategies", { params: { limit: 1 } })
+      .then(res => setStrategyCount(Number(res.headers["x-total-count"] ?? res.data.length)))
       .catch(err => console.error(err));
   }, []);
 
@@ -53,7 +54,7 @@ export default function Dashboard() {
             />
             <MetricCard 
                 title="ACTIVE STRATEGIES" 
-                value={strategies.length.toString()} 
+                value={strategyCount.toString()} 
                 change="Running" 
                 icon={Cpu} 
                 color="text-blue-400" 